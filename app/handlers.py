@@ -9,6 +9,9 @@ import json
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from database.requests import TIMEZONE_RANGES 
+from database.search_index import candidate_index
+from services.search_session import search_sessions
+from services.subscriptions import Subscription, subscription_engine, announce_player
 from sqlalchemy.orm import selectinload, joinedload
 from requests import session
 from fastapi import Depends
@@ -26,8 +29,10 @@ from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.context import FSMContext
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import desc, distinct, select, func, text, cast, BigInteger, outerjoin, update
-from database.models import APIServiceStats, User, UserState, UserReport, UserRating, Appeal, Payment, UserError, BanList, UserReputation, UserSettings, UserActivity
+from database.models import APIServiceStats, User, UserState, UserReport, UserRating, Appeal, Payment, UserError, BanList, UserReputation, UserSettings, UserActivity, SearchProfile
 from services.faceit import FaceitService
+from services.circuit_breaker import CircuitOpenError
+from services.match_store import match_store
 from datetime import datetime, timedelta
 from config import (
     YOOMONEY_PROVIDER_TOKEN, 
@@ -198,10 +203,12 @@ async def delete_user_completely(session: AsyncSession, user_id: int):
         await session.execute(delete(UserActivity).where(UserActivity.user_id == user_id))
         await session.execute(delete(UserRating).where(UserRating.user_id == user_id))
         await session.execute(delete(UserState).where(UserState.user_id == user_id))
+        await session.execute(delete(SearchProfile).where(SearchProfile.user_id == user_id))
         
         # Удаляем самого пользователя
         await session.execute(delete(User).where(User.id == user_id))
         await session.commit()
+        candidate_index.remove(user_id)
         return True
     except Exception as e:
         await session.rollback()
@@ -236,7 +243,9 @@ async def check_vip_expirations(session_pool, bot: Bot):
                     .where(User.vip_expires_at < datetime.utcnow())
                 )
                 
+                expired_ids = []
                 for user in expired_users:
+                    expired_ids.append(user.id)
                     user.is_vip = False
                     user.vip_expires_at = None  # Явно сбрасываем дату истечения
                     session.add(user)
@@ -254,6 +263,7 @@ async def check_vip_expirations(session_pool, bot: Bot):
                             logger.error(f"Не удалось уведомить пользователя: {e}")
                 
                 await session.commit()
+                await rq.sync_search_profiles(session, expired_ids)
         except Exception as e:
             logger.error(f"Ошибка проверки VIP подписок: {e}")
 
@@ -311,6 +321,7 @@ async def activate_vip_subscription(
             logger.info("Настройки уже существуют")
         
         await session.commit()
+        await rq.sync_search_candidate(session, user.id)
         logger.info("VIP активирован успешно")
         return True
         
@@ -367,8 +378,21 @@ async def get_session() -> AsyncGenerator[AsyncSession, None]:
     async with session_factory() as session:
         yield session
 
-async def show_api_stats(target: Union[Message, CallbackQuery], faceit_service: FaceitService):
+def format_latency(summary: dict) -> str:
+    """Строка сводки метрик: квантили задержки, доля ошибок и запросов в секунду"""
+    if not summary.get('requests'):
+        return "нет запросов"
+    return (
+        f"p50 {summary['p50'] * 1000:.0f} / p90 {summary['p90'] * 1000:.0f} / p99 {summary['p99'] * 1000:.0f} мс, "
+        f"ошибки {summary['error_rate']:.1%}, {summary['throughput']:.2f} зап/с"
+    )
+
+async def show_api_stats(target: Union[Message, CallbackQuery], faceit_service: FaceitService, session: AsyncSession):
     stats = faceit_service.get_stats()
+    latency = stats.get('latency', {})
+    key_latency = latency.get('key', {})
+    # Пакетные загрузки выполняет воркер Celery - их итоги берем из снимков статистики
+    bulk = await rq.get_last_bulk_stats(session)
     
     # Форматируем статистику ключей с защитой от ошибок
     key_stats = stats.get('key_stats', [])
@@ -377,21 +401,52 @@ async def show_api_stats(target: Union[Message, CallbackQuery], faceit_service:
         f"запросы={stat.get('requests', 0)}, "
         f"ошибки={stat.get('errors', 0)}, "
         f"последнее использование={stat.get('last_used', 'N/A')}"
+        + (f"\n    5м: {format_latency(key_latency[stat['key']]['5m'])}" if stat.get('key') in key_latency else "")
         for stat in key_stats
     ) if key_stats else "  Нет данных о ключах"
     
+    breakers = stats.get('breakers', {})
+    breaker_text = ", ".join(
+        f"{family}: {data['state']}" + (f" ({data['retry_in']:.0f} с)" if data['state'] == 'open' else "")
+        for family, data in breakers.items()
+    ) or "нет данных"
+    
+    total = latency.get('total', {}).get('all', {})
+    latency_text = "\n".join(
+        f"  {window}: {format_latency(total[window])}" for window in ('1m', '5m', '1h') if window in total
+    ) or "  Нет запросов"
+    endpoint_text = "\n".join(
+        f"  - {endpoint} (5м): {format_latency(windows['5m'])}"
+        for endpoint, windows in sorted(latency.get('endpoint', {}).items())
+    )
+    
     response = (
         "📊 Статистика Faceit API:\n\n"
         f"• Всего запросов: {stats.get('total_requests', 0)}\n"
         f"• Ошибок: {stats.get('error_count', 0)}\n"
         f"• Ключей API: {stats.get('api_keys', 0)}\n"
-        f"• Размер кеша: {stats.get('cache_size', 0)}\n"
+        f"• Размер кеша: {stats.get('cache_size', 0)} / {stats.get('cache_maxsize', 0)}"
+        f" (~{stats.get('cache_memory_bytes', 0) / 1024 / 1024:.1f} МБ, {stats.get('cache_bytes_per_entry', 0)} Б на запись)\n"
         f"• Попаданий в кеш: {stats.get('cache_hits', 0)}\n"
         f"• Промахов кеша: {stats.get('cache_misses', 0)}\n"
         f"• Процент попаданий: {stats.get('cache_hit_rate', 0.0):.2%}\n"
+        f"• Устаревших / отрицательных попаданий: {stats.get('cache_stale_hits', 0)} / {stats.get('cache_negative_hits', 0)}\n"
+        f"• Попаданий во 2-й уровень кеша ({stats.get('l2_cache_backend') or 'отключен'}): {stats.get('l2_cache_hits', 0)}\n"
         f"• Запросов за час: {stats.get('requests_last_hour', 0)}\n"
-        f"• Среднее время ответа: {stats.get('avg_response_time', 0.0):.2f} сек\n\n"
-        "📈 Статистика по ключам:\n"
+        f"• Среднее время ответа: {stats.get('avg_response_time', 0.0):.2f} сек\n"
+        f"• Объединено запросов: {stats.get('coalesced_requests', 0)} ({stats.get('coalesce_rate', 0.0):.2%})\n"
+        f"• Предохранители: {breaker_text}\n"
+        + (
+            f"• Последний пакет игроков ({bulk['recorded_at'].strftime('%d.%m %H:%M')}): "
+            f"{bulk['players']} за {bulk['seconds']:.0f} с "
+            f"({bulk['throughput']:.1f}/с, из кеша {bulk['cached']})\n"
+            if bulk else ""
+        )
+        + "\n"
+        "⏱ Задержки Faceit API:\n"
+        f"{latency_text}\n"
+        + (f"{endpoint_text}\n" if endpoint_text else "")
+        + "\n📈 Статистика по ключам:\n"
         f"{key_text}"
     )
     
@@ -468,34 +523,6 @@ async def cancel_state_on_main_menu(message: Message, state: FSMContext, session
             reply_markup=kb.get_main_keyboard()
         )
 
-async def get_user_by_faceit_nickname(session: AsyncSession, nickname: str) -> User | None:
-    """Поиск пользователя по никнейму с проверкой актуальности"""
-    result = await session.execute(
-        select(User)
-        .where(func.lower(User.faceit_nickname) == nickname.lower())
-    )
-    user = result.scalars().first()
-    
-    if not user:
-        # Пробуем найти через Faceit API
-        player_data = await faceit_service.get_player_stats(nickname)
-        if player_data and 'player_id' in player_data:
-            result = await session.execute(
-                select(User)
-                .where(User.faceit_player_id == player_data['player_id'])
-            )
-            user = result.scalars().first()
-            
-            # Обновляем никнейм если нашли
-            if user:
-                await session.execute(
-                    update(User)
-                    .where(User.id == user.id)
-                    .values(faceit_nickname=player_data['nickname'])
-                )
-    
-    return user
-
 async def update_user_activity(session: AsyncSession, user_id: int, activity_type: str):
     try:
         # Находим пользователя с состоянием
@@ -602,8 +629,9 @@ async def process_faceit_nickname(message: Message, state: FSMContext, session:
         return
     
     try:
-        # Проверяем существование аккаунта Faceit
-        if not await faceit_service.check_account_exists(faceit_nickname):
+        # Один запрос к Faceit: существование аккаунта, player_id и ELO
+        player = await faceit_service.resolve_player(faceit_nickname)
+        if player is None:
             await message.answer(
                 "Аккаунт Faceit с таким никнеймом не найден. Пожалуйста, введите корректный никнейм:",
                 reply_markup=kb.cancel_registration()
@@ -611,26 +639,18 @@ async def process_faceit_nickname(message: Message, state: FSMContext, session:
             return
         
         # Проверяем, не зарегистрирован ли уже этот никнейм
-        existing_user = await session.execute(
-            select(User).where(func.lower(User.faceit_nickname) == faceit_nickname.lower())
-        )
-        if existing_user.scalar():
+        if await rq.get_user_by_nickname(session, faceit_nickname):
             await message.answer(
                 "Этот Faceit аккаунт уже зарегистрирован. Пожалуйста, используйте другой никнейм.",
                 reply_markup=kb.cancel_registration()
             )
             return
         
-        # Получаем данные игрока
-        player_data = await faceit_service.get_player_stats(faceit_nickname)
-        if not player_data:
-            raise ValueError("Не удалось получить данные игрока")
-        
         # Сохраняем ВСЕ необходимые данные в состоянии
         await state.update_data(
             faceit_nickname=faceit_nickname,
-            faceit_player_id=player_data.get('player_id'),
-            faceit_elo=player_data.get('faceit_elo', 0)
+            faceit_player_id=player.player_id,
+            faceit_elo=player.faceit_elo or 0
         )
         
         # Переходим к следующему шагу
@@ -640,6 +660,11 @@ async def process_faceit_nickname(message: Message, state: FSMContext, session:
         )
         await state.set_state(Register.age)
         
+    except CircuitOpenError as e:
+        await message.answer(
+            f"Faceit сейчас недоступен. Попробуйте ввести никнейм через {max(int(e.retry_after), 1)} сек.",
+            reply_markup=kb.cancel_registration()
+        )
     except Exception as e:
         logger.error(f"Ошибка при обработке никнейма: {e}", exc_info=True)
         await message.answer(
@@ -782,6 +807,8 @@ async def process_age(message: Message, state: FSMContext, session: AsyncSession
         
         # Фиксируем изменения в БД
         await session.commit()
+        await rq.sync_search_candidate(session, user_state.user_id)
+        await announce_player(session, user_state.user_id)
         
         # Отправляем сообщение с настройками профиля
         await message.answer(
@@ -828,6 +855,38 @@ async def main_menu(message: Message, session: AsyncSession):
         reply_markup=kb.get_main_keyboard(user.is_vip))
     
 
+def render_search_results(title: str, teammates: list) -> tuple[str, InlineKeyboardMarkup]:
+    """Текст карточек и клавиатура приглашений для результатов поиска (строки SearchProfile)"""
+    response = [title]
+    keyboard_buttons = []
+    
+    for number, teammate in enumerate(teammates, 1):
+        response.append(
+            f"\n{number}. {'💎 ' if teammate.is_vip else ''}👤 <a href='https://www.faceit.com/ru/players/{teammate.faceit_nickname}'>{teammate.faceit_nickname}</a>\n"
+            f"   🎂 Возраст: {teammate.age}\n"
+            f"   ⚡️ ELO: {teammate.elo}\n"
+            f"   🎮 Роль: {teammate.role or 'Не указана'}\n"
+            f"   👍 Репутация: {teammate.nickname_rating or 10}\n"
+            f"   ✅ Верификация: {'Да' if teammate.is_verified else 'Нет'}\n"
+            f"   🕒 Часовой пояс: {teammate.timezone}\n"
+            f"   💬 Способ связи: {teammate.communication_method}\n"
+        )
+        
+        keyboard_buttons.append([
+            InlineKeyboardButton(
+                text=f"📨 Пригласить {teammate.faceit_nickname}",
+                callback_data=f"invite_single_{teammate.user_id}"
+            )
+        ])
+    
+    # Общие кнопки
+    keyboard_buttons.append([
+        InlineKeyboardButton(text='📨 Пригласить всех', callback_data='invite_all'),
+        InlineKeyboardButton(text='🔄 Новый поиск', callback_data='new_search'),
+    ])
+    
+    return "".join(response), InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
+
 @router.message(F.text == '🔍 Поиск тиммейтов')
 async def player_search(message: Message, session: AsyncSession):
     try:
@@ -941,12 +1000,13 @@ async def player_search(message: Message, session: AsyncSession):
         ban_list = [b.banned_nickname for b in user.bans] if user.bans else []
         logger.info(f"Бан-лист пользователя: {ban_list}")
 
-        # Выполняем поиск
-        teammates = await rq.search_teammates(
+        # Выполняем поиск: открываем новую поисковую сессию
+        teammates = await rq.next_search_page(
             session, 
             message.from_user.id,
             ban_list=ban_list,
-            elo_range=elo_range
+            elo_range=elo_range,
+            fresh=True
         )
     
         # Обработка случая, когда не найдено тиммейтов
@@ -961,60 +1021,11 @@ async def player_search(message: Message, session: AsyncSession):
         
         logger.info(f"Найдено {len(teammates)} тиммейтов")
     
-        # Формируем список ID найденных тиммейтов
-        teammate_ids = [teammate.id for teammate, _, _ in teammates]
-        
-        # Получаем рейтинги тиммейтов
-        ratings_result = await session.execute(
-            select(UserRating.user_id, UserRating.nickname_rating)
-            .where(UserRating.user_id.in_(teammate_ids)))
-        ratings_dict = {user_id: rating for user_id, rating in ratings_result.all()}
-        
-        # Формируем сообщение с результатами
-        response = ["🎮 Найдены потенциальные тиммейты:\n"]
-        keyboard_buttons = []
-        
-        seen_ids = set()
-        valid_count = 0
-        
-        for i, (teammate, teammate_state, _) in enumerate(teammates, 1):
-            if teammate.id in seen_ids:
-                continue
-            seen_ids.add(teammate.id)
-            valid_count += 1
-            
-            rating = ratings_dict.get(teammate.id, 10)
-            
-            response.append(
-                f"\n{valid_count}. {'💎 ' if teammate.is_vip else ''}👤 <a href='https://www.faceit.com/ru/players/{teammate.faceit_nickname}'>{teammate.faceit_nickname}</a>\n"
-                f"   🎂 Возраст: {teammate.age}\n"
-                f"   ⚡️ ELO: {teammate_state.elo}\n"
-                f"   🎮 Роль: {teammate_state.role or 'Не указана'}\n"
-                f"   👍 Репутация: {rating}\n"
-                f"   ✅ Верификация: {'Да' if teammate_state.is_verified else 'Нет'}\n"
-                f"   🕒 Часовой пояс: {teammate_state.timezone}\n"
-                f"   💬 Способ связи: {teammate_state.communication_method}\n"
-            )
-            
-            keyboard_buttons.append([
-                InlineKeyboardButton(
-                    text=f"📨 Пригласить {teammate.faceit_nickname}",
-                    callback_data=f"invite_single_{teammate.id}"
-                )
-            ])
-        
-        # Добавляем общие кнопки
-        keyboard_buttons.append([
-            InlineKeyboardButton(text='📨 Пригласить всех', callback_data='invite_all'),
-            InlineKeyboardButton(text='🔄 Новый поиск', callback_data='new_search'),
-        ])
-        
-        # Создаем клавиатуру
-        markup = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
+        text, markup = render_search_results("🎮 Найдены потенциальные тиммейты:\n", teammates)
         
         # Отправляем результаты
         await message.answer(
-            "".join(response),
+            text,
             reply_markup=markup,
             parse_mode="HTML",
             disable_web_page_preview=True
@@ -1162,18 +1173,14 @@ async def handle_new_search(callback: CallbackQuery, session: AsyncSession):
 
         elo_range = user.settings.elo_range if (user.is_vip and user.settings) else 300
         
-        ban_list = []
-        if user.is_vip:
-            bans = await session.scalars(
-                select(BanList.banned_nickname)
-                .where(BanList.user_id == user.id)
-            )
-            ban_list = [b.lower() for b in bans.all()]
+        # Бан-лист уже загружен вместе с пользователем
+        ban_list = [b.banned_nickname.lower() for b in user.bans] if user.is_vip else []
 
         search_msg = await callback.message.answer("🔍 Идет поиск тиммейтов...")
         await asyncio.sleep(1)
         
-        teammates = await rq.search_teammates(
+        # Следующая страница поисковой сессии, без запросов к БД, пока пул не исчерпан
+        teammates = await rq.next_search_page(
             session,
             callback.from_user.id,
             elo_range=elo_range,
@@ -1190,67 +1197,11 @@ async def handle_new_search(callback: CallbackQuery, session: AsyncSession):
             )
             return
 
-        response = ["🎮 Результаты нового поиска:\n"]
-        keyboard_buttons = []
-        seen_ids = set()
-        valid_count = 0
-        
-        # ИСПРАВЛЕНА РАСПАКОВКА: теперь 3 элемента
-        for teammate, teammate_state, _ in teammates:
-            # Проверяем бан тиммейта
-            is_banned = await session.scalar(
-                select(UserRating.is_banned)
-                .where(UserRating.user_id == teammate.id)
-            )
-            if is_banned:
-                continue
-                
-            if user.is_vip and teammate.faceit_nickname.lower() in ban_list:
-                continue
-                
-            valid_count += 1
-            
-            # Получаем рейтинг тиммейта
-            rating = await session.scalar(
-                select(UserRating.nickname_rating)
-                .where(UserRating.user_id == teammate.id)
-            )
-            rating_value = rating or 10
-            
-            response.append(
-                f"\n{valid_count}. {'💎 ' if teammate.is_vip else ''}👤 <a href='https://www.faceit.com/ru/players/{teammate.faceit_nickname}'>{teammate.faceit_nickname}</a>\n"
-                f"   🎂 Возраст: {teammate.age}\n"
-                f"   ⚡️ ELO: {teammate_state.elo}\n"
-                f"   🎮 Роль: {teammate_state.role or 'Не указана'}\n"
-                f"   💬 Способ связи: {teammate_state.communication_method}\n"
-                f"   ⏰ Часовой пояс: {teammate_state.timezone}\n"
-                f"   👍 Репутация: {rating_value}\n"
-                f"   ✅ Верификация: {'Да' if teammate_state.is_verified else 'Нет'}\n"
-            )
-
-            keyboard_buttons.append([
-                InlineKeyboardButton(
-                    text=f"📨 Пригласить {teammate.faceit_nickname}",
-                    callback_data=f"invite_single_{teammate.id}"
-                )
-            ])
-
-        if valid_count == 0:
-            await callback.message.answer(
-                "😕 Не найдено подходящих тиммейтов в новом поиске.",
-                reply_markup=kb.search_results()
-            )
-            return
-
-        keyboard_buttons.append([
-            InlineKeyboardButton(text='📨 Пригласить всех', callback_data='invite_all'),
-            InlineKeyboardButton(text='🔄 Новый поиск', callback_data='new_search')
-        ])
-        
-        markup = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
+        # Рейтинг, бан и состояние уже есть в строках проекции - дополнительных запросов не нужно
+        text, markup = render_search_results("🎮 Результаты нового поиска:\n", teammates)
         
         await callback.message.answer(
-            "".join(response),
+            text,
             reply_markup=markup,
             parse_mode="HTML",
             disable_web_page_preview=True
@@ -1267,6 +1218,51 @@ async def handle_new_search(callback: CallbackQuery, session: AsyncSession):
         except Exception as inner_e:
             logger.error(f"Двойная ошибка в handle_new_search: {inner_e}")
 
+@router.callback_query(F.data == 'notify_match')
+async def handle_notify_match(callback: CallbackQuery, session: AsyncSession):
+    """Подписка на уведомление, когда появится игрок под параметры поиска"""
+    try:
+        result = await session.execute(
+            select(User)
+            .options(
+                joinedload(User.state),
+                joinedload(User.settings),
+                joinedload(User.bans)
+            )
+            .where(User.tg_id == callback.from_user.id)
+        )
+        user = result.unique().scalar_one_or_none()
+        
+        if not user or not user.state or user.state.elo is None:
+            await callback.answer("Сначала заполните профиль", show_alert=True)
+            return
+        
+        # Те же параметры, что и в поиске: расширенные настройки только у VIP
+        if user.is_vip and user.settings:
+            min_age, max_age, elo_range = user.settings.min_age, user.settings.max_age, user.settings.elo_range
+        else:
+            min_age, max_age, elo_range = 12, 60, 300
+        
+        subscription_engine.subscribe(Subscription(
+            tg_id=callback.from_user.id,
+            user_id=user.id,
+            elo_min=user.state.elo - elo_range,
+            elo_max=user.state.elo + elo_range,
+            timezones=TIMEZONE_RANGES.get(user.state.timezone, []),
+            min_age=min_age,
+            max_age=max_age,
+            banned_nicknames=[b.banned_nickname for b in user.bans] if user.is_vip else [],
+            ttl=subscription_engine.ttl
+        ))
+        
+        await callback.answer(
+            "🔔 Мы пришлем уведомление, когда появится подходящий игрок",
+            show_alert=True
+        )
+    except Exception as e:
+        logger.error(f"Ошибка в handle_notify_match: {e}", exc_info=True)
+        await callback.answer("Произошла ошибка", show_alert=True)
+
 @router.callback_query(F.data == 'invite_all')
 async def handle_invite_all(callback: CallbackQuery, session: AsyncSession, bot: Bot):
     try:
@@ -1275,7 +1271,7 @@ async def handle_invite_all(callback: CallbackQuery, session: AsyncSession, bot:
         sender_result = await session.execute(
             select(User, UserState, UserRating)
             .join(UserState, User.id == UserState.user_id)
-            .join(UserRating, User.id == UserRating.user_id)
+            .outerjoin(UserRating, User.id == UserRating.user_id)
             .where(User.tg_id == callback.from_user.id)
         )
         sender_data = sender_result.first()
@@ -1286,7 +1282,9 @@ async def handle_invite_all(callback: CallbackQuery, session: AsyncSession, bot:
 
         sender_user, sender_state, sender_rating = sender_data
 
-        teammates = await search_teammates(
+        # Приглашаем игроков, показанных последними, иначе подбираем заново
+        search = search_sessions.get(callback.from_user.id)
+        teammates = search.last_team if search else await rq.search_teammates(
             session,
             callback.from_user.id
         )
@@ -1306,7 +1304,7 @@ async def handle_invite_all(callback: CallbackQuery, session: AsyncSession, bot:
             f"Хотите создать команду с этим игроком?"
         )
         
-        for teammate, teammate_state, _ in teammates:
+        for teammate in teammates:
             if teammate.tg_id:
                 try:
                     await bot.send_message(
@@ -1319,7 +1317,7 @@ async def handle_invite_all(callback: CallbackQuery, session: AsyncSession, bot:
                 except Exception as e:
                     if "bot was blocked" in str(e).lower():
                         logger.warning(f"Пользователь {teammate.faceit_nickname} заблокировал бота")
-                        await delete_user_completely(session, teammate.id)
+                        await delete_user_completely(session, teammate.user_id)
                     else:
                         logger.error(f"Ошибка отправки игроку {teammate.faceit_nickname}: {e}")
         
@@ -1525,6 +1523,7 @@ async def process_communication_setting(callback: CallbackQuery, session: AsyncS
             user.state.communication_method = comm_value
         
         await session.commit()
+        await rq.sync_search_candidate(session, user.id)
         
         # Проверяем заполненность профиля
         if is_profile_complete(user, user.state):
@@ -1591,6 +1590,8 @@ async def process_timezone_setting(callback: CallbackQuery, session: AsyncSessio
             user.state.timezone = tz_value
         
         await session.commit()
+        await rq.sync_search_candidate(session, user.id)
+        search_sessions.invalidate(callback.from_user.id)
         
         # Проверяем заполненность профиля
         if is_profile_complete(user, user.state):
@@ -1682,6 +1683,7 @@ async def apply_elo_range(callback: CallbackQuery, session: AsyncSession):
     
     user.settings.elo_range = new_range
     await session.commit()
+    search_sessions.invalidate(callback.from_user.id)
     
     # Остальной код без изменений
     await callback.message.edit_text(
@@ -1692,7 +1694,7 @@ async def apply_elo_range(callback: CallbackQuery, session: AsyncSession):
 
 
 @router.message(F.text == '📊 Мои данные')
-async def handle_my_data(message: Message, session: AsyncSession):
+async def handle_my_data(message: Message, session: AsyncSession, faceit_service: FaceitService):
     await track_activity(session, message.from_user.id, "my_data")
     try:
         user = await session.scalar(
@@ -1720,10 +1722,30 @@ async def handle_my_data(message: Message, session: AsyncSession):
         # Получаем значения из профиля
         comm_value = user.state.communication_method if user.state else "Не указан"
         tz_value = user.state.timezone if user.state else "Не указан"
+        
+        # Форма по последним матчам из локального хранилища матчей
+        form = await rq.get_recent_form(session, user.faceit_player_id) if user.faceit_player_id else []
+        form_line = (
+            "📈 Последние матчи: " + "".join("🟢" if match.won else "🔴" for match in form if match.won is not None) + "\n"
+            if form else ""
+        )
+        last_match_line = ""
+        if form:
+            # Статистика завершенного матча хранится постоянно: API запрашивается один раз
+            try:
+                match_stats = await match_store.get_match_stats(session, faceit_service, form[0].match_id)
+            except CircuitOpenError:
+                match_stats = {}
+            rounds = match_stats.get('rounds') or [{}]
+            map_name = (rounds[0].get('round_stats') or {}).get('Map')
+            if map_name:
+                last_match_line = f"🗺 Последний матч: {map_name} {form[0].score or ''}".rstrip() + "\n"
 
         response = (
             f"📊 Ваши данные:\n\n"
             f"👤 Никнейм: {user.faceit_nickname}\n"
+            f"{form_line}"
+            f"{last_match_line}"
             f"⭐️ Рейтинг: {rating}\n"
             f"💬 Способ связи: {comm_value}\n"
             f"⏰ Часовой пояс: {tz_value}\n"
@@ -1772,6 +1794,7 @@ async def set_elo_range(callback: CallbackQuery, session: AsyncSession):
         
         user.settings.elo_range = range_value
         await session.commit()
+        search_sessions.invalidate(callback.from_user.id)
         
         await callback.message.edit_text(
             f'✅ Диапазон ELO установлен: ±{range_value}',
@@ -1844,6 +1867,7 @@ async def apply_age_range(callback: CallbackQuery, session: AsyncSession):
     user.settings.min_age = min_age
     user.settings.max_age = max_age
     await session.commit()
+    search_sessions.invalidate(callback.from_user.id)
     
     # Остальной код без изменений
     await callback.message.edit_text(
@@ -2245,6 +2269,9 @@ async def process_search_status(callback: CallbackQuery, session: AsyncSession):
             user.state.search_team = search_status
         
         await session.commit()
+        await rq.sync_search_candidate(session, user.id)
+        if search_status:
+            await announce_player(session, user.id)
         
         # Проверяем заполненность профиля
         if is_profile_complete(user, user.state):
@@ -2360,6 +2387,7 @@ async def process_team_role(callback: CallbackQuery, session: AsyncSession):
             
             user.state.role = role
             await session.commit()
+            await rq.sync_search_candidate(session, user.id)
             
             # Проверяем заполненность профиля
             if is_profile_complete(user, user.state):
@@ -2418,6 +2446,7 @@ async def process_verification_status(callback: CallbackQuery, session: AsyncSes
             user.state.is_verified = is_verified
         
         await session.commit()
+        await rq.sync_search_candidate(session, user.id)
         
         # Проверяем заполненность профиля
         if is_profile_complete(user, user.state):
@@ -2463,15 +2492,16 @@ async def process_unified_nickname(message: Message, state: FSMContext, session:
             return
         
         # Ищем пользователя по никнейму
-        result = await session.execute(
-            select(User).where(func.lower(User.faceit_nickname) == nickname.lower())
-        )
-        user = result.scalars().first()
+        user = await rq.get_user_by_nickname(session, nickname)
         
         if not user:
             logger.warning(f"Игрок с никнеймом {nickname} не найден")
+            not_found_text = "Игрок с таким никнеймом не найден."
+            suggestions = await rq.find_similar_nicknames(session, nickname)
+            if suggestions:
+                not_found_text += f"\nВозможно, вы имели в виду: {', '.join(suggestions)}"
             await message.answer(
-                "Игрок с таким никнеймом не найден. Попробуйте еще раз:",
+                f"{not_found_text}\nПопробуйте еще раз:",
                 reply_markup=kb.cancel_unified_rating_keyboard()
             )
             return
@@ -2619,6 +2649,7 @@ async def process_rating(callback, state, session, bot, is_positive, value):
         session.add(new_reputation)
         
         await session.commit()
+        await rq.sync_search_candidate(session, target_user_id)
         
         await callback.message.edit_text(
             f"Вы {'повысили' if is_positive else 'понизили'} репутацию игрока {target_nickname}",
@@ -2713,10 +2744,7 @@ async def process_faceit_nickname(message: Message, session: AsyncSession, state
         return
     
     # Проверяем, не зарегистрирован ли уже этот никнейм
-    existing_user = await session.execute(
-        select(User).where(User.faceit_nickname == faceit_nickname)
-    )
-    if existing_user.scalar():
+    if await rq.get_user_by_nickname(session, faceit_nickname):
         await message.answer(
             "Этот Faceit аккаунт уже зарегистрирован. Пожалуйста, используйте другой никнейм.",
             reply_markup=kb.cancel_registration_keyboard()
@@ -2738,8 +2766,7 @@ async def process_report_reason(callback: CallbackQuery, state: FSMContext, sess
     
     reporter = await session.scalar(
         select(User).where(User.tg_id == callback.from_user.id))
-    reported_user = await session.scalar(
-        select(User).where(func.lower(User.faceit_nickname) == faceit_nickname.lower()))
+    reported_user = await rq.get_user_by_nickname(session, faceit_nickname)
     
     if not reporter or not reported_user:
         await callback.answer("Ошибка: пользователь не найден", show_alert=True)
@@ -2790,6 +2817,7 @@ async def process_report_reason(callback: CallbackQuery, state: FSMContext, sess
             logger.error(f"Не удалось уведомить о бане: {e}")
     
     await session.commit()
+    await rq.sync_search_candidate(session, reported_user.id)
     
     await callback.message.edit_text(
         f"✅ Жалоба на игрока {reported_user.faceit_nickname} отправлена!",
@@ -3403,7 +3431,8 @@ async def handle_api_stats_callback(callback: CallbackQuery, faceit_service: Fac
         f"• Размер кеша: {stats['cache_size']}\n"
         f"• Попаданий в кеш: {stats.get('cache_hits', 'N/A')}\n"
         f"• Промахов кеша: {stats.get('cache_misses', 'N/A')}\n"
-        f"• Процент ошибок: {stats['error_count'] / stats['total_requests'] * 100 if stats['total_requests'] > 0 else 0:.2f}%\n\n"
+        f"• Процент ошибок: {stats['error_count'] / stats['total_requests'] * 100 if stats['total_requests'] > 0 else 0:.2f}%\n"
+        f"• Объединено запросов: {stats.get('coalesced_requests', 0)} ({stats.get('coalesce_rate', 0.0):.2%})\n\n"
         "ℹ️ Статистика сохраняется между перезапусками бота"
     )
     
@@ -3517,14 +3546,13 @@ async def handle_api_stats_callback(callback: CallbackQuery, faceit_service: Fac
     await callback.answer()
 
 @router.callback_query(F.data == "refresh_api_stats")
-async def refresh_api_stats(callback: CallbackQuery, faceit_service: FaceitService):
-    await show_api_stats(callback.message, faceit_service)
+async def refresh_api_stats(callback: CallbackQuery, faceit_service: FaceitService, session: AsyncSession):
+    await show_api_stats(callback.message, faceit_service, session)
     await callback.answer("Статистика обновлена")
 
 @router.callback_query(F.data == "clear_api_cache")
 async def clear_api_cache(callback: CallbackQuery, faceit_service: FaceitService):
-    if hasattr(faceit_service, 'cache'):
-        faceit_service.cache.clear()
+    await faceit_service.refresh_cache()
     await callback.answer("Кеш очищен ✅")
 
 @router.callback_query(F.data == "api_stats_details")
@@ -3716,23 +3744,22 @@ async def show_detailed_user_stats(callback: CallbackQuery, session: AsyncSessio
 
 @router.callback_query(F.data == "api_history")
 async def show_api_history(callback: CallbackQuery, session: AsyncSession):
-    # Получаем последние 10 записей статистики
-    result = await session.execute(
-        select(APIServiceStats)
-        .order_by(APIServiceStats.recorded_at.desc())
-        .limit(10)
-    )
-    stats_list = result.scalars().all()
+    # Итоги по часам и по дням из свернутых снимков статистики
+    hourly, daily = await rq.get_api_stats_history(session)
     
-    response = "📊 История статистики API:\n\n"
-    for stat in stats_list:
-        response += (
-            f"📅 {stat.recorded_at.strftime('%Y-%m-%d %H:%M')}\n"
-            f"• Запросы: {stat.total_requests}\n"
-            f"• Ошибки: {stat.error_count}\n"
-            f"• Кеш: {stat.cache_size} (попаданий: {stat.cache_hits})\n\n"
+    def format_period(row, fmt: str) -> str:
+        cache_total = (row.cache_hits or 0) + (row.cache_misses or 0)
+        hit_rate = (row.cache_hits or 0) / cache_total if cache_total else 0.0
+        return (
+            f"{row.period.strftime(fmt)}: запросы {row.requests or 0}, "
+            f"ошибки {row.errors or 0}, кеш {hit_rate:.0%}\n"
         )
     
+    response = "📊 История статистики API:\n\n🕐 По часам (UTC):\n"
+    response += "".join(format_period(row, '%d.%m %H:00') for row in hourly) or "Нет данных\n"
+    response += "\n📅 По дням:\n"
+    response += "".join(format_period(row, '%d.%m.%Y') for row in daily) or "Нет данных\n"
+    
     await callback.message.edit_text(response)
     await callback.answer()
 
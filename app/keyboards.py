@@ -53,7 +53,8 @@ def search_results():
     return InlineKeyboardMarkup(
         inline_keyboard=[
             [InlineKeyboardButton(text='📨 Пригласить всех', callback_data='invite_all')],
-            [InlineKeyboardButton(text='🔄 Новый поиск', callback_data='new_search')]
+            [InlineKeyboardButton(text='🔄 Новый поиск', callback_data='new_search')],
+            [InlineKeyboardButton(text='🔔 Уведомить о новых игроках', callback_data='notify_match')]
         ])
 
 def profile_settings(user_state: UserState) -> InlineKeyboardMarkup:
@@ -0,0 +1,79 @@
+"""
+Общие части бенчмарков: отдельная БД и синтетические пользователи.
+
+Бенчмарки очищают таблицы users и search_profiles, поэтому работают только
+с базой из BENCH_POSTGRES_URL и отказываются запускаться на базе бота (POSTGRES_URL).
+"""
+import os
+import time
+from typing import Awaitable, Callable, Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from database.base import Base
+from database.requests import TIMEZONE_RANGES
+from services.team_builder import ROLES
+
+
+def create_bench_engine() -> AsyncEngine:
+    url = os.getenv("BENCH_POSTGRES_URL")
+    if not url:
+        raise SystemExit("Укажите BENCH_POSTGRES_URL - отдельную базу, данные в ней будут удалены")
+    if url == os.getenv("POSTGRES_URL"):
+        raise SystemExit("BENCH_POSTGRES_URL совпадает с POSTGRES_URL - бенчмарк удалил бы данные бота")
+    return create_async_engine(url)
+
+
+async def seed_users(engine: AsyncEngine, size: int):
+    """
+    size синтетических игроков (player1 ... playerN) в users и search_profiles.
+    Данные детерминированы setseed, после загрузки выполняется ANALYZE.
+    """
+    timezones = list(TIMEZONE_RANGES)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(text("TRUNCATE users RESTART IDENTITY CASCADE"))
+        await conn.execute(text("SELECT setseed(0.42)"))
+        await conn.execute(
+            text(
+                "INSERT INTO users (id, tg_id, faceit_nickname, faceit_player_id, age, is_vip, invite_count, consent_accepted) "
+                "SELECT g, 1000000000 + g, 'player' || g, md5(g::text), 14 + (random() * 30)::int, false, 0, true "
+                "FROM generate_series(1, :size) g"
+            ),
+            {"size": size}
+        )
+        await conn.execute(
+            text(
+                "INSERT INTO search_profiles "
+                "(user_id, tg_id, faceit_nickname, age, elo, role, timezone, is_verified, search_team, "
+                "nickname_rating, is_banned, is_vip, updated_at) "
+                "SELECT u.id, u.tg_id, u.faceit_nickname, u.age, 500 + (random() * 2500)::int, "
+                "(:roles)[1 + (random() * (cardinality(:roles) - 1))::int], "
+                "(:timezones)[1 + (random() * (cardinality(:timezones) - 1))::int], "
+                "true, random() < 0.7, 50, random() < 0.01, false, now() "
+                "FROM users u"
+            ),
+            {"roles": ROLES, "timezones": timezones}
+        )
+        await conn.execute(text("ANALYZE users"))
+        await conn.execute(text("ANALYZE search_profiles"))
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+async def measure(call: Callable[[], Awaitable[object]], repeat: int, warmup: int = 5) -> Dict[str, float]:
+    """p50/p99 задержки call() в миллисекундах"""
+    for _ in range(warmup):
+        await call()
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await call()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return {'p50': percentile(latencies, 0.5), 'p99': percentile(latencies, 0.99)}
@@ -0,0 +1,146 @@
+"""
+Нагрузочный тест FaceitService против локальной заглушки Faceit API.
+
+Для каждого уровня параллельности создается новый FaceitService (пустой кеш, без второго
+уровня кеша и БД), который загружает заданное число разных игроков синтетической популяции.
+Печатаются пропускная способность, доля ошибок, квантили задержки вызова и HTTP-запроса
+и число ответов 429/5xx заглушки.
+
+    python -m benchmarks.faceit_load --concurrency 1,4,16,64 --requests 500 --keys 2
+    python -m benchmarks.faceit_load --base-url http://127.0.0.1:8081/data/v4 --mode bulk
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import time
+from contextlib import aclosing
+from typing import Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+from services.faceit import FaceitService
+from services.faceit_mock import add_mock_arguments, config_from_args, create_app
+
+from benchmarks.common import percentile
+
+
+async def mock_stats(session: aiohttp.ClientSession, root: str, reset: bool = False) -> Dict[str, int]:
+    if reset:
+        async with session.post(f"{root}/_mock/reset") as response:
+            return await response.json()
+    async with session.get(f"{root}/_mock/stats") as response:
+        return await response.json()
+
+
+async def run_level(args: argparse.Namespace, base_url: str, keys: List[str], concurrency: int, level: int) -> Dict[str, float]:
+    # FaceitService читает настройки окружения в конструкторе
+    os.environ["FACEIT_API_BASE_URL"] = base_url
+    service = FaceitService(session_pool=None, api_keys=keys)
+
+    rng = random.Random(args.seed + level)
+    nicknames = [f"player{index}" for index in rng.sample(range(args.players), min(args.requests, args.players))]
+    latencies: List[float] = []
+    calls = errors = 0
+
+    async def call(nickname: str):
+        nonlocal calls, errors
+        started = time.perf_counter()
+        try:
+            if args.mode == 'resolve':
+                result = await service.resolve_player(nickname)
+            else:
+                result = await service.get_player_stats(nickname)
+            if not result:
+                errors += 1
+        except Exception:
+            errors += 1
+        calls += 1
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    if args.mode == 'bulk':
+        # Пакет отдает результаты без времени отдельных вызовов - задержку показывают HTTP-квантили
+        async with aclosing(service.get_players_bulk(nicknames, with_stats=True, concurrency=concurrency)) as results:
+            async for _, result in results:
+                calls += 1
+                if not result:
+                    errors += 1
+    else:
+        pending = iter(nicknames)
+
+        async def worker():
+            for nickname in pending:
+                await call(nickname)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    http = service.metrics.summary(window=service.metrics.horizon)
+    await service.close()
+
+    return {
+        'concurrency': concurrency,
+        'calls': calls,
+        'errors': errors,
+        'throughput': calls / elapsed if elapsed else 0.0,
+        'p50': percentile(latencies, 0.5),
+        'p90': percentile(latencies, 0.9),
+        'p99': percentile(latencies, 0.99),
+        'http_requests': http['requests'],
+        'http_p99': http['p99'],
+    }
+
+
+def print_row(row: Dict[str, float], served: Dict[str, int]):
+    throttled = served.get('429', 0)
+    failed = served.get('500', 0) + served.get('503', 0)
+    print(
+        f"{row['concurrency']:>6} {row['calls']:>7} {row['errors']:>6} {row['throughput']:>9.1f} "
+        f"{row['p50'] * 1000:>8.1f} {row['p90'] * 1000:>8.1f} {row['p99'] * 1000:>8.1f} "
+        f"{row['http_requests']:>7} {row['http_p99'] * 1000:>9.1f} {throttled:>6} {failed:>6}"
+    )
+
+
+async def main(args: argparse.Namespace):
+    runner: Optional[web.AppRunner] = None
+    base_url = args.base_url
+    if base_url is None:
+        runner = web.AppRunner(create_app(config_from_args(args)))
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', args.port).start()
+        base_url = f"http://127.0.0.1:{args.port}/data/v4"
+    root = base_url.rstrip('/').rsplit('/data/v4', 1)[0]
+    keys = [f"load-test-key-{number}" for number in range(1, args.keys + 1)]
+
+    print(f"mode={args.mode} keys={args.keys} requests={args.requests} base_url={base_url}")
+    print(f"{'conc':>6} {'calls':>7} {'errors':>6} {'calls/s':>9} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} "
+          f"{'http':>7} {'http p99':>9} {'429':>6} {'5xx':>6}")
+    try:
+        async with aiohttp.ClientSession() as session:
+            for level, concurrency in enumerate(int(value) for value in args.concurrency.split(',')):
+                await mock_stats(session, root, reset=True)
+                row = await run_level(args, base_url, keys, concurrency, level)
+                print_row(row, await mock_stats(session, root))
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Нагрузочный тест FaceitService')
+    parser.add_argument('--base-url', help='адрес уже запущенной заглушки; по умолчанию заглушка запускается в процессе')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--mode', choices=['resolve', 'stats', 'bulk'], default='stats')
+    parser.add_argument('--concurrency', default='1,4,16,64', help='уровни параллельности через запятую')
+    parser.add_argument('--requests', type=int, default=500, help='игроков на каждом уровне')
+    parser.add_argument('--keys', type=int, default=2, help='число API-ключей клиента')
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    # Только нагрузка: без второго уровня кеша и шумных логов об ошибках
+    os.environ.setdefault("FACEIT_CACHE_BACKEND", "none")
+    logging.basicConfig(level=logging.CRITICAL)
+    asyncio.run(main(args))
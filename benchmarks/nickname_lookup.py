@@ -0,0 +1,97 @@
+"""
+Бенчмарк поиска пользователя по никнейму: до и после исправления индекса.
+
+«До» - прежний индекс по строковому литералу lower(btrim('faceit_nickname')) без триграммного,
+«после» - индексы из миграции a7e3f5c81b42 (lower(faceit_nickname) и GIN pg_trgm).
+Для каждого варианта печатаются p50/p99 get_user_by_nickname и find_similar_nicknames
+в миллисекундах и узлы сканирования из плана запроса.
+
+    BENCH_POSTGRES_URL=postgresql+asyncpg://.../bench python -m benchmarks.nickname_lookup
+    python -m benchmarks.nickname_lookup --size 100000 --repeat 200
+"""
+import argparse
+import asyncio
+import json
+import random
+
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects import postgresql
+
+from database.base import create_sessionmaker
+from database.models import User
+from database.requests import find_similar_nicknames, get_user_by_nickname
+
+from benchmarks.common import create_bench_engine, measure, seed_users
+
+BEFORE = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "DROP INDEX IF EXISTS ix_users_faceit_nickname_trgm",
+    "DROP INDEX IF EXISTS ix_users_faceit_nickname_lower",
+    "CREATE INDEX ix_users_faceit_nickname_lower ON users (lower(btrim('faceit_nickname')))",
+)
+AFTER = (
+    "DROP INDEX IF EXISTS ix_users_faceit_nickname_lower",
+    "CREATE INDEX ix_users_faceit_nickname_lower ON users (lower(faceit_nickname))",
+    "CREATE INDEX IF NOT EXISTS ix_users_faceit_nickname_trgm ON users USING gin (lower(faceit_nickname) gin_trgm_ops)",
+)
+
+
+def scan_nodes(plan: dict) -> list:
+    nodes = [plan['Node Type']] if 'Scan' in plan['Node Type'] else []
+    for child in plan.get('Plans', []):
+        nodes += scan_nodes(child)
+    return nodes
+
+
+async def explain(session, query) -> str:
+    sql = query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+    plan = await session.scalar(text(f"EXPLAIN (FORMAT JSON) {sql}"))
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return ', '.join(scan_nodes(plan[0]['Plan']))
+
+
+async def run_variant(engine, session_pool, name: str, statements: tuple, args: argparse.Namespace):
+    async with engine.begin() as conn:
+        for statement in statements:
+            await conn.execute(text(statement))
+        await conn.execute(text("ANALYZE users"))
+
+    rng = random.Random(args.seed)
+    async with session_pool() as session:
+        async def exact():
+            return await get_user_by_nickname(session, f"Player{rng.randint(1, args.size)}")
+
+        async def fuzzy():
+            # Опечатка: одна цифра никнейма заменена
+            nickname = f"player{rng.randint(1, args.size)}"
+            return await find_similar_nicknames(session, nickname[:-1] + str(rng.randint(0, 9)))
+
+        key = f"player{args.size // 2}"
+        exact_plan = await explain(session, select(User).where(func.lower(User.faceit_nickname) == key))
+        exact_result = await measure(exact, args.repeat)
+        fuzzy_result = await measure(fuzzy, max(args.repeat // 10, 10))
+
+    print(f"{name:>7} {'exact':>6} {exact_result['p50']:>9.2f} {exact_result['p99']:>9.2f}  {exact_plan}")
+    print(f"{name:>7} {'fuzzy':>6} {fuzzy_result['p50']:>9.2f} {fuzzy_result['p99']:>9.2f}")
+
+
+async def main(args: argparse.Namespace):
+    engine = create_bench_engine()
+    session_pool = create_sessionmaker(engine)
+    try:
+        await seed_users(engine, args.size)
+        print(f"users={args.size}")
+        print(f"{'index':>7} {'lookup':>6} {'p50 ms':>9} {'p99 ms':>9}  scan")
+        await run_variant(engine, session_pool, 'before', BEFORE, args)
+        await run_variant(engine, session_pool, 'after', AFTER, args)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Бенчмарк поиска по никнейму')
+    parser.add_argument('--size', type=int, default=1000000, help='число пользователей')
+    parser.add_argument('--repeat', type=int, default=500, help='точных поисков на вариант')
+    parser.add_argument('--seed', type=int, default=42)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,62 @@
+"""
+Бенчмарк способов случайной выборки кандидатов search_teammates.
+
+Для каждого размера базы создаются синтетические игроки, затем каждый способ выборки
+(_sample_candidate_ids) вызывается repeat раз со случайным ELO и часовым поясом
+искомого игрока. Печатаются p50/p99 задержки в миллисекундах.
+
+    BENCH_POSTGRES_URL=postgresql+asyncpg://.../bench python -m benchmarks.search_sampling
+    python -m benchmarks.search_sampling --sizes 10000,100000 --repeat 200
+"""
+import argparse
+import asyncio
+import random
+
+from database.base import create_sessionmaker
+from database.models import UserSettings
+from database.requests import (
+    SAMPLING_INDEX, SAMPLING_RANDOM, SAMPLING_TABLESAMPLE, SAMPLING_WINDOW, SEARCH_POOL_SIZE,
+    TIMEZONE_RANGES, _sample_candidate_ids
+)
+from database.search_index import candidate_index
+
+from benchmarks.common import create_bench_engine, measure, seed_users
+
+MODES = (SAMPLING_INDEX, SAMPLING_WINDOW, SAMPLING_TABLESAMPLE, SAMPLING_RANDOM)
+
+
+async def main(args: argparse.Namespace):
+    engine = create_bench_engine()
+    session_pool = create_sessionmaker(engine)
+    settings = UserSettings(min_age=12, max_age=60, elo_range=300)
+    rng = random.Random(args.seed)
+
+    print(f"{'users':>9} {'mode':>12} {'p50 ms':>9} {'p99 ms':>9}")
+    try:
+        for size in (int(value) for value in args.sizes.split(',')):
+            await seed_users(engine, size)
+            async with session_pool() as session:
+                await candidate_index.build(session)
+
+                for mode in MODES:
+                    async def call():
+                        elo = rng.randint(800, 2700)
+                        timezone = rng.choice(list(TIMEZONE_RANGES))
+                        return await _sample_candidate_ids(
+                            session, mode, SEARCH_POOL_SIZE, 0, settings,
+                            elo - settings.elo_range, elo + settings.elo_range,
+                            TIMEZONE_RANGES[timezone], [], []
+                        )
+
+                    result = await measure(call, args.repeat)
+                    print(f"{size:>9} {mode:>12} {result['p50']:>9.2f} {result['p99']:>9.2f}")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Бенчмарк выборки кандидатов поиска')
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='размеры базы через запятую')
+    parser.add_argument('--repeat', type=int, default=100, help='вызовов на каждый способ')
+    parser.add_argument('--seed', type=int, default=42)
+    asyncio.run(main(parser.parse_args()))
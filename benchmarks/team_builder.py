@@ -0,0 +1,75 @@
+"""
+Бенчмарк подбора состава TeamBuilder на синтетических пулах кандидатов.
+
+Для каждого размера пула build() вызывается repeat раз для случайного искомого игрока
+двумя способами: со списком кандидатов (CandidatePool строится в каждом вызове) и с уже
+построенным пулом, как в SearchSession. Печатаются p50/p99 задержки в миллисекундах
+и доля вызовов, остановленных по бюджету времени. БД не нужна.
+
+    python -m benchmarks.team_builder
+    python -m benchmarks.team_builder --sizes 100,1000,10000 --repeat 500 --budget 0.05
+"""
+import argparse
+import asyncio
+import logging
+import random
+from types import SimpleNamespace
+
+from database.requests import TIMEZONE_RANGES
+from services.team_builder import ROLES, CandidatePool, TeamBuilder
+
+from benchmarks.common import measure
+
+
+def synthetic_pool(size: int, rng: random.Random) -> list:
+    """Кандидаты с теми же распределениями, что и seed_users"""
+    timezones = list(TIMEZONE_RANGES)
+    return [
+        SimpleNamespace(
+            user_id=user_id,
+            faceit_nickname=f"player{user_id}",
+            role=rng.choice(ROLES + [None]),
+            elo=rng.randint(500, 3000),
+            age=rng.randint(14, 44),
+            nickname_rating=rng.randint(0, 100),
+            timezone=rng.choice(timezones)
+        )
+        for user_id in range(1, size + 1)
+    ]
+
+
+async def main(args: argparse.Namespace):
+    rng = random.Random(args.seed)
+    builder = TeamBuilder(time_budget=args.budget)
+
+    print(f"budget={args.budget * 1000:.0f} ms")
+    print(f"{'pool':>7} {'input':>6} {'p50 ms':>9} {'p99 ms':>9} {'budget hit':>11}")
+    for size in (int(value) for value in args.sizes.split(',')):
+        candidates = synthetic_pool(size, rng)
+        inputs = (('list', lambda: candidates), ('pool', lambda: CandidatePool(candidates)))
+
+        for name, prepare in inputs:
+            pool = prepare()
+
+            async def call():
+                return builder.build(
+                    rng.choice(ROLES + [None]), rng.randint(800, 2700), rng.choice(list(TIMEZONE_RANGES)),
+                    pool, elo_range=300, min_age=12, max_age=60
+                )
+
+            # Без прогрева: каждая остановка по бюджету приходится на замеренный вызов
+            hits = builder.budget_hits
+            result = await measure(call, args.repeat, warmup=0)
+            hit_rate = (builder.budget_hits - hits) / args.repeat
+            print(f"{size:>7} {name:>6} {result['p50']:>9.2f} {result['p99']:>9.2f} {hit_rate:>11.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Бенчмарк подбора состава TeamBuilder')
+    parser.add_argument('--sizes', default='100,1000,10000', help='размеры пула через запятую')
+    parser.add_argument('--repeat', type=int, default=200, help='вызовов на каждый размер')
+    parser.add_argument('--budget', type=float, default=TeamBuilder().time_budget, help='бюджет времени build() в секундах')
+    parser.add_argument('--seed', type=int, default=42)
+    # Предупреждения об остановке по бюджету считаются, а не печатаются
+    logging.basicConfig(level=logging.ERROR)
+    asyncio.run(main(parser.parse_args()))
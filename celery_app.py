@@ -5,6 +5,9 @@ from aiogram import Bot
 import os
 from dotenv import load_dotenv
 from services.faceit import FaceitService
+from services.match_store import match_store
+from database.requests import sync_search_profiles
+import database.requests as rq
 from database.models import User, UserState
 from sqlalchemy import select, update, func, extract
 from datetime import datetime
@@ -54,6 +57,14 @@ app.conf.beat_schedule = {
         'task': 'celery_app.check_blocked_users',
         'schedule': crontab(hour=2, minute=30),  # Выполнять ежедневно в 2:30
     },
+    'sync-match-history': {
+        'task': 'celery_app.sync_match_history',
+        'schedule': crontab(hour=4, minute=30),  # После обновления ELO
+    },
+    'compact-api-stats': {
+        'task': 'celery_app.compact_api_stats',
+        'schedule': crontab(minute=5),  # Каждый час: минутные снимки -> часовые -> суточные
+    },
 }
 
 
@@ -171,7 +182,7 @@ async def update_elos_async():
     
     async with session_pool() as session:
         users = await session.execute(
-            select(User.id, User.faceit_nickname)
+            select(User.id, User.faceit_nickname, User.faceit_player_id)
             .where(User.faceit_nickname.isnot(None))
         )
         users = users.all()
@@ -188,44 +199,62 @@ async def update_elos_async():
         
         update_count = 0
         nickname_update_count = 0
+        changed_ids = set()
         
-        for idx, user in enumerate(users):
-            user_id, nickname = user
-            logger.info(f"Обработка пользователя {idx+1}/{len(users)}: {nickname}")
-            
-            try:
-                if idx % 5 == 0:
-                    await asyncio.sleep(1)
+        # По player_id запрос находит игрока и после смены никнейма
+        by_identifier = {}
+        for user_id, nickname, player_id in users:
+            by_identifier.setdefault(player_id or nickname, []).append((user_id, nickname))
+        
+        processed = 0
+        async for identifier, player_data in faceit_service.get_players_bulk(by_identifier):
+            for user_id, nickname in by_identifier[identifier]:
+                processed += 1
+                if processed % 500 == 0:
+                    # Фиксируем пачками: ошибка одного пользователя не откатит всю ночную работу
+                    await session.commit()
+                    logger.info(f"Обработано пользователей: {processed}/{len(users)}")
                 
-                player_data = await faceit_service.get_player_stats(nickname)
                 if not player_data:
                     continue
-                    
+                
                 new_nickname = player_data.get('nickname')
-                if new_nickname and new_nickname != nickname:
-                    await session.execute(
-                        update(User)
-                        .where(User.id == user_id)
-                        .values(faceit_nickname=new_nickname)
-                    )
+                renamed = bool(new_nickname) and new_nickname != nickname
+                elo = player_data.get('faceit_elo')
+                if not (renamed or elo):
+                    continue
+                try:
+                    # Точка сохранения на пользователя: ошибка откатывает только его строки,
+                    # а не все незафиксированные обновления пачки
+                    async with session.begin_nested():
+                        if renamed:
+                            await session.execute(
+                                update(User)
+                                .where(User.id == user_id)
+                                .values(faceit_nickname=new_nickname)
+                            )
+                        if elo:
+                            await session.execute(
+                                update(UserState)
+                                .where(UserState.user_id == user_id)
+                                .values(elo=elo)
+                            )
+                except Exception as e:
+                    logger.error(f"Ошибка обновления ELO для {nickname}: {e}")
+                    continue
+                
+                if renamed:
+                    await faceit_service.rename_player(nickname, new_nickname, player_data['player_id'])
                     nickname_update_count += 1
+                    changed_ids.add(user_id)
                     logger.info(f"Обновлен никнейм: {nickname} -> {new_nickname}")
-                
-                elo = player_data.get('faceit_elo')
                 if elo:
-                    await session.execute(
-                        update(UserState)
-                        .where(UserState.user_id == user_id)
-                        .values(elo=elo)
-                    )
                     update_count += 1
-                    logger.info(f"Обновлен ELO для {nickname}: {elo}")
-                    
-            except Exception as e:
-                logger.error(f"Ошибка обновления ELO для {nickname}: {e}")
-                await session.rollback()
+                    changed_ids.add(user_id)
         
         await session.commit()
+        # Переносим изменения в проекцию поиска одним upsert
+        await sync_search_profiles(session, list(changed_ids))
         logger.info(f"Успешно обновлено: {update_count} ELO, {nickname_update_count} ников")
         await faceit_service.close()
 
@@ -241,7 +270,7 @@ def update_user_ages(self):
             today = datetime.utcnow()
             day, month = today.day, today.month
             
-            await session.execute(
+            result = await session.execute(
                 update(User)
                 .where(
                     extract('month', User.created_at) == month,
@@ -249,8 +278,11 @@ def update_user_ages(self):
                     User.age.isnot(None)
                 )
                 .values(age=User.age + 1)
+                .returning(User.id)
             )
+            updated_ids = result.scalars().all()
             await session.commit()
+            await sync_search_profiles(session, updated_ids)
     
     try:
         loop.run_until_complete(inner())
@@ -265,4 +297,71 @@ def update_user_ages(self):
         except Exception as e:
             logger.error(f"Ошибка при закрытии соединения: {e}")
         finally:
-            loop.close()
\ No newline at end of file
+            loop.close()
+
+
+@app.task(bind=True, max_retries=3)
+def compact_api_stats(self):
+    """Свертка снимков статистики Faceit API"""
+    loop = setup_async_environment()
+    engine = create_async_engine_with_config()
+    session_pool = create_sessionmaker(engine)
+    
+    async def inner():
+        async with session_pool() as session:
+            await rq.compact_api_stats(session)
+    
+    try:
+        loop.run_until_complete(inner())
+    except RedisConnectionError as e:
+        logger.error(f"Ошибка подключения к Redis: {e}")
+        self.retry(exc=e, countdown=60)
+    except Exception as e:
+        logger.error(f"Неожиданная ошибка: {e}")
+    finally:
+        try:
+            loop.run_until_complete(engine.dispose())
+        except Exception as e:
+            logger.error(f"Ошибка при закрытии соединения: {e}")
+        finally:
+            loop.close()
+
+
+@app.task(bind=True, max_retries=3)
+def sync_match_history(self):
+    """Инкрементальная синхронизация истории матчей в локальное хранилище"""
+    loop = setup_async_environment()
+    
+    try:
+        loop.run_until_complete(sync_match_history_async())
+    except RedisConnectionError as e:
+        logger.error(f"Ошибка подключения к Redis: {e}")
+        self.retry(exc=e, countdown=60)
+    except Exception as e:
+        logger.error(f"Неожиданная ошибка: {e}")
+    finally:
+        loop.close()
+
+async def sync_match_history_async():
+    engine = create_async_engine_with_config()
+    session_pool = create_sessionmaker(engine)
+    
+    async with session_pool() as session:
+        player_ids = (await session.execute(
+            select(User.faceit_player_id).where(User.faceit_player_id.isnot(None))
+        )).scalars().all()
+    
+    faceit_service = FaceitService(session_pool=session_pool, cache_ttl=3600, maxsize=1000)
+    await faceit_service.initialize()
+    try:
+        # Для каждого игрока запрашиваются только матчи новее последнего сохраненного
+        added = await match_store.sync_players(
+            session_pool,
+            faceit_service,
+            player_ids,
+            concurrency=faceit_service.max_concurrency_per_key * len(faceit_service.api_keys)
+        )
+        logger.info(f"История матчей синхронизирована: {len(player_ids)} игроков, новых матчей {added}")
+    finally:
+        await faceit_service.close()
+        await engine.dispose()
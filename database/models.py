@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Index, Integer, BigInteger, String, DateTime, ForeignKey, Boolean, Float, Text, func
+from sqlalchemy import Column, Index, Integer, BigInteger, String, DateTime, ForeignKey, Boolean, Float, Text, func, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.hybrid import hybrid_property
 from datetime import datetime
@@ -8,9 +8,6 @@ from database.base import Base
 
 class User(Base):
     __tablename__ = 'users'
-    __table_args__ = (
-        Index('ix_users_faceit_nickname_lower', func.lower(func.trim('faceit_nickname'))),
-    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     tg_id = Column(BigInteger, unique=True, nullable=False)
@@ -33,8 +30,15 @@ class User(Base):
     bans = relationship("BanList", back_populates="user", cascade="all, delete-orphan")
     given_ratings = relationship("UserReputation", foreign_keys="[UserReputation.reporter_id]", back_populates="reporter")
 
+# Индекс под регистронезависимый поиск по нику: func.lower(User.faceit_nickname) == ...
+# Триграммный GIN-индекс для нечеткого поиска создается миграцией (нужно расширение pg_trgm)
+Index('ix_users_faceit_nickname_lower', func.lower(User.faceit_nickname))
+
 class UserState(Base):
     __tablename__ = 'user_states'
+    __table_args__ = (
+        Index('ix_user_states_user_id', 'user_id'),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('users.id'))
@@ -48,6 +52,32 @@ class UserState(Base):
     
     user = relationship("User", back_populates="state")
 
+class SearchProfile(Base):
+    """Денормализованная проекция игрока для поиска тиммейтов и карточек результатов"""
+    __tablename__ = 'search_profiles'
+    __table_args__ = (
+        Index(
+            'ix_search_profiles_searchable', 'elo', 'user_id',
+            postgresql_include=['timezone', 'age'],
+            postgresql_where=text('search_team AND NOT is_banned AND is_verified IS NOT NULL AND elo IS NOT NULL')
+        ),
+    )
+
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    tg_id = Column(BigInteger)
+    faceit_nickname = Column(String(50))
+    age = Column(Integer)
+    elo = Column(Integer)
+    role = Column(String(50))
+    timezone = Column(String(20))
+    communication_method = Column(String(20))
+    is_verified = Column(Boolean)
+    search_team = Column(Boolean, default=False)
+    nickname_rating = Column(Integer)
+    is_banned = Column(Boolean, default=False)
+    is_vip = Column(Boolean, default=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
 class UserReport(Base):
     __tablename__ = 'user_reports'
     
@@ -63,6 +93,9 @@ class UserReport(Base):
 
 class UserRating(Base):
     __tablename__ = 'user_ratings'
+    __table_args__ = (
+        Index('ix_user_ratings_user_id', 'user_id'),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('users.id'))
@@ -140,6 +173,9 @@ class BanList(Base):
 
 class UserSettings(Base):
     __tablename__ = 'user_settings'
+    __table_args__ = (
+        Index('ix_user_settings_user_id', 'user_id'),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('users.id'))
@@ -182,4 +218,48 @@ class APIServiceStats(Base):
     avg_response_time = Column(Float, default=0.0)
     last_error = Column(Text, nullable=True)
     key_stats = Column(Text, nullable=True)
-    recorded_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    recorded_at = Column(DateTime, default=datetime.utcnow)
+    # Строка - приращения счетчиков за период [period_start, period_start + resolution):
+    # minute (снимки сервиса) сворачиваются в hour, hour - в day.
+    # legacy - накопленные итоги, которые сохранялись до перехода на приращения
+    resolution = Column(String(10), nullable=False, default='minute', server_default='minute')
+    period_start = Column(DateTime, nullable=True)
+    # JSON итогов пакетной загрузки игроков (get_players_bulk), завершившейся за период;
+    # пишет воркер Celery, читает админка бота
+    bulk_stats = Column(Text, nullable=True)
+
+    __table_args__ = (
+        Index('ix_api_service_stats_resolution_period', 'resolution', 'period_start'),
+    )
+
+
+class FaceitMatch(Base):
+    """Завершенный матч Faceit; статистика после завершения не меняется и хранится постоянно"""
+    __tablename__ = 'faceit_matches'
+
+    match_id = Column(String(64), primary_key=True)
+    game = Column(String(20))
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    stats = Column(Text, nullable=True)  # JSON ответа /matches/{id}/stats, загружается по требованию
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class FaceitPlayerMatch(Base):
+    """Матч в истории игрока: локальная копия /players/{id}/history"""
+    __tablename__ = 'faceit_player_matches'
+
+    player_id = Column(String(50), primary_key=True)
+    match_id = Column(String(64), ForeignKey('faceit_matches.match_id', ondelete='CASCADE'), primary_key=True)
+    finished_at = Column(DateTime, nullable=False)
+    faction = Column(String(20))
+    won = Column(Boolean, nullable=True)
+    score = Column(String(20), nullable=True)
+
+    __table_args__ = (
+        # Последний известный матч игрока и недавняя форма - одним проходом по индексу
+        Index(
+            'ix_faceit_player_matches_player_finished', 'player_id', 'finished_at',
+            postgresql_include=['won', 'score']
+        ),
+    )
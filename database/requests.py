@@ -1,9 +1,16 @@
-from database.models import User, UserState, UserRating, BanList, UserSettings
+from database.models import User, UserState, UserRating, BanList, UserSettings, SearchProfile, APIServiceStats, FaceitPlayerMatch
+from database.search_index import candidate_index
+from services.team_builder import team_builder
+from services.search_session import search_sessions
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import not_, select, func, text, update, or_, outerjoin, cast, BigInteger
-from sqlalchemy.orm import joinedload
+from sqlalchemy import not_, select, func, text, update, or_, outerjoin, cast, BigInteger, tablesample, delete, literal_column, union_all
+from sqlalchemy.orm import joinedload, aliased
+from sqlalchemy.dialects.postgresql import insert
 from aiogram import Bot 
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+import json
 import logging
 import random
 
@@ -26,14 +33,198 @@ TIMEZONE_RANGES = {
 }
 
 
-async def search_teammates(
+# Способы случайной выборки кандидатов в search_teammates
+SAMPLING_INDEX = 'index'              # in-memory индекс кандидатов
+SAMPLING_WINDOW = 'window'            # случайные окна по индексу ELO от случайных опорных ELO - смещенная выборка
+SAMPLING_TABLESAMPLE = 'tablesample'  # TABLESAMPLE SYSTEM по search_profiles + перемешивание выборки
+SAMPLING_RANDOM = 'random'            # ORDER BY random() - полная сортировка, оставлен для сравнения
+SAMPLING_MODES = (SAMPLING_INDEX, SAMPLING_WINDOW, SAMPLING_TABLESAMPLE, SAMPLING_RANDOM)
+
+# Размер пула кандидатов поисковой сессии
+SEARCH_POOL_SIZE = 100
+# Число окон random_window: чем больше окон, тем меньше соседей по ELO приходят вместе
+WINDOW_PROBES = 10
+
+
+def window_probes_query(query, column, tiebreak, pivots: list, size: int):
+    """UNION ALL окон random_window: по два keyset-запроса на опору (от опоры и с начала диапазона)"""
+    windows = []
+    for probe, pivot in enumerate(pivots):
+        for part, condition in enumerate((column >= pivot, column < pivot)):
+            windows.append(
+                query.add_columns(column, tiebreak, literal_column(str(probe)), literal_column(str(part)))
+                .where(condition)
+                .order_by(column, tiebreak)
+                .limit(size)
+            )
+    return union_all(*windows)
+
+
+async def random_window(
+    session: AsyncSession,
+    query,
+    column,
+    tiebreak,
+    low: int,
+    high: int,
+    limit: int,
+    probes: int = WINDOW_PROBES
+) -> list:
+    """
+    Случайные окна по индексу column: для probes опорных значений, выбранных равномерно
+    из [low, high], читается WHERE column >= опора ORDER BY column, tiebreak LIMIT k
+    (если до конца диапазона строк не хватило - окно продолжается с его начала).
+    Все окна читаются одним UNION ALL, каждое - коротким проходом по индексу,
+    без count(*) и OFFSET по всему набору. Возвращает первые колонки строк без повторов.
+
+    Выборка смещенная: игроки с соседними значениями column приходят вместе,
+    а игрок после редкого значения выпадает чаще. Для равномерной выборки - SAMPLING_INDEX.
+    """
+    if low > high:
+        return []
+    size = -(-limit // probes)
+    pivots = [random.randint(int(low), int(high)) for _ in range(probes)]
+    rows = (await session.execute(window_probes_query(query, column, tiebreak, pivots, size))).all()
+
+    # Порядок строк UNION ALL не гарантирован - восстанавливаем окна сортировкой.
+    # Последние колонки строки: column, tiebreak, номер окна, часть (0 - от опоры, 1 - с начала)
+    rows.sort(key=lambda row: (row[-2], row[-1], row[-4], row[-3]))
+    taken: Dict[int, int] = {}
+    result: Dict[Any, None] = {}
+    for row in rows:
+        probe = row[-2]
+        if taken.get(probe, 0) < size:
+            taken[probe] = taken.get(probe, 0) + 1
+            result.setdefault(row[0], None)
+    return list(result)[:limit]
+
+
+def _candidate_ids_query(
+    profile,
+    current_user_id: int,
+    settings: UserSettings,
+    elo_min: int,
+    elo_max: int,
+    allowed_timezones: list,
+    ban_list: list,
+    exclude_ids: list
+):
+    """ID игроков, подходящих под фильтры поиска (profile - SearchProfile или его выборка)"""
+    query = (
+        select(profile.user_id)
+        .where(
+            profile.user_id != current_user_id,
+            profile.search_team == True,
+            profile.elo.between(elo_min, elo_max),
+            profile.is_verified.is_not(None),
+            profile.faceit_nickname.is_not(None),
+            profile.age.between(settings.min_age, settings.max_age),
+            not_(profile.is_banned)
+        )
+    )
+
+    # Исключаем уже показанных игроков
+    if exclude_ids:
+        query = query.where(profile.user_id.notin_(exclude_ids))
+
+    # Фильтр по часовым поясам
+    if allowed_timezones:
+        query = query.where(profile.timezone.in_(allowed_timezones))
+
+    # Фильтр по бан-листу
+    if ban_list:
+        query = query.where(not_(func.lower(profile.faceit_nickname).in_(ban_list)))
+
+    return query
+
+
+async def _sample_candidate_ids(
+    session: AsyncSession,
+    sampling: str,
+    limit: int,
+    current_user_id: int,
+    settings: UserSettings,
+    elo_min: int,
+    elo_max: int,
+    allowed_timezones: list,
+    ban_list: list,
+    exclude_ids: list
+) -> list:
+    """Случайная выборка ID кандидатов выбранным способом"""
+    filters = (current_user_id, settings, elo_min, elo_max, allowed_timezones, ban_list, exclude_ids)
+
+    if sampling == SAMPLING_INDEX:
+        if candidate_index.ready:
+            return candidate_index.sample(
+                allowed_timezones,
+                elo_min,
+                elo_max,
+                settings.min_age,
+                settings.max_age,
+                exclude_ids=[current_user_id, *(exclude_ids or [])],
+                banned_nicknames=ban_list,
+                limit=limit
+            )
+        logger.warning("Индекс поиска еще не построен, используется выборка окном")
+        sampling = SAMPLING_WINDOW
+
+    if sampling == SAMPLING_TABLESAMPLE:
+        # SYSTEM читает только случайные страницы таблицы (BERNOULLI просматривает все).
+        # Процент выборки считаем по статистике планировщика, с запасом на фильтры;
+        # небольшую выборку перемешиваем, иначе LIMIT вернул бы первые строки в порядке страниц
+        estimated = await session.scalar(
+            text("SELECT reltuples FROM pg_class WHERE relname = 'search_profiles'")
+        )
+        percent = 100.0 if not estimated or estimated <= 0 else min(100.0, limit * 1000.0 / estimated)
+        sampled_profile = aliased(
+            SearchProfile,
+            tablesample(SearchProfile.__table__, func.system(percent), name='sampled_profiles')
+        )
+        result = await session.scalars(
+            _candidate_ids_query(sampled_profile, *filters)
+            .order_by(func.random())
+            .limit(limit)
+        )
+        candidate_ids = result.all()
+        if len(candidate_ids) >= 4:
+            return candidate_ids
+        # На маленькой выборке фильтры могли отсеять всех - добираем окном
+        sampling = SAMPLING_WINDOW
+
+    if sampling == SAMPLING_WINDOW:
+        return await random_window(
+            session,
+            _candidate_ids_query(SearchProfile, *filters),
+            SearchProfile.elo,
+            SearchProfile.user_id,
+            elo_min,
+            elo_max,
+            limit
+        )
+
+    result = await session.scalars(
+        _candidate_ids_query(SearchProfile, *filters)
+        .order_by(func.random())
+        .limit(limit)
+    )
+    return result.all()
+
+
+async def load_search_pool(
     session: AsyncSession,
     current_user_tg_id: int,
-    ban_list: list = None,
     elo_range: int = None,
-    limit: int = 100,  # Увеличено для большего разнообразия
-    exclude_ids: list = None  # Новый параметр для исключения уже показанных игроков
-):
+    limit: int = 100,
+    exclude_ids: list = None,
+    sampling: str = SAMPLING_INDEX
+) -> tuple:
+    """
+    Пул кандидатов (строки SearchProfile) и параметры подбора состава для текущего пользователя.
+    При ошибке или отсутствии профиля возвращает (None, []).
+    """
+    if sampling not in SAMPLING_MODES:
+        raise ValueError(f"Неизвестный способ выборки: {sampling}")
+
     try:
         # Получаем данные текущего пользователя с JOIN состояния и настроек
         current_user = await session.execute(
@@ -48,7 +239,7 @@ async def search_teammates(
 
         if not current_user or not current_user.state:
             logger.error("Текущий пользователь или его состояние не найдены")
-            return []
+            return None, []
 
         # Получаем настройки пользователя
         settings = current_user.settings or UserSettings(
@@ -72,104 +263,100 @@ async def search_teammates(
         current_timezone = current_user.state.timezone
         allowed_timezones = TIMEZONE_RANGES.get(current_timezone, [])
 
-        # Основной запрос с учетом настроек
-        query = (
-            select(User, UserState, UserSettings)  # Выбираем три сущности
-            .join(UserState, User.id == UserState.user_id)
-            .outerjoin(UserSettings, User.id == UserSettings.user_id)  # Outer join для настроек
-            .options(
-                joinedload(User.state),
-                joinedload(User.settings)  # Явная загрузка отношений
-            )
-            .where(
-                User.id != current_user.id,
-                UserState.search_team == True,
-                UserState.elo.is_not(None),
-                User.faceit_nickname.is_not(None),
-                User.age.between(settings.min_age, settings.max_age),
-                UserState.is_verified.is_not(None),
-                not_(UserRating.is_banned),
-                UserState.elo.between(
-                    current_user.state.elo - settings.elo_range,
-                    current_user.state.elo + settings.elo_range
-                )
-            )
-            .order_by(func.random())  # Добавлен случайный порядок
-            .limit(limit)
+        candidate_ids = await _sample_candidate_ids(
+            session,
+            sampling,
+            limit,
+            current_user.id,
+            settings,
+            current_user.state.elo - elo_range,
+            current_user.state.elo + elo_range,
+            allowed_timezones,
+            ban_list,
+            exclude_ids
         )
-        
-        # Исключаем уже показанных игроков
-        if exclude_ids:
-            query = query.where(User.id.notin_(exclude_ids))
-        
-        # Фильтр по часовым поясам
-        if allowed_timezones:
-            query = query.where(UserState.timezone.in_(allowed_timezones))
-            
-        # Фильтр по бан-листу
-        if ban_list:
-            query = query.where(
-                not_(func.lower(User.faceit_nickname).in_(ban_list))
-                if ban_list 
-                else True
-            ) 
-              
-        result = await session.execute(query)
-        teammates_data = result.all()
+        if not candidate_ids:
+            logger.info(f"Кандидаты не найдены (выборка: {sampling})")
+            return None, []
+
+        # Карточки выбранных кандидатов читаем одним запросом из проекции
+        result = await session.scalars(
+            select(SearchProfile).where(SearchProfile.user_id.in_(candidate_ids))
+        )
+        teammates_data = list(result.all())
         logger.info(f"Найдено {len(teammates_data)} потенциальных тиммейтов")
         
-        # Новая улучшенная логика фильтрации по ролям
-        filtered_teammates = []
-        unique_roles = ["in-Game Leader (IGL)", "AWPer", "Support/Lurker", "Entry Fragger"]
-        current_role = current_user.state.role
-        
-        # Перемешиваем результаты перед обработкой
-        random.shuffle(teammates_data)
-        
-        # Определяем нужные роли в зависимости от роли текущего пользователя
-        if current_role and (current_role in unique_roles or current_role == "Опорник"):
-            if current_role in unique_roles:
-                # Для уникальных ролей: нужны все остальные уникальные + опорник
-                needed_roles = set(unique_roles) - {current_role}
-                needed_roles.add("Опорник")
-            else:  # current_role == "Опорник"
-                # Для опорника: нужны все уникальные роли
-                needed_roles = set(unique_roles)
-            
-            added_roles = set()
-            
-            for teammate in teammates_data:
-                _, state, _ = teammate
-                role = state.role
-                
-                if role and role in needed_roles and role not in added_roles:
-                    filtered_teammates.append(teammate)
-                    added_roles.add(role)
-                    
-                    # Останавливаемся когда набрали 4 игрока
-                    if len(filtered_teammates) == 4:
-                        break
-            
-            # Если не набрали нужное количество по ролям, добавляем случайных игроков
-            if len(filtered_teammates) < 4:
-                for teammate in teammates_data:
-                    if teammate not in filtered_teammates:
-                        filtered_teammates.append(teammate)
-                        if len(filtered_teammates) == 4:
-                            break
-        else:
-            # Для пользователей без роли или с неизвестной ролью
-            # Берем первых 4 игроков из перемешанного списка
-            filtered_teammates = teammates_data[:4]
-        
-        return filtered_teammates
+        params = {
+            'current_role': current_user.state.role,
+            'current_elo': current_user.state.elo,
+            'current_timezone': current_timezone,
+            'elo_range': elo_range,
+            'min_age': settings.min_age,
+            'max_age': settings.max_age
+        }
+        return params, teammates_data
     
     except Exception as e:
         # Обязательный откат при ошибках
         await session.rollback()
         logger.error(f'Ошибка при поиске тиммейтов: {e}', exc_info=True)
+        return None, []
+
+
+async def search_teammates(
+    session: AsyncSession,
+    current_user_tg_id: int,
+    ban_list: list = None,
+    elo_range: int = None,
+    limit: int = 100,  # Увеличено для большего разнообразия
+    exclude_ids: list = None,  # Новый параметр для исключения уже показанных игроков
+    sampling: str = SAMPLING_INDEX
+):
+    params, teammates_data = await load_search_pool(
+        session, current_user_tg_id, elo_range, limit, exclude_ids, sampling
+    )
+    if not teammates_data:
         return []
 
+    # Состав подбирается по покрытию ролей, близости ELO, репутации и часового пояса
+    return team_builder.build(candidates=teammates_data, **params)
+
+
+async def next_search_page(
+    session: AsyncSession,
+    current_user_tg_id: int,
+    ban_list: list = None,
+    elo_range: int = None,
+    fresh: bool = False
+):
+    """
+    Следующий состав из поисковой сессии пользователя.
+    БД читается только при новой сессии, смене диапазона ELO или когда пул исчерпан.
+    """
+    search = None if fresh else search_sessions.get(current_user_tg_id)
+    if search is not None and elo_range is not None and search.params['elo_range'] != elo_range:
+        search = None
+
+    available = search.available(ban_list) if search else None
+    if available is None or not available.any():
+        shown = list(search.shown) if search else None
+        params, pool = await load_search_pool(
+            session, current_user_tg_id, elo_range, SEARCH_POOL_SIZE, exclude_ids=shown
+        )
+        if not pool and shown:
+            # Показали всех подходящих игроков - начинаем круг заново
+            params, pool = await load_search_pool(session, current_user_tg_id, elo_range, SEARCH_POOL_SIZE)
+        if not pool:
+            search_sessions.invalidate(current_user_tg_id)
+            return []
+        search = search_sessions.start(current_user_tg_id, params, pool)
+        available = search.available(ban_list)
+
+    # Массивы пула построены при загрузке; между нажатиями меняется только маска
+    team = team_builder.build(candidates=search.candidates, available=available, **search.params)
+    search.mark_shown(team)
+    return team
+
 async def add_to_ban_list(
     session: AsyncSession, 
     user_id: int, 
@@ -196,4 +383,313 @@ async def remove_blocked_users(session: AsyncSession, bot: Bot):
             if "bot was blocked" in str(e).lower():
                 logger.info(f"Удаляем заблокированного пользователя: {user.tg_id}")
                 await session.delete(user)
-    await session.commit()
\ No newline at end of file
+    await session.commit()
+
+
+def _search_profile_source():
+    """SELECT строк проекции search_profiles из users, user_states и user_ratings"""
+    rating = (
+        select(UserRating.nickname_rating)
+        .where(UserRating.user_id == User.id)
+        .order_by(UserRating.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+    banned = (
+        select(func.coalesce(func.bool_or(UserRating.is_banned), False))
+        .where(UserRating.user_id == User.id)
+        .scalar_subquery()
+    )
+    # DISTINCT ON: по одной строке на пользователя, даже если состояний несколько
+    return (
+        select(
+            User.id,
+            User.tg_id,
+            User.faceit_nickname,
+            User.age,
+            UserState.elo,
+            UserState.role,
+            UserState.timezone,
+            UserState.communication_method,
+            UserState.is_verified,
+            func.coalesce(UserState.search_team, False),
+            rating,
+            banned,
+            func.coalesce(User.is_vip, False),
+            func.now()
+        )
+        .outerjoin(UserState, User.id == UserState.user_id)
+        .distinct(User.id)
+        .order_by(User.id, UserState.id.desc())
+    )
+
+
+SEARCH_PROFILE_COLUMNS = [
+    'user_id', 'tg_id', 'faceit_nickname', 'age', 'elo', 'role', 'timezone',
+    'communication_method', 'is_verified', 'search_team', 'nickname_rating',
+    'is_banned', 'is_vip', 'updated_at'
+]
+
+
+async def sync_search_profiles(session: AsyncSession, user_ids: list = None):
+    """
+    Пересобирает строки search_profiles одним INSERT ... ON CONFLICT DO UPDATE.
+    Без user_ids пересобирается вся проекция.
+    """
+    source = _search_profile_source()
+    if user_ids is not None:
+        if not user_ids:
+            return
+        source = source.where(User.id.in_(user_ids))
+
+    stmt = insert(SearchProfile).from_select(SEARCH_PROFILE_COLUMNS, source)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[SearchProfile.user_id],
+        set_={column: stmt.excluded[column] for column in SEARCH_PROFILE_COLUMNS[1:]}
+    )
+    await session.execute(stmt)
+    await session.commit()
+
+
+async def ensure_search_profiles(session: AsyncSession):
+    """Заполняет проекцию при первом запуске, если таблица была создана пустой"""
+    has_profiles = await session.scalar(select(SearchProfile.user_id).limit(1))
+    if has_profiles is None:
+        logger.info("Проекция search_profiles пуста, заполняем из users")
+        await sync_search_profiles(session)
+
+
+async def sync_search_candidate(session: AsyncSession, user_id: int):
+    """Обновляет проекцию и индекс поиска после изменения профиля игрока"""
+    try:
+        await sync_search_profiles(session, [user_id])
+        await candidate_index.refresh_user(session, user_id)
+    except Exception as e:
+        await session.rollback()
+        logger.error(f"Ошибка обновления индекса поиска для {user_id}: {e}", exc_info=True)
+
+
+async def get_user_by_nickname(session: AsyncSession, nickname: str) -> User | None:
+    """Регистронезависимый поиск пользователя по Faceit никнейму (по индексу lower(faceit_nickname))"""
+    result = await session.execute(
+        select(User).where(func.lower(User.faceit_nickname) == nickname.lower().strip())
+    )
+    return result.scalars().first()
+
+
+async def find_similar_nicknames(
+    session: AsyncSession,
+    nickname: str,
+    limit: int = 3,
+    threshold: float = 0.3
+) -> list:
+    """Похожие никнеймы для подсказки «возможно, вы имели в виду» (pg_trgm)"""
+    key = nickname.lower().strip()
+    nickname_lower = func.lower(User.faceit_nickname)
+    similarity = func.similarity(nickname_lower, key)
+
+    try:
+        # Оператор % использует триграммный GIN-индекс, similarity - для сортировки
+        result = await session.execute(
+            select(User.faceit_nickname)
+            .where(
+                nickname_lower.op('%')(key),
+                similarity >= threshold
+            )
+            .order_by(similarity.desc())
+            .limit(limit)
+        )
+        return result.scalars().all()
+    except SQLAlchemyError as e:
+        await session.rollback()
+        logger.error(f"Ошибка нечеткого поиска никнейма {nickname}: {e}")
+        return []
+
+
+# Свертка снимков статистики API: (исходное разрешение, целевое, сколько хранить исходные строки)
+STATS_ROLLUPS = (
+    ('minute', 'hour', timedelta(days=1)),
+    ('hour', 'day', timedelta(days=30)),
+)
+
+
+def _period_floor(moment: datetime, resolution: str) -> datetime:
+    if resolution == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def merge_key_stats(values: Iterable[Optional[str]]) -> Dict[str, Dict[str, int]]:
+    """Суммирует JSON key_stats нескольких строк: {маскированный ключ: {'requests', 'errors'}}"""
+    totals: Dict[str, Dict[str, int]] = {}
+    for value in values:
+        if not value:
+            continue
+        try:
+            items = json.loads(value)
+        except json.JSONDecodeError:
+            continue
+        if not isinstance(items, list):
+            continue
+        for item in items:
+            key = item.get('key') if isinstance(item, dict) else None
+            if not key:
+                continue
+            # legacy-строки хранили ключ целиком; маскирование идемпотентно
+            usage = totals.setdefault(f"{key[:5]}...{key[-5:]}", {'requests': 0, 'errors': 0})
+            usage['requests'] += item.get('requests') or 0
+            usage['errors'] += item.get('errors') or 0
+    return totals
+
+
+def _merge_stats_rows(rows: List[APIServiceStats], resolution: str, period_start: datetime) -> APIServiceStats:
+    rows = sorted(rows, key=lambda row: row.period_start)
+    requests = sum(row.total_requests or 0 for row in rows)
+    hits = sum(row.cache_hits or 0 for row in rows)
+    misses = sum(row.cache_misses or 0 for row in rows)
+    key_stats = merge_key_stats(row.key_stats for row in rows)
+
+    return APIServiceStats(
+        resolution=resolution,
+        period_start=period_start,
+        total_requests=requests,
+        error_count=sum(row.error_count or 0 for row in rows),
+        cache_size=rows[-1].cache_size,
+        cache_hits=hits,
+        cache_misses=misses,
+        cache_hit_rate=hits / (hits + misses) if hits + misses > 0 else 0.0,
+        requests_last_hour=max(row.requests_last_hour or 0 for row in rows),
+        avg_response_time=(
+            sum((row.avg_response_time or 0.0) * (row.total_requests or 0) for row in rows) / requests
+            if requests else 0.0
+        ),
+        last_error=next((row.last_error for row in reversed(rows) if row.last_error), None),
+        key_stats=json.dumps([{'key': key, **usage} for key, usage in key_stats.items()]),
+        bulk_stats=next((row.bulk_stats for row in reversed(rows) if row.bulk_stats), None),
+        recorded_at=max(row.recorded_at for row in rows)
+    )
+
+
+async def compact_api_stats(session: AsyncSession, now: Optional[datetime] = None) -> int:
+    """
+    Сворачивает старые снимки статистики API: минутные старше суток - в часовые,
+    часовые старше 30 дней - в суточные. Возвращает число свернутых строк.
+    """
+    now = now or datetime.utcnow()
+    compacted = 0
+
+    try:
+        for source, target, retention in STATS_ROLLUPS:
+            # Только завершенные целевые периоды: граница выровнена по началу периода
+            cutoff = _period_floor(now - retention, target)
+            rows = (await session.execute(
+                select(APIServiceStats)
+                .where(APIServiceStats.resolution == source, APIServiceStats.period_start < cutoff)
+            )).scalars().all()
+            if not rows:
+                continue
+
+            groups: Dict[datetime, List[APIServiceStats]] = {}
+            for row in rows:
+                groups.setdefault(_period_floor(row.period_start, target), []).append(row)
+
+            # Строки целевого разрешения за те же периоды (от прошлых сверток) вливаются в новые
+            existing = (await session.execute(
+                select(APIServiceStats)
+                .where(APIServiceStats.resolution == target, APIServiceStats.period_start.in_(list(groups)))
+            )).scalars().all()
+            for row in existing:
+                groups[row.period_start].append(row)
+
+            merged_ids = [row.id for group in groups.values() for row in group]
+            session.add_all(
+                _merge_stats_rows(group, target, period_start) for period_start, group in groups.items()
+            )
+            await session.execute(
+                delete(APIServiceStats)
+                .where(APIServiceStats.id.in_(merged_ids))
+                .execution_options(synchronize_session=False)
+            )
+            compacted += len(rows)
+
+        await session.commit()
+        logger.info(f"Свернуто снимков статистики API: {compacted}")
+        return compacted
+    except SQLAlchemyError as e:
+        await session.rollback()
+        logger.error(f"Ошибка свертки статистики API: {e}", exc_info=True)
+        return 0
+
+
+async def get_api_stats_history(session: AsyncSession, hours: int = 12, days: int = 7) -> tuple:
+    """
+    Почасовые итоги за последние hours часов и посуточные за days дней.
+    Запросы идут по свернутым строкам (индекс по resolution, period_start),
+    поэтому объем чтения не зависит от времени работы бота.
+    """
+    now = datetime.utcnow()
+
+    def totals(period, resolutions, since):
+        return (
+            select(
+                period.label('period'),
+                func.sum(APIServiceStats.total_requests).label('requests'),
+                func.sum(APIServiceStats.error_count).label('errors'),
+                func.sum(APIServiceStats.cache_hits).label('cache_hits'),
+                func.sum(APIServiceStats.cache_misses).label('cache_misses')
+            )
+            .where(APIServiceStats.resolution.in_(resolutions), APIServiceStats.period_start >= since)
+            .group_by(period)
+            .order_by(period.desc())
+        )
+
+    try:
+        hourly = await session.execute(totals(
+            func.date_trunc('hour', APIServiceStats.period_start),
+            ('minute', 'hour'),
+            _period_floor(now, 'hour') - timedelta(hours=hours - 1)
+        ))
+        daily = await session.execute(totals(
+            func.date_trunc('day', APIServiceStats.period_start),
+            ('minute', 'hour', 'day'),
+            _period_floor(now, 'day') - timedelta(days=days - 1)
+        ))
+        return hourly.all(), daily.all()
+    except SQLAlchemyError as e:
+        await session.rollback()
+        logger.error(f"Ошибка получения истории статистики API: {e}")
+        return [], []
+
+
+async def get_last_bulk_stats(session: AsyncSession) -> Optional[Dict[str, Any]]:
+    """Итоги последней пакетной загрузки игроков (ночное обновление ELO в воркере) и время записи"""
+    try:
+        row = (await session.execute(
+            select(APIServiceStats.bulk_stats, APIServiceStats.recorded_at)
+            .where(APIServiceStats.bulk_stats.isnot(None))
+            .order_by(APIServiceStats.recorded_at.desc())
+            .limit(1)
+        )).first()
+    except SQLAlchemyError as e:
+        await session.rollback()
+        logger.error(f"Ошибка получения итогов пакетной загрузки: {e}")
+        return None
+    if row is None:
+        return None
+    return {**json.loads(row.bulk_stats), 'recorded_at': row.recorded_at}
+
+
+async def get_recent_form(session: AsyncSession, player_id: str, limit: int = 5) -> list:
+    """Последние матчи игрока из локального хранилища (match_id, won, score, finished_at), новые первыми"""
+    try:
+        result = await session.execute(
+            select(FaceitPlayerMatch.match_id, FaceitPlayerMatch.won, FaceitPlayerMatch.score, FaceitPlayerMatch.finished_at)
+            .where(FaceitPlayerMatch.player_id == player_id)
+            .order_by(FaceitPlayerMatch.finished_at.desc())
+            .limit(limit)
+        )
+        return result.all()
+    except SQLAlchemyError as e:
+        await session.rollback()
+        logger.error(f"Ошибка получения формы игрока {player_id}: {e}")
+        return []
@@ -0,0 +1,222 @@
+import asyncio
+import bisect
+import logging
+import random
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, not_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import SearchProfile
+
+logger = logging.getLogger(__name__)
+
+
+class Candidate:
+    """Игрок, доступный для поиска тиммейтов"""
+    __slots__ = ('user_id', 'nickname', 'age', 'elo', 'timezone', 'role')
+
+    def __init__(self, user_id: int, nickname: str, age: int, elo: int, timezone: Optional[str], role: Optional[str]):
+        self.user_id = user_id
+        self.nickname = nickname
+        self.age = age
+        self.elo = elo
+        self.timezone = timezone
+        self.role = role
+
+
+class CandidateIndex:
+    """
+    In-memory индекс игроков для поиска тиммейтов.
+    Игроки разбиты по часовым поясам, внутри пояса отсортированы по ELO,
+    поэтому поиск сводится к бинарному поиску диапазона и случайной выборке.
+    """
+
+    def __init__(self):
+        self.candidates: Dict[int, Candidate] = {}
+        self.buckets: Dict[Optional[str], List[Tuple[int, int]]] = {}
+        self.ready = False
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self.candidates)
+
+    @staticmethod
+    def _searchable_query():
+        """Запрос всех игроков, которые должны попадать в поиск (читает проекцию search_profiles)"""
+        return (
+            select(
+                SearchProfile.user_id,
+                SearchProfile.faceit_nickname,
+                SearchProfile.age,
+                SearchProfile.elo,
+                SearchProfile.timezone,
+                SearchProfile.role
+            )
+            .where(
+                SearchProfile.search_team == True,
+                SearchProfile.elo.is_not(None),
+                SearchProfile.is_verified.is_not(None),
+                SearchProfile.faceit_nickname.is_not(None),
+                SearchProfile.age.is_not(None),
+                not_(SearchProfile.is_banned)
+            )
+        )
+
+    async def build(self, session: AsyncSession):
+        """Полностью перестраивает индекс по данным из БД"""
+        result = await session.execute(self._searchable_query())
+
+        candidates: Dict[int, Candidate] = {}
+        for user_id, nickname, age, elo, timezone, role in result.all():
+            candidates[user_id] = Candidate(user_id, nickname, age, elo, timezone, role)
+
+        buckets: Dict[Optional[str], List[Tuple[int, int]]] = {}
+        for candidate in candidates.values():
+            buckets.setdefault(candidate.timezone, []).append((candidate.elo, candidate.user_id))
+        for bucket in buckets.values():
+            bucket.sort()
+
+        # Подменяем структуры целиком, чтобы поиск не видел частично построенный индекс
+        self.candidates = candidates
+        self.buckets = buckets
+        self.ready = True
+        logger.info(f"Индекс поиска построен: {len(candidates)} игроков, {len(buckets)} часовых поясов")
+
+    async def refresh_user(self, session: AsyncSession, user_id: int):
+        """Перечитывает одного игрока из БД и обновляет его запись в индексе"""
+        result = await session.execute(
+            self._searchable_query().where(SearchProfile.user_id == user_id)
+        )
+        row = result.first()
+
+        if row is None:
+            self.remove(user_id)
+            return
+
+        user_id, nickname, age, elo, timezone, role = row
+        self.upsert(Candidate(user_id, nickname, age, elo, timezone, role))
+
+    def upsert(self, candidate: Candidate):
+        """Добавляет или обновляет игрока в индексе"""
+        self.remove(candidate.user_id)
+        self.candidates[candidate.user_id] = candidate
+        bisect.insort(
+            self.buckets.setdefault(candidate.timezone, []),
+            (candidate.elo, candidate.user_id)
+        )
+
+    def remove(self, user_id: int):
+        """Удаляет игрока из индекса (если он там есть)"""
+        candidate = self.candidates.pop(user_id, None)
+        if candidate is None:
+            return
+
+        bucket = self.buckets.get(candidate.timezone)
+        if not bucket:
+            return
+
+        key = (candidate.elo, candidate.user_id)
+        pos = bisect.bisect_left(bucket, key)
+        if pos < len(bucket) and bucket[pos] == key:
+            del bucket[pos]
+        if not bucket:
+            del self.buckets[candidate.timezone]
+
+    def sample(
+        self,
+        timezones: Optional[Iterable[str]],
+        elo_min: int,
+        elo_max: int,
+        min_age: int,
+        max_age: int,
+        exclude_ids: Optional[Iterable[int]] = None,
+        banned_nicknames: Optional[Iterable[str]] = None,
+        limit: int = 100
+    ) -> List[int]:
+        """
+        Возвращает до limit случайных ID игроков из диапазона ELO в указанных
+        часовых поясах. Пустой список поясов означает поиск по всем поясам.
+        """
+        zones = list(timezones) if timezones else list(self.buckets)
+
+        # Диапазоны в отсортированных корзинах: (корзина, начало, длина)
+        ranges = []
+        total = 0
+        for zone in zones:
+            bucket = self.buckets.get(zone)
+            if not bucket:
+                continue
+            lo = bisect.bisect_left(bucket, (elo_min,))
+            hi = bisect.bisect_right(bucket, (elo_max, float('inf')))
+            if hi > lo:
+                ranges.append((bucket, lo, hi - lo))
+                total += hi - lo
+
+        if not total:
+            return []
+
+        exclude = set(exclude_ids or ())
+        banned = {nickname.lower().strip() for nickname in banned_nicknames or ()}
+
+        def at(position: int) -> int:
+            for bucket, start, length in ranges:
+                if position < length:
+                    return bucket[start + position][1]
+                position -= length
+            raise IndexError(position)
+
+        picked: List[int] = []
+
+        def take(positions) -> bool:
+            for position in positions:
+                candidate = self.candidates.get(at(position))
+                if candidate is None or candidate.user_id in exclude:
+                    continue
+                if not min_age <= candidate.age <= max_age:
+                    continue
+                if banned and candidate.nickname.lower().strip() in banned:
+                    continue
+                picked.append(candidate.user_id)
+                if len(picked) >= limit:
+                    return True
+            return False
+
+        # Сначала пробуем небольшую случайную выборку позиций,
+        # и только если фильтры отсеяли слишком много - перебираем остаток
+        first_pass = random.sample(range(total), min(total, limit * 2))
+        if take(first_pass) or len(first_pass) == total:
+            return picked
+
+        seen = set(first_pass)
+        rest = [position for position in range(total) if position not in seen]
+        random.shuffle(rest)
+        take(rest)
+        return picked
+
+    def start_periodic_refresh(self, session_pool, interval: int = 900):
+        """Запускает фоновую перестройку индекса (подхватывает изменения от Celery)"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._periodic_refresh(session_pool, interval))
+
+    async def stop_periodic_refresh(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+    async def _periodic_refresh(self, session_pool, interval: int):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with session_pool() as session:
+                    await self.build(session)
+            except Exception as e:
+                logger.error(f"Ошибка перестройки индекса поиска: {e}", exc_info=True)
+
+
+# Единый индекс процесса бота
+candidate_index = CandidateIndex()
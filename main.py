@@ -12,6 +12,9 @@ from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 
 from database.base import create_async_engine_with_config, init_db, create_sessionmaker, migrate_database
+from database.search_index import candidate_index
+from database.requests import ensure_search_profiles
+from services.subscriptions import subscription_engine
 from services.faceit import FaceitService
 from app.handlers import router
 from app.middleware import DbSessionMiddleware, ServiceMiddleware, ErrorHandlingMiddleware
@@ -65,6 +68,17 @@ class BotRunner:
                 maxsize=1000
             )
             await self.faceit_service.initialize()
+            # Снимки статистики API пишутся в БД периодически, а не только при остановке
+            self.faceit_service.start_snapshots()
+
+            # 3. Проекция search_profiles и индекс поиска тиммейтов
+            async with self.async_session_maker() as session:
+                await ensure_search_profiles(session)
+                await candidate_index.build(session)
+            candidate_index.start_periodic_refresh(
+                self.async_session_maker,
+                interval=int(os.getenv("SEARCH_INDEX_REFRESH_INTERVAL", "900"))
+            )
             
             return True
         except Exception as e:
@@ -97,6 +111,9 @@ class BotRunner:
             "successful_payment"
         ]
 
+        # Рассылка уведомлений по подпискам на поиск
+        subscription_engine.start(bot)
+
         try:
             logger.info("Запуск бота...")
             await dp.start_polling(
@@ -109,11 +126,13 @@ class BotRunner:
             logger.error(f"Ошибка в работе бота: {e}", exc_info=True)
             return False
         finally:
+            await subscription_engine.stop()
             await bot.session.close()
 
     async def cleanup(self):
         """Очистка ресурсов"""
         logger.info("Очистка ресурсов...")
+        await candidate_index.stop_periodic_refresh()
         if hasattr(self, 'faceit_service'):
             await self.faceit_service.close()
             logger.info("FaceitService закрыт")
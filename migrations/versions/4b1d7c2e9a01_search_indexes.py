@@ -0,0 +1,54 @@
+"""search indexes
+
+Revision ID: 4b1d7c2e9a01
+Revises:
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b1d7c2e9a01'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+SEARCHABLE_PREDICATE = 'search_team AND elo IS NOT NULL AND is_verified IS NOT NULL'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY, чтобы не блокировать запись в таблицы на работающем боте
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_user_states_user_id', 'user_states', ['user_id'],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        op.create_index(
+            'ix_user_ratings_user_id', 'user_ratings', ['user_id'],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        op.create_index(
+            'ix_user_settings_user_id', 'user_settings', ['user_id'],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        op.create_index(
+            'ix_user_states_searchable', 'user_states', ['elo', 'user_id'],
+            postgresql_include=['timezone'],
+            postgresql_where=sa.text(SEARCHABLE_PREDICATE),
+            postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_user_states_searchable', table_name='user_states', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_user_settings_user_id', table_name='user_settings', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_user_ratings_user_id', table_name='user_ratings', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_user_states_user_id', table_name='user_states', postgresql_concurrently=True, if_exists=True)
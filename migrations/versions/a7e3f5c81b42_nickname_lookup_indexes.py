@@ -0,0 +1,56 @@
+"""nickname lookup indexes
+
+Revision ID: a7e3f5c81b42
+Revises: 4b1d7c2e9a01
+Create Date: 2026-10-18 12:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7e3f5c81b42'
+down_revision: Union[str, None] = '4b1d7c2e9a01'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    with op.get_context().autocommit_block():
+        # Старый индекс был построен по строковому литералу 'faceit_nickname', а не по колонке
+        op.drop_index(
+            'ix_users_faceit_nickname_lower', table_name='users',
+            postgresql_concurrently=True, if_exists=True
+        )
+        op.create_index(
+            'ix_users_faceit_nickname_lower', 'users', [sa.text('lower(faceit_nickname)')],
+            postgresql_concurrently=True
+        )
+        op.create_index(
+            'ix_users_faceit_nickname_trgm', 'users', [sa.text('lower(faceit_nickname) gin_trgm_ops')],
+            postgresql_using='gin',
+            postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_users_faceit_nickname_trgm', table_name='users',
+            postgresql_concurrently=True, if_exists=True
+        )
+        op.drop_index(
+            'ix_users_faceit_nickname_lower', table_name='users',
+            postgresql_concurrently=True, if_exists=True
+        )
+        op.create_index(
+            'ix_users_faceit_nickname_lower', 'users', [sa.text("lower(btrim('faceit_nickname'))")],
+            postgresql_concurrently=True
+        )
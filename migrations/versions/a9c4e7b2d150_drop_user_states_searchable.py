@@ -0,0 +1,39 @@
+"""drop user_states searchable index
+
+Revision ID: a9c4e7b2d150
+Revises: f3b8d1e6a924
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9c4e7b2d150'
+down_revision: Union[str, None] = 'f3b8d1e6a924'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+SEARCHABLE_PREDICATE = 'search_team AND elo IS NOT NULL AND is_verified IS NOT NULL'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Поиск читает search_profiles и индекс кандидатов в памяти - индекс user_states больше не используется
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_user_states_searchable', table_name='user_states', postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_user_states_searchable', 'user_states', ['elo', 'user_id'],
+            postgresql_include=['timezone'],
+            postgresql_where=sa.text(SEARCHABLE_PREDICATE),
+            postgresql_concurrently=True, if_not_exists=True
+        )
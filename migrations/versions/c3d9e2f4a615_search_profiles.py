@@ -0,0 +1,76 @@
+"""search profiles projection
+
+Revision ID: c3d9e2f4a615
+Revises: a7e3f5c81b42
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3d9e2f4a615'
+down_revision: Union[str, None] = 'a7e3f5c81b42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+SEARCHABLE_PREDICATE = 'search_team AND NOT is_banned AND is_verified IS NOT NULL AND elo IS NOT NULL'
+
+# По одной строке на пользователя: последнее состояние, первый рейтинг, бан если забанен хоть в одной записи
+BACKFILL = """
+INSERT INTO search_profiles (
+    user_id, tg_id, faceit_nickname, age, elo, role, timezone,
+    communication_method, is_verified, search_team, nickname_rating,
+    is_banned, is_vip, updated_at
+)
+SELECT DISTINCT ON (u.id)
+    u.id, u.tg_id, u.faceit_nickname, u.age, s.elo, s.role, s.timezone,
+    s.communication_method, s.is_verified, coalesce(s.search_team, false),
+    (SELECT r.nickname_rating FROM user_ratings r WHERE r.user_id = u.id ORDER BY r.id LIMIT 1),
+    (SELECT coalesce(bool_or(r.is_banned), false) FROM user_ratings r WHERE r.user_id = u.id),
+    coalesce(u.is_vip, false),
+    now()
+FROM users u
+LEFT OUTER JOIN user_states s ON s.user_id = u.id
+ORDER BY u.id, s.id DESC
+ON CONFLICT (user_id) DO NOTHING
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'search_profiles',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('tg_id', sa.BigInteger()),
+        sa.Column('faceit_nickname', sa.String(length=50)),
+        sa.Column('age', sa.Integer()),
+        sa.Column('elo', sa.Integer()),
+        sa.Column('role', sa.String(length=50)),
+        sa.Column('timezone', sa.String(length=20)),
+        sa.Column('communication_method', sa.String(length=20)),
+        sa.Column('is_verified', sa.Boolean()),
+        sa.Column('search_team', sa.Boolean()),
+        sa.Column('nickname_rating', sa.Integer()),
+        sa.Column('is_banned', sa.Boolean()),
+        sa.Column('is_vip', sa.Boolean()),
+        sa.Column('updated_at', sa.DateTime()),
+        if_not_exists=True
+    )
+    op.execute(BACKFILL)
+    op.create_index(
+        'ix_search_profiles_searchable', 'search_profiles', ['elo', 'user_id'],
+        postgresql_include=['timezone', 'age'],
+        postgresql_where=sa.text(SEARCHABLE_PREDICATE),
+        if_not_exists=True
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_search_profiles_searchable', table_name='search_profiles', if_exists=True)
+    op.drop_table('search_profiles')
@@ -0,0 +1,47 @@
+"""api service stats resolution
+
+Revision ID: d5f1a8b3c726
+Revises: c3d9e2f4a615
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5f1a8b3c726'
+down_revision: Union[str, None] = 'c3d9e2f4a615'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # При запуске бота create_all создает таблицу уже с новыми колонками и индексом
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('api_service_stats')}
+
+    if 'resolution' not in columns:
+        op.add_column(
+            'api_service_stats',
+            sa.Column('resolution', sa.String(length=10), nullable=False, server_default='minute')
+        )
+    if 'period_start' not in columns:
+        op.add_column('api_service_stats', sa.Column('period_start', sa.DateTime(), nullable=True))
+    if 'resolution' not in columns:
+        # Старые строки хранят накопленные итоги, а не приращения за период
+        op.execute("UPDATE api_service_stats SET resolution = 'legacy', period_start = recorded_at")
+
+    op.create_index(
+        'ix_api_service_stats_resolution_period', 'api_service_stats', ['resolution', 'period_start'],
+        if_not_exists=True
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_api_service_stats_resolution_period', table_name='api_service_stats', if_exists=True)
+    op.drop_column('api_service_stats', 'period_start')
+    op.drop_column('api_service_stats', 'resolution')
@@ -0,0 +1,56 @@
+"""faceit match store
+
+Revision ID: e7a2c4d9b813
+Revises: d5f1a8b3c726
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a2c4d9b813'
+down_revision: Union[str, None] = 'd5f1a8b3c726'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'faceit_matches',
+        sa.Column('match_id', sa.String(length=64), nullable=False),
+        sa.Column('game', sa.String(length=20), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('stats', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('match_id'),
+        if_not_exists=True
+    )
+    op.create_table(
+        'faceit_player_matches',
+        sa.Column('player_id', sa.String(length=50), nullable=False),
+        sa.Column('match_id', sa.String(length=64), nullable=False),
+        sa.Column('finished_at', sa.DateTime(), nullable=False),
+        sa.Column('faction', sa.String(length=20), nullable=True),
+        sa.Column('won', sa.Boolean(), nullable=True),
+        sa.Column('score', sa.String(length=20), nullable=True),
+        sa.ForeignKeyConstraint(['match_id'], ['faceit_matches.match_id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('player_id', 'match_id'),
+        if_not_exists=True
+    )
+    op.create_index(
+        'ix_faceit_player_matches_player_finished', 'faceit_player_matches', ['player_id', 'finished_at'],
+        postgresql_include=['won', 'score'], if_not_exists=True
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_faceit_player_matches_player_finished', table_name='faceit_player_matches', if_exists=True)
+    op.drop_table('faceit_player_matches')
+    op.drop_table('faceit_matches')
@@ -0,0 +1,31 @@
+"""api service stats bulk
+
+Revision ID: f3b8d1e6a924
+Revises: e7a2c4d9b813
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b8d1e6a924'
+down_revision: Union[str, None] = 'e7a2c4d9b813'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # При запуске бота create_all создает таблицу уже с новой колонкой
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('api_service_stats')}
+    if 'bulk_stats' not in columns:
+        op.add_column('api_service_stats', sa.Column('bulk_stats', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('api_service_stats', 'bulk_stats')
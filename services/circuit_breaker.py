@@ -0,0 +1,115 @@
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Запрос не отправлен: цепь семейства эндпоинтов разомкнута"""
+
+    def __init__(self, family: str, retry_after: float):
+        super().__init__(f"Faceit API ({family}) временно недоступен, повтор через {retry_after:.0f} с")
+        self.family = family
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Заголовок Retry-After: число секунд или HTTP-дата"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max((moment - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class CircuitBreaker:
+    """
+    Предохранитель для одного семейства эндпоинтов.
+
+    closed - запросы идут, последовательные сбои считаются;
+    open - после failure_threshold сбоев подряд запросы отклоняются без обращения к сети
+    на время backoff (экспоненциально растет с каждым размыканием, со случайным разбросом,
+    не меньше Retry-After из ответов со сбоями; сам Retry-After цепь не размыкает);
+    half_open - по истечении backoff пропускается один пробный запрос: успех замыкает цепь,
+    сбой снова размыкает ее с удвоенным backoff.
+    """
+    __slots__ = (
+        'name', 'failure_threshold', 'base_backoff', 'max_backoff',
+        'state', 'failures', 'trips', 'open_until', 'retry_not_before', 'probe_in_flight', 'rejected'
+    )
+
+    def __init__(self, name: str, failure_threshold: int = 5, base_backoff: float = 2.0, max_backoff: float = 120.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self.state = CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.open_until = 0.0
+        # Самый поздний момент из Retry-After сбоев с последнего успеха - нижняя граница open_until
+        self.retry_not_before = 0.0
+        self.probe_in_flight = False
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """Можно ли отправить запрос; в half_open пропускает только один пробный"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if time.monotonic() < self.open_until:
+                self.rejected += 1
+                return False
+            self.state = HALF_OPEN
+        if self.probe_in_flight:
+            self.rejected += 1
+            return False
+        self.probe_in_flight = True
+        return True
+
+    def retry_in(self) -> float:
+        """Через сколько секунд цепь пропустит пробный запрос"""
+        return max(self.open_until - time.monotonic(), 0.0)
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.retry_not_before = 0.0
+        self.probe_in_flight = False
+
+    def record_failure(self, retry_after: Optional[float] = None):
+        self.failures += 1
+        if retry_after:
+            self.retry_not_before = max(self.retry_not_before, time.monotonic() + retry_after)
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self._trip()
+
+    def release(self):
+        """Пробный запрос завершился без результата (например, отменен) - разрешаем следующий"""
+        if self.state == HALF_OPEN:
+            self.probe_in_flight = False
+
+    def _trip(self):
+        self.trips += 1
+        backoff = min(self.max_backoff, self.base_backoff * 2 ** (self.trips - 1))
+        # Разброс от половины до полного backoff, чтобы процессы не просыпались одновременно
+        delay = random.uniform(backoff / 2, backoff)
+        self.state = OPEN
+        self.open_until = max(time.monotonic() + delay, self.retry_not_before)
+        self.probe_in_flight = False
@@ -4,17 +4,30 @@ import logging
 import time
 import os
 import json
-from typing import Optional, Dict, Any, List, Tuple
+import re
+import sys
+from typing import Optional, Dict, Any, List, Tuple, Awaitable, Callable, Union, Iterable, AsyncIterator
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete, or_, and_
+from sqlalchemy import select, delete, or_, and_, func
 from cachetools import TTLCache
-from collections import defaultdict
+from collections import defaultdict, deque
 from datetime import datetime
 
-from database.models import APIServiceStats, User, UserState, UserRating, UserActivity
+from database.models import APIServiceStats, User, UserState, UserRating, UserActivity, SearchProfile
+from database.search_index import candidate_index
+from database.requests import random_window, merge_key_stats, SAMPLING_WINDOW, SAMPLING_RANDOM
+from services.rate_limiter import TokenBucket
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError, parse_retry_after
+from services.faceit_cache import CachedPlayer, create_cache_backend
+from services.metrics import MetricsRegistry
 
 logger = logging.getLogger(__name__)
 
+ENDPOINT_FAMILIES = ('players', 'stats', 'history', 'matches')
+
+# player_id Faceit - UUID; все остальное в get_players_bulk считается никнеймом
+_PLAYER_ID = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}')
+
 class FaceitService:
     def __init__(self, session_pool, api_keys: Optional[List[str]] = None, cache_ttl: int = 3600, maxsize: int = 1000):
         self.session_pool = session_pool
@@ -26,6 +39,9 @@ class FaceitService:
         
         self.api_keys = api_keys
         
+        # Адрес Data API; для нагрузочных тестов - локальная заглушка (services/faceit_mock.py)
+        self.base_url = os.getenv("FACEIT_API_BASE_URL", "https://open.faceit.com/data/v4").rstrip('/')
+        
         if not self.api_keys:
             logger.warning("No Faceit API keys provided in environment variables!")
             self.api_keys = [""]  # Защита от пустого списка
@@ -33,151 +49,318 @@ class FaceitService:
         # Статистика использования ключей
         self.key_usage = {key: {"requests": 0, "errors": 0, "last_used": 0} for key in self.api_keys}
         self.current_key_index = 0
+
+        # Параллельные запросы ограничиваются отдельно для каждого ключа
+        self.max_concurrency_per_key = int(os.getenv("FACEIT_MAX_CONCURRENCY_PER_KEY", "4"))
+        self.key_semaphores = {key: asyncio.Semaphore(self.max_concurrency_per_key) for key in self.api_keys}
+        self.key_in_flight = {key: 0 for key in self.api_keys}
+
+        # Бюджет запросов каждого ключа: FACEIT_KEY_RATE запросов в секунду, запас до FACEIT_KEY_BURST
+        self.key_rate = float(os.getenv("FACEIT_KEY_RATE", "10"))
+        self.key_burst = float(os.getenv("FACEIT_KEY_BURST", "20"))
+        self.key_buckets = {key: TokenBucket(self.key_rate, self.key_burst) for key in self.api_keys}
+
+        # Ожидание свободного токена
+        self.queued_requests = 0
+        self.queue_waits = deque(maxlen=1000)
+        self.queue_wait_max = 0.0
+
+        # Одинаковые одновременные запросы ждут один общий результат
+        self.in_flight_requests: Dict[str, asyncio.Task] = {}
+        self.in_flight_waiters: Dict[str, int] = {}
+        self.coalesce_stats = defaultdict(int)
+        # Итоги последней пакетной загрузки get_players_bulk; пишутся в снимок статистики,
+        # чтобы админка бота видела загрузки воркера
+        self.bulk_stats: Dict[str, float] = {}
+        self.bulk_runs = 0
+        self._flushed_bulk_runs = 0
+
+        # Пул HTTP-соединений: общий лимит по умолчанию покрывает все параллельные запросы всех ключей
+        self.http_limit = int(os.getenv("FACEIT_HTTP_LIMIT", str(self.max_concurrency_per_key * len(self.api_keys))))
+        self.http_timeout = aiohttp.ClientTimeout(
+            total=float(os.getenv("FACEIT_HTTP_TIMEOUT", "15")),
+            connect=float(os.getenv("FACEIT_HTTP_CONNECT_TIMEOUT", "5")),
+            sock_read=float(os.getenv("FACEIT_HTTP_READ_TIMEOUT", "10"))
+        )
+        self.pool_stats = defaultdict(float)
+
+        # Предохранители по семействам эндпоинтов: при деградации Faceit запросы
+        # отклоняются сразу, без сети, пока не пройдет пробный запрос
+        self.breakers = {
+            family: CircuitBreaker(
+                family,
+                failure_threshold=int(os.getenv("FACEIT_BREAKER_THRESHOLD", "5")),
+                base_backoff=float(os.getenv("FACEIT_BREAKER_BACKOFF", "2")),
+                max_backoff=float(os.getenv("FACEIT_BREAKER_MAX_BACKOFF", "120"))
+            )
+            for family in ENDPOINT_FAMILIES
+        }
         
-        # Кеширование
-        self.cache = TTLCache(maxsize=maxsize, ttl=cache_ttl)
+        # Кеширование: первый уровень в памяти процесса, второй - общий для бота и воркера.
+        # После мягкого TTL (cache_ttl) запись отдается как устаревшая и обновляется в фоне,
+        # после жесткого TTL удаляется; «не найден» хранится negative_ttl секунд
+        self.soft_ttl = cache_ttl
+        self.hard_ttl = int(os.getenv("FACEIT_CACHE_HARD_TTL", str(cache_ttl * 24)))
+        self.negative_ttl = int(os.getenv("FACEIT_CACHE_NEGATIVE_TTL", "300"))
+        # Игрок в кеше - компактная запись CachedPlayer; полный ответ API хранится сжатым
+        # только при FACEIT_CACHE_KEEP_RAW=1 (вызывающие читают лишь поля записи)
+        maxsize = int(os.getenv("FACEIT_CACHE_MAXSIZE", str(maxsize)))
+        self.keep_raw = os.getenv("FACEIT_CACHE_KEEP_RAW", "0") == "1"
+        self.cache = TTLCache(maxsize=maxsize, ttl=self.hard_ttl)
+        # Записи игроков хранятся по player_id, никнеймы (в нижнем регистре) ведут на player_id
+        self.aliases = TTLCache(maxsize=maxsize * 2, ttl=self.hard_ttl)
+        self.refresh_tasks = set()
         self.cache_stats = defaultdict(int)
+        self.l2_cache = create_cache_backend()
         
         # Общая статистика
         self.total_requests = 0
         self.error_count = 0
         self.last_errors = []
-        self.request_timestamps = []
-        self.request_lock = asyncio.Lock()
-
-        # Атрибуты для загрузки/сохранения статистики
-        self.requests_last_hour = 0
-        self.avg_response_time = 0.0
-        self.last_error = None
-        self.cache_hits = 0
-        self.cache_misses = 0
-        self.cache_size = 0
-        self.cache_hit_rate = 0.0
+        # Задержки, ошибки и пропускная способность за 1м/5м/1ч: общие, по эндпоинтам и по ключам
+        self.metrics = MetricsRegistry()
+
+        # Снимки статистики: в api_service_stats пишутся приращения с прошлого снимка
+        self.response_time_total = 0.0
+        self.responses = 0
+        self._flushed: Dict[str, float] = {}
+        self._flushed_keys: Dict[str, Tuple[int, int]] = {}
+        self._flushed_at = datetime.utcnow()
+        self._snapshot_task: Optional[asyncio.Task] = None
     
     async def initialize(self):
-        """Инициализирует сервис, загружая статистику из БД"""
+        """Инициализирует сервис: создает пул соединений и загружает статистику из БД"""
+        if self.session is None or self.session.closed:
+            self.session = self._create_http_session()
+        
         async with self.session_pool() as session:
             await self.load_stats(session)
 
+    def _create_http_session(self) -> aiohttp.ClientSession:
+        """HTTP-сессия с настроенным пулом соединений, таймаутами и учетом переиспользования соединений"""
+        connector = aiohttp.TCPConnector(
+            limit=self.http_limit,
+            limit_per_host=self.http_limit,
+            ttl_dns_cache=300,
+            keepalive_timeout=30
+        )
+        
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(self._on_connection_created)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reused)
+        trace_config.on_connection_queued_start.append(self._on_connection_queued_start)
+        trace_config.on_connection_queued_end.append(self._on_connection_queued_end)
+        
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=self.http_timeout,
+            trace_configs=[trace_config]
+        )
+
+    async def _on_connection_created(self, session, context, params):
+        self.pool_stats['connections_created'] += 1
+
+    async def _on_connection_reused(self, session, context, params):
+        self.pool_stats['connections_reused'] += 1
+
+    async def _on_connection_queued_start(self, session, context, params):
+        # Все соединения пула заняты - запрос ждет свободное
+        context.pool_queued_at = time.monotonic()
+        self.pool_stats['queued'] += 1
+        self.pool_stats['waiting'] += 1
+
+    async def _on_connection_queued_end(self, session, context, params):
+        self.pool_stats['waiting'] -= 1
+        self.pool_stats['queue_time'] += time.monotonic() - context.pool_queued_at
+
     async def load_stats(self, session: AsyncSession):
-        """Загружает статистику из базы данных"""
+        """
+        Восстанавливает накопленные счетчики из api_service_stats:
+        последний legacy-итог плюс сумма приращений всех строк minute/hour/day
+        """
         try:
-            # Получаем последнюю запись статистики
-            result = await session.execute(
+            baseline = await session.scalar(
                 select(APIServiceStats)
+                .where(APIServiceStats.resolution == 'legacy')
                 .order_by(APIServiceStats.recorded_at.desc())
                 .limit(1)
             )
-            stats_record = result.scalar_one_or_none()
-        
-            if not stats_record:
-                logger.info("Статистика не найдена, используется состояние по умолчанию")
-                return
+            totals = (await session.execute(
+                select(
+                    func.coalesce(func.sum(APIServiceStats.total_requests), 0),
+                    func.coalesce(func.sum(APIServiceStats.error_count), 0),
+                    func.coalesce(func.sum(APIServiceStats.cache_hits), 0),
+                    func.coalesce(func.sum(APIServiceStats.cache_misses), 0)
+                )
+                .where(APIServiceStats.resolution != 'legacy')
+            )).one()
+            key_rows = (await session.execute(
+                select(APIServiceStats.key_stats)
+                .where(APIServiceStats.resolution != 'legacy', APIServiceStats.key_stats.isnot(None))
+            )).scalars().all()
             
-            # Десериализуем данные
-            stats = {
-                'total_requests': stats_record.total_requests,
-                'error_count': stats_record.error_count,
-                'cache_size': stats_record.cache_size,
-                'cache_hits': stats_record.cache_hits,
-                'cache_misses': stats_record.cache_misses,
-                'cache_hit_rate': stats_record.cache_hit_rate,
-                'requests_last_hour': stats_record.requests_last_hour,
-                'avg_response_time': stats_record.avg_response_time,
-                'last_error': stats_record.last_error
-            }
-        
-            # Обрабатываем key_stats как список словарей
-            key_stats = []
-            if stats_record.key_stats:
-                try:
-                    key_stats = json.loads(stats_record.key_stats)
-                    if not isinstance(key_stats, list):
-                        key_stats = []
-                except json.JSONDecodeError:
-                    logger.error("Ошибка декодирования key_stats")
-                    key_stats = []
-        
-            stats['key_stats'] = key_stats
-        
-            # Обновляем состояние сервиса
-            self.total_requests = stats['total_requests']
-            self.error_count = stats['error_count']
-            self.cache_size = stats['cache_size']
-            self.cache_hits = stats['cache_hits']
-            self.cache_misses = stats['cache_misses']
-            self.cache_hit_rate = stats['cache_hit_rate']
-            self.requests_last_hour = stats['requests_last_hour']
-            self.avg_response_time = stats['avg_response_time']
-            self.last_error = stats['last_error']
-            self.key_stats = stats['key_stats']
-        
-            logger.info(f"Статистика загружена: {stats}")
+            if baseline is not None:
+                key_rows = [baseline.key_stats, *key_rows]
+            key_totals = merge_key_stats(key_rows)
+            
+            def base(column: str) -> int:
+                return (getattr(baseline, column) or 0) if baseline is not None else 0
+            
+            self.total_requests = base('total_requests') + totals[0]
+            self.error_count = base('error_count') + totals[1]
+            self.cache_stats['hits'] = base('cache_hits') + totals[2]
+            self.cache_stats['misses'] = base('cache_misses') + totals[3]
+            
+            for key in self.api_keys:
+                usage = key_totals.get(self._mask_key(key))
+                if usage:
+                    self.key_usage[key]["requests"] = usage["requests"]
+                    self.key_usage[key]["errors"] = usage["errors"]
+            
+            # Загруженные значения уже в базе - следующий снимок запишет только новые приращения
+            self._mark_flushed()
+            logger.info(
+                f"Статистика загружена: запросов {self.total_requests}, ошибок {self.error_count}, "
+                f"кеш {self.cache_stats['hits']}/{self.cache_stats['misses']}"
+            )
         except Exception as e:
             logger.error(f"Error loading API stats: {e}", exc_info=True)
 
+    @staticmethod
+    def _mask_key(key: str) -> str:
+        return f"{key[:5]}...{key[-5:]}"
+
+    def _counters(self) -> Dict[str, float]:
+        """Накопленные счетчики, приращения которых пишутся в снимки"""
+        return {
+            'total_requests': self.total_requests,
+            'error_count': self.error_count,
+            'cache_hits': (
+                self.cache_stats['hits'] + self.cache_stats['stale_hits'] + self.cache_stats['negative_hits']
+            ),
+            'cache_misses': self.cache_stats['misses'],
+            'response_time': self.response_time_total,
+            'responses': self.responses
+        }
+
+    def _key_counters(self) -> Dict[str, Tuple[int, int]]:
+        return {key: (usage["requests"], usage["errors"]) for key, usage in self.key_usage.items()}
+
+    def _mark_flushed(self):
+        self._flushed = self._counters()
+        self._flushed_keys = self._key_counters()
+        self._flushed_at = datetime.utcnow()
+
+    @staticmethod
+    def _delta(current: float, previous: float) -> float:
+        # Счетчик уменьшился - его сбросили (очистка кеша), приращение - все текущее значение
+        return current - previous if current >= previous else current
+
     async def save_stats(self, session: AsyncSession):
-        """Сохраняет статистику в базу данных"""
+        """
+        Записывает приращения счетчиков с прошлого снимка одной строкой resolution='minute'.
+        Период без запросов и обращений к кешу не записывается.
+        """
         try:
-            # Рассчитываем процент попаданий в кеш
-            total_cache = self.cache_hits + self.cache_misses
-            cache_hit_rate = self.cache_hits / total_cache if total_cache > 0 else 0.0
+            # Снимок берется до записи: запросы, завершившиеся во время commit, попадут в следующий
+            snapshot_at = datetime.utcnow()
+            counters = self._counters()
+            key_counters = self._key_counters()
+            bulk_runs = self.bulk_runs
+            bulk_stats = json.dumps(self.bulk_stats) if bulk_runs != self._flushed_bulk_runs else None
+            delta = {name: self._delta(value, self._flushed.get(name, 0)) for name, value in counters.items()}
             
-            # Подготавливаем статистику по ключам
             key_stats = []
-            for key, usage in self.key_usage.items():
-                key_stats.append({
-                    'key': key,
-                    'requests': usage['requests'],
-                    'errors': usage['errors'],
-                    'last_used': datetime.fromtimestamp(usage['last_used']).isoformat() if usage['last_used'] else None
-                })
+            for key, (current_requests, current_errors) in key_counters.items():
+                requests, errors = self._flushed_keys.get(key, (0, 0))
+                key_requests = self._delta(current_requests, requests)
+                key_errors = self._delta(current_errors, errors)
+                if key_requests or key_errors:
+                    key_stats.append({
+                        'key': self._mask_key(key),
+                        'requests': key_requests,
+                        'errors': key_errors
+                    })
             
-            # Сериализуем key_stats в JSON
-            key_stats_json = json.dumps(key_stats)
+            if not (delta['total_requests'] or delta['cache_hits'] or delta['cache_misses'] or key_stats or bulk_stats):
+                return
             
-            # Создаем новую запись статистики
-            new_stats = APIServiceStats(
-                total_requests=self.total_requests,
-                error_count=self.error_count,
-                cache_size=len(self.cache),
-                cache_hits=self.cache_stats['hits'],
-                cache_misses=self.cache_stats['misses'],
-                cache_hit_rate=cache_hit_rate,
-                requests_last_hour=self.requests_last_hour,
-                avg_response_time=self.avg_response_time,
-                last_error=self.last_error,
-                key_stats=key_stats_json
-            )
+            cache_total = delta['cache_hits'] + delta['cache_misses']
+            last_hour = self.metrics.summary(window=3600)
             
-            session.add(new_stats)
+            session.add(APIServiceStats(
+                resolution='minute',
+                period_start=self._flushed_at,
+                total_requests=int(delta['total_requests']),
+                error_count=int(delta['error_count']),
+                cache_size=len(self.cache),
+                cache_hits=int(delta['cache_hits']),
+                cache_misses=int(delta['cache_misses']),
+                cache_hit_rate=delta['cache_hits'] / cache_total if cache_total > 0 else 0.0,
+                requests_last_hour=last_hour['requests'],
+                avg_response_time=delta['response_time'] / delta['responses'] if delta['responses'] else 0.0,
+                last_error=self.last_errors[-1] if self.last_errors else None,
+                key_stats=json.dumps(key_stats),
+                bulk_stats=bulk_stats
+            ))
             await session.commit()
-            logger.info(f"Статистика сохранена: {new_stats}")
+            
+            self._flushed = counters
+            self._flushed_keys = key_counters
+            self._flushed_bulk_runs = bulk_runs
+            self._flushed_at = snapshot_at
         except Exception as e:
             logger.error(f"Error saving API stats: {e}", exc_info=True)
             try:
                 await session.rollback()
             except:
                 pass
+
+    def start_snapshots(self, interval: Optional[int] = None):
+        """Запускает фоновую запись снимков статистики раз в interval секунд (FACEIT_STATS_INTERVAL)"""
+        interval = interval or int(os.getenv("FACEIT_STATS_INTERVAL", "60"))
+        if self._snapshot_task is None or self._snapshot_task.done():
+            self._snapshot_task = asyncio.create_task(self._snapshot_loop(interval))
+
+    async def stop_snapshots(self):
+        if self._snapshot_task is not None:
+            self._snapshot_task.cancel()
+            try:
+                await self._snapshot_task
+            except asyncio.CancelledError:
+                pass
+            self._snapshot_task = None
+
+    async def _snapshot_loop(self, interval: int):
+        purge_interval = int(os.getenv("FACEIT_CACHE_PURGE_INTERVAL", "3600"))
+        purged_at = time.monotonic()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with self.session_pool() as session:
+                    await self.save_stats(session)
+            except Exception as e:
+                logger.error(f"Ошибка записи снимка статистики API: {e}", exc_info=True)
+            
+            # Просроченные записи второго уровня (файл SQLite) сами не удаляются
+            if self.l2_cache is not None and time.monotonic() - purged_at >= purge_interval:
+                purged_at = time.monotonic()
+                try:
+                    await self.l2_cache.purge_expired()
+                except Exception as e:
+                    logger.warning(f"Ошибка очистки просроченных записей кеша второго уровня: {e}")
     
     def get_stats(self) -> Dict[str, Any]:
         """Возвращает текущую статистику сервиса"""
-        now = time.time()
-        
         # Статистика за последний час
-        last_hour_requests = [
-            t for t in self.request_timestamps 
-            if t[0] > now - 3600
-        ]
-        
-        # Расчет времени ответа
-        avg_response_time = (
-            sum(t[1] for t in last_hour_requests) / len(last_hour_requests) 
-            if last_hour_requests else 0
-        )
+        last_hour = self.metrics.summary(window=3600)
         
-        # Расчет процента попаданий в кеш с защитой
-        cache_hits = self.cache_stats.get('hits', 0)
+        # Расчет процента попаданий в кеш с защитой (устаревшие и отрицательные записи - тоже попадания)
+        cache_hits = (
+            self.cache_stats.get('hits', 0)
+            + self.cache_stats.get('stale_hits', 0)
+            + self.cache_stats.get('negative_hits', 0)
+        )
         cache_misses = self.cache_stats.get('misses', 0)
         total_cache = cache_hits + cache_misses
         cache_hit_rate = (
@@ -185,14 +368,28 @@ class FaceitService:
             if total_cache > 0 else 0
         )
         
+        cache_bytes_per_entry, cache_memory_bytes = self.cache_memory()
+        
+        # Доля вызовов, получивших результат уже выполняющегося запроса
+        coalesced = self.coalesce_stats['coalesced']
+        total_calls = coalesced + self.coalesce_stats['executed']
+        coalesce_rate = coalesced / total_calls if total_calls > 0 else 0
+        
+        # Переиспользование соединений и насыщение пула
+        created = self.pool_stats['connections_created']
+        reused = self.pool_stats['connections_reused']
+        queued = self.pool_stats['queued']
+        
         # Статистика по ключам с защитой
         key_stats = []
         for key, data in self.key_usage.items():
             key_stats.append({
-                "key": f"{key[:5]}...{key[-5:]}",
+                "key": self._mask_key(key),
                 "requests": data.get("requests", 0),
                 "errors": data.get("errors", 0),
-                "last_used": time.strftime("%H:%M:%S", time.localtime(data.get("last_used", 0)))
+                "last_used": time.strftime("%H:%M:%S", time.localtime(data.get("last_used", 0))),
+                "in_flight": self.key_in_flight.get(key, 0),
+                "tokens": round(self.key_buckets[key].available(), 1) if key in self.key_buckets else None
             })
         
         # Формирование статистики с защитой от отсутствующих ключей
@@ -200,47 +397,105 @@ class FaceitService:
             "total_requests": self.total_requests,
             "error_count": self.error_count,
             "api_keys": len(self.api_keys),
+            "max_concurrency_per_key": self.max_concurrency_per_key,
+            "in_flight": sum(self.key_in_flight.values()),
+            "key_rate": self.key_rate,
+            "key_burst": self.key_burst,
+            "queued_requests": self.queued_requests,
+            "queue_wait_avg": sum(self.queue_waits) / len(self.queue_waits) if self.queue_waits else 0,
+            "queue_wait_max": self.queue_wait_max,
+            "queue_waited_share": (
+                sum(1 for wait in self.queue_waits if wait > 0) / len(self.queue_waits)
+                if self.queue_waits else 0
+            ),
             "cache_size": len(self.cache),
+            "cache_maxsize": self.cache.maxsize,
+            "cache_bytes_per_entry": cache_bytes_per_entry,
+            "cache_memory_bytes": cache_memory_bytes,
             "cache_hits": cache_hits,
             "cache_misses": cache_misses,
             "cache_hit_rate": cache_hit_rate,
-            "requests_last_hour": len(last_hour_requests),
-            "avg_response_time": avg_response_time,
+            "l2_cache_backend": type(self.l2_cache).__name__ if self.l2_cache is not None else None,
+            "l2_cache_hits": self.cache_stats.get('l2_hits', 0),
+            "cache_stale_hits": self.cache_stats.get('stale_hits', 0),
+            "cache_negative_hits": self.cache_stats.get('negative_hits', 0),
+            "l2_cache_errors": self.cache_stats.get('l2_errors', 0),
+            "requests_last_hour": last_hour['requests'],
+            "avg_response_time": last_hour['avg'],
+            "latency": self.metrics.snapshot(),
             "last_error": self.last_errors[-1] if self.last_errors else None,
+            "http_pool_limit": self.http_limit,
+            "http_connections_created": int(created),
+            "http_connections_reused": int(reused),
+            "http_reuse_rate": reused / (created + reused) if created + reused > 0 else 0,
+            "http_pool_queued": int(queued),
+            "http_pool_waiting": int(self.pool_stats['waiting']),
+            "http_pool_queue_avg": self.pool_stats['queue_time'] / queued if queued > 0 else 0,
+            "coalesced_requests": self.coalesce_stats['coalesced'],
+            "coalesce_rate": coalesce_rate,
+            "last_bulk": self.bulk_stats,
+            "breakers": {
+                family: {
+                    "state": breaker.state,
+                    "failures": breaker.failures,
+                    "retry_in": breaker.retry_in(),
+                    "rejected": breaker.rejected
+                }
+                for family, breaker in self.breakers.items()
+            },
             "key_stats": key_stats
         }
     
     async def close(self):
         try:
+            await self.stop_snapshots()
+            
             if self.session_pool:
                 async with self.session_pool() as session:
                     await self.save_stats(session)
                 
             if self.session is not None and not self.session.closed:
                 await self.session.close()
+            
+            if self.l2_cache is not None:
+                await self.l2_cache.close()
                 
         except Exception as e:
             logger.error(f"Error closing FaceitService: {e}")
     
     def _get_best_key(self) -> str:
-        """Выбирает лучший доступный ключ с интеллектуальной ротацией"""
+        """Выбирает ключ с наибольшим запасом токенов (при равенстве - с наименьшим числом запросов в полете)"""
         if len(self.api_keys) == 1:
             return self.api_keys[0]
             
-        now = time.time()
-        
-        # Ищем ключ с наименьшим количеством запросов в последний час
-        least_used = min(
-            self.key_usage.items(),
-            key=lambda x: x[1]["requests"]
-        )[0]
-        
-        # Если есть ключ, который не использовался более 5 минут - выбираем его
-        for key, data in self.key_usage.items():
-            if now - data["last_used"] > 300:  # 5 минут
-                return key
+        return max(
+            self.api_keys,
+            key=lambda key: (self.key_buckets[key].available(), -self.key_in_flight[key])
+        )
+    
+    async def _acquire_key(self) -> str:
+        """
+        Забирает токен у лучшего ключа. Если токены закончились у всех ключей,
+        запрос ждет в очереди, пока ведро одного из них не пополнится.
+        """
+        started = time.monotonic()
+        queued = False
+        try:
+            while True:
+                key = self._get_best_key()
+                if self.key_buckets[key].try_acquire():
+                    wait = time.monotonic() - started
+                    self.queue_waits.append(wait)
+                    self.queue_wait_max = max(self.queue_wait_max, wait)
+                    return key
                 
-        return least_used
+                if not queued:
+                    queued = True
+                    self.queued_requests += 1
+                await asyncio.sleep(min(bucket.time_until_available() for bucket in self.key_buckets.values()))
+        finally:
+            if queued:
+                self.queued_requests -= 1
     
     def _update_key_stats(self, key: str, success: bool = True):
         """Обновляет статистику использования ключа"""
@@ -253,76 +508,324 @@ class FaceitService:
         if not success:
             self.key_usage[key]["errors"] += 1
     
-    async def _make_request(self, url: str) -> Dict[str, Any]:
-        """Выполняет HTTP-запрос к Faceit API"""
-        start_time = time.time()
-        
-        if self.session is None or (hasattr(self.session, 'closed')) and self.session.closed:
-            self.session = aiohttp.ClientSession()
-        
-        selected_key = self._get_best_key()
+    async def _send(self, url: str, key: str) -> Tuple[int, Dict[str, Any], Optional[float]]:
+        """
+        Один запрос с указанным ключом в пределах лимита параллельных запросов этого ключа.
+        Возвращает код ответа, данные и Retry-After (для 429 и 503)
+        """
         headers = {
-            "Authorization": f"Bearer {selected_key}",
+            "Authorization": f"Bearer {key}",
             "Accept": "application/json"
         }
         
+        async with self.key_semaphores[key]:
+            self.key_in_flight[key] += 1
+            try:
+                async with self.session.get(url, headers=headers) as response:
+                    if response.status == 404:
+                        return response.status, {}, None
+                    if response.status in (429, 503):
+                        return response.status, {}, parse_retry_after(response.headers.get('Retry-After'))
+                    response.raise_for_status()
+                    return response.status, await response.json(), None
+            finally:
+                self.key_in_flight[key] -= 1
+    
+    async def _single_flight(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Выполняет factory() один раз на все одновременные вызовы с одинаковым ключом:
+        пока запрос в полете, остальные вызывающие ждут его результат.
+        Запрос выполняется отдельной задачей, поэтому отмена одного вызывающего
+        не затрагивает остальных; задача отменяется, только когда ждущих не осталось.
+        """
+        task = self.in_flight_requests.get(key)
+        if task is not None:
+            self.coalesce_stats['coalesced'] += 1
+        else:
+            task = asyncio.create_task(factory())
+            self.in_flight_requests[key] = task
+            self.in_flight_waiters[key] = 0
+            self.coalesce_stats['executed'] += 1
+            task.add_done_callback(lambda done: self._single_flight_done(key, done))
+        
+        self.in_flight_waiters[key] += 1
         try:
-            async with self.session.get(url, headers=headers) as response:
-                self.total_requests += 1
-                
-                if response.status == 429:
-                    logger.warning(f"Rate limit exceeded for key {selected_key[:5]}...{selected_key[-5:]}")
-                    self._update_key_stats(selected_key, success=False)
-                    
-                    for retry_key in self.api_keys:
-                        if retry_key == selected_key:
-                            continue
-                            
-                        headers["Authorization"] = f"Bearer {retry_key}"
-                        async with self.session.get(url, headers=headers) as retry_response:
-                            if retry_response.status != 429:
-                                self._update_key_stats(retry_key)
-                                retry_response.raise_for_status()
-                                return await retry_response.json()
-                    
-                    raise Exception("All API keys rate limited")
+            return await asyncio.shield(task)
+        finally:
+            # Задача не завершена - значит, отменили этого вызывающего
+            if not task.done():
+                self.in_flight_waiters[key] -= 1
+                if not self.in_flight_waiters[key]:
+                    # Новые вызовы не должны присоединиться к отменяемой задаче
+                    self._single_flight_done(key, task)
+                    task.cancel()
+    
+    def _single_flight_done(self, key: str, task: asyncio.Task):
+        if self.in_flight_requests.get(key) is task:
+            del self.in_flight_requests[key]
+            del self.in_flight_waiters[key]
+    
+    async def _make_request(self, url: str) -> Dict[str, Any]:
+        """Выполняет HTTP-запрос к Faceit API (одинаковые одновременные запросы объединяются)"""
+        _, data = await self._request(url)
+        return data
+    
+    async def _request(self, url: str) -> Tuple[int, Dict[str, Any]]:
+        """Как _make_request, но вместе с кодом ответа (0 - запрос не удался)"""
+        return await self._single_flight(url, lambda: self._fetch(url))
+    
+    def _endpoint_family(self, url: str) -> str:
+        """Семейство эндпоинта для предохранителя: players, stats, history или matches"""
+        if url.startswith(self.base_url):
+            url = url[len(self.base_url):]
+        path = url.lstrip('/').split('?', 1)[0]
+        if path.startswith('matches'):
+            return 'matches'
+        if '/stats' in path:
+            return 'stats'
+        if '/history' in path:
+            return 'history'
+        return 'players'
+    
+    async def _fetch(self, url: str) -> Tuple[int, Dict[str, Any]]:
+        """
+        Выполняет HTTP-запрос к Faceit API.
+        При разомкнутом предохранителе сразу поднимает CircuitOpenError.
+        """
+        breaker = self.breakers[self._endpoint_family(url)]
+        if not breaker.allow():
+            raise CircuitOpenError(breaker.name, breaker.retry_in())
+        
+        if self.session is None or self.session.closed:
+            self.session = self._create_http_session()
+        
+        selected_key = None
+        sent_at = None
+        # Исход для метрик: None - запрос прерван (отмена), не учитывается
+        failed = None
+        
+        try:
+            selected_key = await self._acquire_key()
+            sent_at = time.monotonic()
+            self.total_requests += 1
+            status, data, retry_after = await self._send(url, selected_key)
+            
+            # На 429 ключ отдыхает до пополнения ведра (не меньше Retry-After),
+            # а запрос уходит на ключ с запасом токенов
+            attempts = 1
+            while status == 429:
+                logger.warning(f"Rate limit exceeded for key {selected_key[:5]}...{selected_key[-5:]}")
+                self._update_key_stats(selected_key, success=False)
+                self.key_buckets[selected_key].drain(retry_after or 0.0)
                 
-                response.raise_for_status()
-                self._update_key_stats(selected_key)
-                return await response.json()
+                if attempts >= len(self.api_keys):
+                    break
                 
-        except Exception as e:
-            self.error_count += 1
-            error_msg = f"Request to {url} failed: {str(e)}"
-            self.last_errors.append(error_msg)
-            self._update_key_stats(selected_key, success=False)
+                selected_key = await self._acquire_key()
+                status, data, retry_after = await self._send(url, selected_key)
+                attempts += 1
             
-            if len(self.last_errors) > 10:
-                self.last_errors.pop(0)
-                
-            logger.error(error_msg, exc_info=True)
-            return {}
-        finally:
-            duration = time.time() - start_time
-            self.request_timestamps.append((start_time, duration))
+            if status in (429, 503):
+                failed = True
+                self._record_failure(url, selected_key, f"HTTP {status}")
+                breaker.record_failure(retry_after)
+                return 0, {}
             
-            if len(self.request_timestamps) > 1000:
-                self.request_timestamps.pop(0)
+            failed = False
+            self._update_key_stats(selected_key)
+            breaker.record_success()
+            return status, data
+        
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            failed = True
+            # Ожидаемые сетевые сбои и ответы 5xx: без трейсбека, их считает предохранитель
+            self._record_failure(url, selected_key, str(e) or type(e).__name__)
+            # Ошибки клиента (401, 403, 400) - не признак деградации API
+            if not (isinstance(e, aiohttp.ClientResponseError) and e.status < 500):
+                breaker.record_failure()
+            return 0, {}
+        except Exception as e:
+            failed = True
+            self._record_failure(url, selected_key, str(e), exc_info=True)
+            breaker.record_failure()
+            return 0, {}
+        finally:
+            breaker.release()
+            if sent_at is not None and failed is not None:
+                latency = time.monotonic() - sent_at
+                self.response_time_total += latency
+                self.responses += 1
+                self.metrics.record(breaker.name, self._mask_key(selected_key), latency, error=failed)
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Метрики запросов для экспорта: {'total'|'endpoint'|'key': {имя: {'1m'|'5m'|'1h': сводка}}}"""
+        return self.metrics.snapshot()
+    
+    def _record_failure(self, url: str, key: Optional[str], reason: str, exc_info: bool = False):
+        self.error_count += 1
+        error_msg = f"Request to {url} failed: {reason}"
+        self.last_errors.append(error_msg)
+        if key is not None:
+            self._update_key_stats(key, success=False)
+        
+        if len(self.last_errors) > 10:
+            self.last_errors.pop(0)
+        
+        logger.error(error_msg, exc_info=exc_info)
 
     # Новые методы для работы с пользователями и проверки аккаунтов
     
     async def check_account_exists(self, nickname: str) -> bool:
         """Проверяет существование аккаунта Faceit"""
         try:
-            url = f"https://open.faceit.com/data/v4/players?nickname={nickname}"
-            async with self.request_lock:
-                response = await self._make_request(url)
-            
-            return 'player_id' in response
+            return await self.resolve_player(nickname) is not None
+        except CircuitOpenError:
+            # Недоступность API - не повод сообщать, что аккаунта нет
+            raise
         except Exception as e:
             logger.error(f"Error checking Faceit account: {e}")
             return False
     
+    async def resolve_player(self, nickname: str) -> Optional[CachedPlayer]:
+        """
+        Находит игрока по никнейму для регистрации: существование, player_id и ELO
+        за один запрос /players?nickname= (или из кеша). Lifetime-статистика не загружается -
+        ее дозагрузит get_player_stats, когда она понадобится.
+        Возвращает None, если аккаунт не найден; при недоступности API - ValueError,
+        при разомкнутом предохранителе - CircuitOpenError (без обращения к сети).
+        """
+        state, value = await self._cache_lookup(nickname)
+        if state == 'negative':
+            return None
+        if value is not None:
+            if state == 'stale':
+                self._schedule_refresh(nickname, value.player_id)
+            return value
+        
+        self.cache_stats['misses'] += 1
+        key = f"player_lookup:{self._normalize_nickname(nickname)}"
+        return await self._single_flight(key, lambda: self._load_player(nickname))
+    
+    async def _load_player(self, nickname: Optional[str], player_id: Optional[str] = None) -> Optional[CachedPlayer]:
+        """Профиль игрока без статистики: по player_id, если он известен, иначе по никнейму"""
+        if player_id is not None:
+            url = f"{self.base_url}/players/{player_id}"
+        else:
+            url = f"{self.base_url}/players?nickname={nickname.strip()}"
+        status, response = await self._request(url)
+        
+        if status == 404:
+            if player_id is None:
+                await self._cache_store_missing(nickname)
+            return None
+        if 'player_id' not in response:
+            raise ValueError(f"Не удалось получить данные игрока {nickname or player_id} (статус {status})")
+        
+        return await self._cache_store(response, nickname)
+    
+    async def get_players_bulk(
+        self,
+        identifiers: Iterable[str],
+        with_stats: bool = False,
+        concurrency: Optional[int] = None
+    ) -> AsyncIterator[Tuple[str, Union[CachedPlayer, Dict[str, Any]]]]:
+        """
+        Пакетная загрузка игроков по player_id или никнеймам.
+        Запросы выполняют concurrency воркеров (по умолчанию - лимит параллельных запросов
+        всех ключей), ключи и токены распределяет _acquire_key. Результаты отдаются по мере
+        готовности парами (идентификатор, CachedPlayer); не найденные и неудачные - пустым словарем.
+        Свежие записи кеша отдаются без запросов; lifetime-статистика загружается только с with_stats.
+        При досрочном выходе из цикла воркеры останавливаются при закрытии генератора
+        (используйте contextlib.aclosing).
+        """
+        identifiers = list(dict.fromkeys(identifiers))
+        if not identifiers:
+            return
+        
+        concurrency = concurrency or self.max_concurrency_per_key * len(self.api_keys)
+        pending = iter(identifiers)
+        results: asyncio.Queue = asyncio.Queue()
+        batch = defaultdict(int)
+        started = time.monotonic()
+        
+        async def worker():
+            # Общий итератор: каждый воркер берет следующий идентификатор, когда освободится
+            for identifier in pending:
+                value, cached = await self._bulk_lookup(identifier, with_stats)
+                batch['cached' if cached else 'fetched'] += 1
+                if not value:
+                    batch['missing'] += 1
+                await results.put((identifier, value))
+        
+        workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(identifiers)))]
+        try:
+            for _ in range(len(identifiers)):
+                yield await results.get()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            
+            elapsed = time.monotonic() - started
+            self.bulk_stats = {
+                "players": batch['cached'] + batch['fetched'],
+                "cached": batch['cached'],
+                "fetched": batch['fetched'],
+                "missing": batch['missing'],
+                "seconds": elapsed,
+                "throughput": (batch['cached'] + batch['fetched']) / elapsed if elapsed > 0 else 0.0
+            }
+            self.bulk_runs += 1
+            logger.info(
+                f"Пакетная загрузка игроков: {self.bulk_stats['players']} за {elapsed:.1f} с "
+                f"({self.bulk_stats['throughput']:.1f}/с), из кеша {batch['cached']}, "
+                f"запрошено {batch['fetched']}, не получено {batch['missing']}"
+            )
+    
+    async def _bulk_lookup(self, identifier: str, with_stats: bool, attempts: int = 3) -> Tuple[Union[CachedPlayer, Dict[str, Any]], bool]:
+        """Один игрок пакета: (результат, взят ли из кеша). Не поднимает исключений"""
+        for _ in range(attempts):
+            try:
+                return await self._lookup_fresh(identifier, with_stats)
+            except CircuitOpenError as e:
+                # Ждем пробного окна предохранителя и повторяем
+                await asyncio.sleep(e.retry_after)
+            except Exception as e:
+                logger.warning(f"Ошибка загрузки игрока {identifier}: {e}")
+                return {}, False
+        return {}, False
+    
+    async def _lookup_fresh(self, identifier: str, with_stats: bool) -> Tuple[Union[CachedPlayer, Dict[str, Any]], bool]:
+        """Как get_player_stats, но устаревшие записи не отдаются, а загружаются заново"""
+        if _PLAYER_ID.fullmatch(identifier):
+            nickname, player_id = None, identifier
+            state, value = self._classify(await self._cache_get(f"player:{player_id}"))
+        else:
+            nickname = identifier
+            state, value = await self._cache_lookup(nickname)
+            player_id = value.player_id if value is not None else await self._resolve_alias(nickname)
+        
+        if state == 'negative':
+            return {}, True
+        if state == 'fresh' and (value.has_stats or not with_stats):
+            return value, True
+        
+        self.cache_stats['misses'] += 1
+        lookup_key = player_id or self._normalize_nickname(nickname)
+        
+        if with_stats:
+            profile = value if state == 'fresh' else None
+            result = await self._single_flight(
+                f"player_stats:{lookup_key}",
+                lambda: self._load_player_stats(nickname, player_id, profile)
+            )
+        else:
+            result = await self._single_flight(
+                f"player_lookup:{lookup_key}",
+                lambda: self._load_player(nickname, player_id)
+            )
+        return result or {}, False
+    
     async def delete_user_completely(self, session: AsyncSession, user_id: int) -> bool:
         """Полное удаление пользователя и всех связанных данных"""
         try:
@@ -330,10 +833,12 @@ class FaceitService:
             await session.execute(delete(UserActivity).where(UserActivity.user_id == user_id))
             await session.execute(delete(UserRating).where(UserRating.user_id == user_id))
             await session.execute(delete(UserState).where(UserState.user_id == user_id))
+            await session.execute(delete(SearchProfile).where(SearchProfile.user_id == user_id))
             
             # Удаляем самого пользователя
             await session.execute(delete(User).where(User.id == user_id))
             await session.commit()
+            candidate_index.remove(user_id)
             return True
         except Exception as e:
             await session.rollback()
@@ -366,7 +871,12 @@ class FaceitService:
             logger.error(f"Ошибка при очистке незавершенных регистраций: {e}")
             return 0
     
-    async def search_teammates(self, session: AsyncSession, tg_id: int) -> List[Tuple[User, UserState, UserRating]]:
+    async def search_teammates(
+        self,
+        session: AsyncSession,
+        tg_id: int,
+        sampling: str = SAMPLING_WINDOW
+    ) -> List[Tuple[User, UserState, UserRating]]:
         """Поиск команд с проверкой на валидность пользователей"""
         current_user = await session.execute(
             select(User).where(User.tg_id == tg_id)
@@ -376,49 +886,222 @@ class FaceitService:
         if not current_user:
             return []
         
-        teammates = await session.execute(
+        filters = (
+            User.id != current_user.id,
+            User.faceit_nickname != None,
+            User.age != None,
+            UserState.elo != None,
+        )
+        query = (
             select(User, UserState, UserRating)
             .join(UserState, User.id == UserState.user_id)
             .join(UserRating, User.id == UserRating.user_id)
-            .where(
-                and_(
-                    User.id != current_user.id,
-                    User.faceit_nickname != None,
-                    User.age != None,
-                    UserState.elo != None,
-                )
-            )
-            .order_by(func.random())
-            .limit(20)
+            .where(and_(*filters))
         )
-        
+
+        if sampling == SAMPLING_RANDOM:
+            teammates = await session.execute(query.order_by(func.random()).limit(20))
+            return teammates.all()
+
+        # Остальные способы выборки сводятся к случайным окнам по ELO:
+        # сначала ID по индексу, затем строки выбранных игроков
+        ids_query = (
+            select(User.id)
+            .join(UserState, User.id == UserState.user_id)
+            .join(UserRating, User.id == UserRating.user_id)
+            .where(and_(*filters))
+        )
+        low, high = (await session.execute(
+            select(func.min(UserState.elo), func.max(UserState.elo)).where(UserState.elo != None)
+        )).one()
+        if low is None:
+            return []
+        user_ids = await random_window(session, ids_query, UserState.elo, User.id, low, high, 20)
+        if not user_ids:
+            return []
+        teammates = await session.execute(query.where(User.id.in_(user_ids)))
         return teammates.all()
 
     # Существующие методы API
     
-    async def get_player_stats(self, nickname: str) -> Dict[str, Any]:
-        """Получает статистику игрока по никнейму"""
-        if nickname in self.cache:
+    @staticmethod
+    def _normalize_nickname(nickname: str) -> str:
+        return nickname.strip().lower()
+    
+    async def _cache_get(self, key: str) -> Optional[Any]:
+        """Read-through: сначала кеш в памяти, затем второй уровень"""
+        entry = self.cache.get(key)
+        if entry is None:
+            entry = await self._l2_get(key)
+            if entry is None:
+                return None
+            self.cache_stats['l2_hits'] += 1
+            fetched_at, value = entry
+            if value is not None:
+                entry = [fetched_at, CachedPlayer.load(value)]
+            self.cache[key] = entry
+        return entry
+    
+    async def _resolve_alias(self, nickname: str) -> Optional[str]:
+        """player_id по никнейму из индекса алиасов (без учета регистра и пробелов)"""
+        alias = self._normalize_nickname(nickname)
+        player_id = self.aliases.get(alias)
+        if player_id is None:
+            player_id = await self._l2_get(f"alias:{alias}")
+            if player_id is not None:
+                self.aliases[alias] = player_id
+        return player_id
+    
+    def _classify(self, entry) -> Tuple[Optional[str], Optional[CachedPlayer]]:
+        """Состояние записи кеша: 'fresh', 'stale' (старше мягкого TTL), 'negative' или None"""
+        if entry is None:
+            return None, None
+        
+        fetched_at, value = entry
+        age = time.time() - fetched_at
+        
+        if age >= self.hard_ttl:
+            return None, None
+        if value is None:
+            if age < self.negative_ttl:
+                self.cache_stats['negative_hits'] += 1
+                return 'negative', None
+            return None, None
+        if age < self.soft_ttl:
             self.cache_stats['hits'] += 1
-            return self.cache[nickname]
-        else:
-            self.cache_stats['misses'] += 1
+            return 'fresh', value
+        self.cache_stats['stale_hits'] += 1
+        return 'stale', value
+    
+    async def _cache_lookup(self, nickname: str) -> Tuple[Optional[str], Optional[CachedPlayer]]:
+        """
+        Ищет игрока по никнейму: никнейм -> player_id через алиасы, затем запись по player_id.
+        Для неизвестных никнеймов проверяется отрицательная запись «игрок не найден».
+        """
+        player_id = await self._resolve_alias(nickname)
+        if player_id is not None:
+            return self._classify(await self._cache_get(f"player:{player_id}"))
+        return self._classify(await self._cache_get(f"missing:{self._normalize_nickname(nickname)}"))
+    
+    async def _cache_store(self, payload: Dict[str, Any], nickname: Optional[str] = None) -> CachedPlayer:
+        """Write-through записи игрока в оба уровня и алиасов запрошенного и текущего никнейма"""
+        record = CachedPlayer.from_payload(payload, keep_raw=self.keep_raw)
+        player_id = record.player_id
+        fetched_at = time.time()
+        self.cache[f"player:{player_id}"] = [fetched_at, record]
+        await self._l2_set(f"player:{player_id}", [fetched_at, record.dump()], self.hard_ttl)
+        
+        for name in {nickname, record.nickname}:
+            if name:
+                alias = self._normalize_nickname(name)
+                self.aliases[alias] = player_id
+                self.cache.pop(f"missing:{alias}", None)
+                await self._l2_set(f"alias:{alias}", player_id, self.hard_ttl)
+        
+        return record
+    
+    async def _cache_store_missing(self, nickname: str):
+        """Отрицательная запись: опечатки и удаленные аккаунты не запрашиваем повторно до истечения negative_ttl"""
+        alias = self._normalize_nickname(nickname)
+        entry = [time.time(), None]
+        self.cache[f"missing:{alias}"] = entry
+        await self._l2_set(f"missing:{alias}", entry, self.negative_ttl)
+    
+    async def rename_player(self, old_nickname: str, new_nickname: str, player_id: str):
+        """Переносит алиас при смене никнейма: старый никнейм может занять другой игрок"""
+        old_alias = self._normalize_nickname(old_nickname)
+        new_alias = self._normalize_nickname(new_nickname)
+        if old_alias == new_alias:
+            return
+        
+        if self.aliases.get(old_alias) == player_id:
+            del self.aliases[old_alias]
+        if self.l2_cache is not None:
+            try:
+                await self.l2_cache.delete(f"alias:{old_alias}")
+            except Exception as e:
+                self.cache_stats['l2_errors'] += 1
+                logger.warning(f"Ошибка удаления алиаса из кеша второго уровня: {e}")
         
-        player_url = f"https://open.faceit.com/data/v4/players?nickname={nickname}"
+        self.aliases[new_alias] = player_id
+        await self._l2_set(f"alias:{new_alias}", player_id, self.hard_ttl)
+        logger.info(f"Алиас никнейма перенесен: {old_nickname} -> {new_nickname} ({player_id})")
+    
+    def _schedule_refresh(self, nickname: str, player_id: str):
+        """Фоновое обновление устаревшей записи (одно на игрока)"""
+        key = f"player_stats:{player_id}"
+        if key in self.in_flight_requests:
+            return
+        task = asyncio.create_task(self._refresh(key, nickname, player_id))
+        self.refresh_tasks.add(task)
+        task.add_done_callback(self.refresh_tasks.discard)
+    
+    async def _refresh(self, key: str, nickname: str, player_id: str):
+        try:
+            await self._single_flight(key, lambda: self._load_player_stats(nickname, player_id))
+        except CircuitOpenError:
+            # API недоступен: устаревшая запись отдается до следующей попытки
+            pass
+        except Exception as e:
+            logger.warning(f"Ошибка фонового обновления {nickname}: {e}")
+    
+    async def get_player_stats(self, nickname: str) -> Union[CachedPlayer, Dict[str, Any]]:
+        """
+        Получает статистику игрока по никнейму: запись CachedPlayer (читается как словарь)
+        или пустой словарь, если игрок не найден
+        """
+        state, value = await self._cache_lookup(nickname)
+        if state == 'negative':
+            return {}
+        if value is not None and value.has_stats:
+            if state == 'stale':
+                # Stale-while-revalidate: отдаем устаревшие данные сразу, обновляем в фоне
+                self._schedule_refresh(nickname, value.player_id)
+            return value
         
-        async with self.request_lock:
-            player_data = await self._make_request(player_url)
+        self.cache_stats['misses'] += 1
+        
+        # Одновременные промахи по одному игроку делают одну пару HTTP-запросов
+        player_id = value.player_id if value is not None else await self._resolve_alias(nickname)
+        # Свежий профиль без статистики (после resolve_player) дополняется только статистикой
+        profile = value if state == 'fresh' else None
+        key = f"player_stats:{player_id or self._normalize_nickname(nickname)}"
+        return await self._single_flight(key, lambda: self._load_player_stats(nickname, player_id, profile))
+    
+    async def _load_player_stats(
+        self,
+        nickname: Optional[str],
+        player_id: Optional[str] = None,
+        profile: Optional[CachedPlayer] = None
+    ) -> Union[CachedPlayer, Dict[str, Any]]:
+        """
+        Загружает профиль и статистику CS2 игрока и кладет результат в кеш.
+        Известный player_id запрашивается напрямую - так обнаруживается смена никнейма.
+        Если передан свежий профиль из кеша, запрашивается только статистика.
+        """
+        if profile is not None:
+            status, player_data = 200, profile.raw
+        else:
+            if player_id is not None:
+                player_url = f"{self.base_url}/players/{player_id}"
+            else:
+                player_url = f"{self.base_url}/players?nickname={nickname.strip()}"
+            status, player_data = await self._request(player_url)
+        
+        if status == 404:
+            if nickname is not None:
+                await self._cache_store_missing(nickname)
+            return {}
         
         if not player_data or 'player_id' not in player_data:
-            logger.error(f"Failed to get player data for {nickname}")
+            logger.error(f"Failed to get player data for {nickname or player_id}")
             return {}
         
         player_id = player_data['player_id']
         
-        stats_url = f"https://open.faceit.com/data/v4/players/{player_id}/stats/cs2"
+        stats_url = f"{self.base_url}/players/{player_id}/stats/cs2"
         
-        async with self.request_lock:
-            stats_data = await self._make_request(stats_url)
+        stats_data = await self._make_request(stats_url)
         
         result = {
             **player_data,
@@ -426,35 +1109,83 @@ class FaceitService:
             "cs2_stats": stats_data.get('lifetime', {}) if stats_data else {}
         }
         
-        if 'games' in player_data and 'cs2' in player_data['games']:
-            result['faceit_elo'] = player_data['games']['cs2'].get('faceit_elo')
-        elif 'games' in player_data and 'csgo' in player_data['games']:
-            result['faceit_elo'] = player_data['games']['csgo'].get('faceit_elo')
-        
-        self.cache[nickname] = result
-        
-        return result
+        return await self._cache_store(result, nickname)
+
+    async def _l2_get(self, key: str) -> Optional[Any]:
+        """Чтение из второго уровня кеша; ошибка бэкенда считается промахом"""
+        if self.l2_cache is None:
+            return None
+        try:
+            return await self.l2_cache.get(key)
+        except Exception as e:
+            self.cache_stats['l2_errors'] += 1
+            logger.warning(f"Ошибка чтения кеша второго уровня: {e}")
+            return None
+
+    async def _l2_set(self, key: str, value: Any, ttl: int):
+        if self.l2_cache is None:
+            return
+        try:
+            await self.l2_cache.set(key, value, ttl)
+        except Exception as e:
+            self.cache_stats['l2_errors'] += 1
+            logger.warning(f"Ошибка записи в кеш второго уровня: {e}")
 
     async def get_player_info(self, player_id: str) -> Dict[str, Any]:
         """Получает основную информацию об игроке по ID"""
-        url = f"https://open.faceit.com/data/v4/players/{player_id}"
-        async with self.request_lock:
-            return await self._make_request(url)
+        state, value = self._classify(await self._cache_get(f"player:{player_id}"))
+        if value is not None:
+            return value.raw
+        
+        url = f"{self.base_url}/players/{player_id}"
+        player_data = await self._make_request(url)
+        if 'player_id' in player_data:
+            await self._cache_store(player_data)
+        return player_data
 
-    async def get_player_history(self, player_id: str, limit: int = 20) -> Dict[str, Any]:
-        """Получает историю матчей игрока"""
-        url = f"https://open.faceit.com/data/v4/players/{player_id}/history?game=cs2&limit={limit}"
-        async with self.request_lock:
-            return await self._make_request(url)
+    def cache_memory(self, sample_size: int = 1000) -> Tuple[int, int]:
+        """
+        Оценка памяти кеша игроков: (байт на запись, всего байт).
+        Размер записи измеряется по выборке до sample_size записей вместе с ключом.
+        """
+        sizes = []
+        for key, entry in list(self.cache.items())[:sample_size]:
+            fetched_at, value = entry
+            size = sys.getsizeof(key) + sys.getsizeof(entry) + sys.getsizeof(fetched_at)
+            if value is not None:
+                size += value.size_bytes()
+            sizes.append(size)
+        if not sizes:
+            return 0, 0
+        per_entry = sum(sizes) // len(sizes)
+        return per_entry, per_entry * len(self.cache)
+
+    async def get_player_history(
+        self,
+        player_id: str,
+        limit: int = 20,
+        offset: int = 0,
+        since: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Получает историю матчей игрока (since - unix-время, матчи не раньше него)"""
+        url = f"{self.base_url}/players/{player_id}/history?game=cs2&limit={limit}&offset={offset}"
+        if since is not None:
+            url += f"&from={since}"
+        return await self._make_request(url)
 
     async def get_match_stats(self, match_id: str) -> Dict[str, Any]:
         """Получает статистику матча"""
-        url = f"https://open.faceit.com/data/v4/matches/{match_id}/stats"
-        async with self.request_lock:
-            return await self._make_request(url)
+        url = f"{self.base_url}/matches/{match_id}/stats"
+        return await self._make_request(url)
     
     async def refresh_cache(self):
-        """Очищает кеш сервиса"""
+        """Очищает кеш сервиса: оба уровня, иначе записи сразу вернулись бы из второго"""
         self.cache.clear()
+        self.aliases.clear()
+        if self.l2_cache is not None:
+            try:
+                await self.l2_cache.clear()
+            except Exception as e:
+                logger.warning(f"Ошибка очистки кеша второго уровня: {e}")
         self.cache_stats = defaultdict(int)
         logger.info("FaceitService cache cleared")
\ No newline at end of file
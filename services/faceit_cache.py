@@ -0,0 +1,286 @@
+import asyncio
+import base64
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CachedPlayer:
+    """
+    Компактная запись игрока в кеше: только поля, которые читают вызывающие
+    (player_id, nickname, faceit_elo). Полный ответ API с lifetime-статистикой
+    хранится сжатым, только если запись создана с keep_raw, и разворачивается
+    при обращении к raw или к полю вне FIELDS.
+    """
+    __slots__ = ('player_id', 'nickname', 'faceit_elo', 'has_stats', '_raw')
+
+    FIELDS = ('player_id', 'nickname', 'faceit_elo')
+
+    def __init__(
+        self,
+        player_id: str,
+        nickname: Optional[str],
+        faceit_elo: Optional[int] = None,
+        has_stats: bool = False,
+        raw: Optional[bytes] = None
+    ):
+        self.player_id = player_id
+        self.nickname = nickname
+        self.faceit_elo = faceit_elo
+        self.has_stats = has_stats
+        self._raw = raw
+
+    @classmethod
+    def from_payload(cls, payload: Dict[str, Any], keep_raw: bool = False) -> 'CachedPlayer':
+        """Запись из ответа /players (с cs2_stats, если статистика уже загружена)"""
+        games = payload.get('games') or {}
+        game = games.get('cs2') or games.get('csgo') or {}
+        return cls(
+            player_id=payload['player_id'],
+            nickname=payload.get('nickname'),
+            faceit_elo=payload.get('faceit_elo', game.get('faceit_elo')),
+            has_stats='cs2_stats' in payload,
+            raw=zlib.compress(json.dumps(payload, separators=(',', ':')).encode()) if keep_raw else None
+        )
+
+    @property
+    def raw(self) -> Dict[str, Any]:
+        """Полный ответ API; без сохраненного ответа - только компактные поля"""
+        if self._raw is None:
+            return self.to_dict()
+        return json.loads(zlib.decompress(self._raw))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self.FIELDS:
+            value = getattr(self, key)
+            return default if value is None else value
+        return self.raw.get(key, default)
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self.FIELDS:
+            return getattr(self, key)
+        return self.raw[key]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.FIELDS or key in self.raw
+
+    def dump(self) -> Dict[str, Any]:
+        """Представление для второго уровня кеша (JSON)"""
+        return {
+            **self.to_dict(),
+            'has_stats': self.has_stats,
+            'raw': base64.b64encode(self._raw).decode() if self._raw is not None else None
+        }
+
+    @classmethod
+    def load(cls, data: Dict[str, Any]) -> 'CachedPlayer':
+        return cls(
+            player_id=data['player_id'],
+            nickname=data.get('nickname'),
+            faceit_elo=data.get('faceit_elo'),
+            has_stats=data.get('has_stats', False),
+            raw=base64.b64decode(data['raw']) if data.get('raw') else None
+        )
+
+    def size_bytes(self) -> int:
+        """Память, занимаемая записью (объект и значения полей)"""
+        return sys.getsizeof(self) + sum(
+            sys.getsizeof(value) for value in (self.player_id, self.nickname, self.faceit_elo, self._raw) if value is not None
+        )
+
+
+class CacheBackend:
+    """Второй уровень кеша FaceitService: общий для бота и воркера Celery"""
+
+    async def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl: int):
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    async def clear(self):
+        """Удаляет все записи кеша"""
+        raise NotImplementedError
+
+    async def purge_expired(self):
+        """Удаляет просроченные записи (бэкендам без собственного истечения TTL)"""
+        pass
+
+    async def close(self):
+        pass
+
+
+class MemoryCacheBackend(CacheBackend):
+    """Локальная замена внешнего кеша (один процесс, для тестов и разработки)"""
+
+    def __init__(self):
+        self.data: Dict[str, tuple] = {}
+
+    async def get(self, key: str) -> Optional[Any]:
+        item = self.data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at < time.time():
+            del self.data[key]
+            return None
+        return json.loads(value)
+
+    async def set(self, key: str, value: Any, ttl: int):
+        self.data[key] = (json.dumps(value), time.time() + ttl)
+
+    async def delete(self, key: str):
+        self.data.pop(key, None)
+
+    async def clear(self):
+        self.data.clear()
+
+    async def purge_expired(self):
+        now = time.time()
+        for key in [key for key, (_, expires_at) in self.data.items() if expires_at < now]:
+            del self.data[key]
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    Кеш в файле SQLite на локальном диске. Режим WAL позволяет боту и воркеру
+    читать и писать один файл одновременно. Запросы выполняются в отдельном потоке.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = asyncio.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS faceit_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def _get(self, key: str) -> Optional[str]:
+        row = self._connect().execute(
+            "SELECT value FROM faceit_cache WHERE key = ? AND expires_at > ?",
+            (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set(self, key: str, value: str, expires_at: float):
+        connection = self._connect()
+        connection.execute(
+            "INSERT OR REPLACE INTO faceit_cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, expires_at)
+        )
+        connection.commit()
+
+    def _delete(self, key: str):
+        connection = self._connect()
+        connection.execute("DELETE FROM faceit_cache WHERE key = ?", (key,))
+        connection.commit()
+
+    def _clear(self):
+        connection = self._connect()
+        connection.execute("DELETE FROM faceit_cache")
+        connection.commit()
+
+    def _purge_expired(self):
+        connection = self._connect()
+        connection.execute("DELETE FROM faceit_cache WHERE expires_at <= ?", (time.time(),))
+        connection.commit()
+
+    async def get(self, key: str) -> Optional[Any]:
+        async with self._lock:
+            value = await asyncio.to_thread(self._get, key)
+        return json.loads(value) if value is not None else None
+
+    async def set(self, key: str, value: Any, ttl: int):
+        async with self._lock:
+            await asyncio.to_thread(self._set, key, json.dumps(value), time.time() + ttl)
+
+    async def delete(self, key: str):
+        async with self._lock:
+            await asyncio.to_thread(self._delete, key)
+
+    async def clear(self):
+        async with self._lock:
+            await asyncio.to_thread(self._clear)
+
+    async def purge_expired(self):
+        async with self._lock:
+            await asyncio.to_thread(self._purge_expired)
+
+    async def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+class RedisCacheBackend(CacheBackend):
+    """Кеш в Redis (общий для нескольких машин)"""
+
+    def __init__(self, url: str, prefix: str = "faceit:"):
+        from redis import asyncio as redis_asyncio
+
+        self.client = redis_asyncio.from_url(url)
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = await self.client.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    async def set(self, key: str, value: Any, ttl: int):
+        await self.client.set(self.prefix + key, json.dumps(value), ex=max(int(ttl), 1))
+
+    async def delete(self, key: str):
+        await self.client.delete(self.prefix + key)
+
+    async def clear(self):
+        # Только ключи сервиса: база Redis может быть общей
+        keys = []
+        async for key in self.client.scan_iter(match=self.prefix + "*", count=500):
+            keys.append(key)
+            if len(keys) >= 500:
+                await self.client.delete(*keys)
+                keys = []
+        if keys:
+            await self.client.delete(*keys)
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def create_cache_backend() -> Optional[CacheBackend]:
+    """Бэкенд второго уровня кеша по FACEIT_CACHE_BACKEND: sqlite (по умолчанию), redis, memory или none"""
+    backend = os.getenv("FACEIT_CACHE_BACKEND", "sqlite").lower()
+
+    if backend == "none":
+        return None
+    if backend == "memory":
+        return MemoryCacheBackend()
+    if backend == "redis":
+        return RedisCacheBackend(os.getenv("FACEIT_CACHE_REDIS_URL", "redis://localhost:6379/1"))
+    if backend == "sqlite":
+        return SQLiteCacheBackend(os.getenv("FACEIT_CACHE_PATH", "faceit_cache.db"))
+
+    logger.warning(f"Неизвестный бэкенд кеша {backend}, второй уровень кеша отключен")
+    return None
@@ -0,0 +1,303 @@
+"""
+Локальная заглушка Faceit Data API для нагрузочного тестирования FaceitService.
+
+Синтетическая популяция игроков (player0 ... playerN-1) детерминирована seed,
+задержка ответа - логнормальная, 429 выдается по ведру токенов каждого ключа,
+ошибки 500/503 - с заданной вероятностью.
+
+    python -m services.faceit_mock --port 8081 --players 100000 --latency-ms 80
+    FACEIT_API_BASE_URL=http://127.0.0.1:8081/data/v4 python main.py
+"""
+import argparse
+import asyncio
+import math
+import random
+import time
+from collections import defaultdict
+from typing import Dict, Optional
+
+from aiohttp import web
+
+from services.rate_limiter import TokenBucket
+
+
+class MockConfig:
+    """Параметры заглушки"""
+
+    def __init__(
+        self,
+        players: int = 10000,
+        seed: int = 42,
+        latency_ms: float = 80.0,
+        latency_sigma: float = 0.5,
+        latency_max_ms: float = 5000.0,
+        error_rate: float = 0.0,
+        key_rate: float = 10.0,
+        key_burst: float = 20.0,
+        key_rates: Optional[Dict[str, float]] = None,
+        history_size: int = 200
+    ):
+        self.players = players
+        self.seed = seed
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.latency_max_ms = latency_max_ms
+        self.error_rate = error_rate
+        self.key_rate = key_rate
+        self.key_burst = key_burst
+        # Отдельный лимит для конкретных ключей (например, 0 - ключ всегда получает 429)
+        self.key_rates = key_rates or {}
+        self.history_size = history_size
+
+
+class FaceitMock:
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.stats = defaultdict(int)
+        # Конец истории матчей всех игроков - момент запуска заглушки
+        self.epoch = int(time.time())
+        # Матчи, сыгранные после запуска (play_matches)
+        self.played = 0
+
+    # Синтетическая популяция
+
+    def player_id(self, index: int) -> str:
+        return f"{self.config.seed & 0xffffffff:08x}-0000-4000-8000-{index:012x}"
+
+    def player_index(self, player_id: str) -> Optional[int]:
+        prefix = f"{self.config.seed & 0xffffffff:08x}-0000-4000-8000-"
+        if not player_id.startswith(prefix):
+            return None
+        try:
+            index = int(player_id[len(prefix):], 16)
+        except ValueError:
+            return None
+        return index if index < self.config.players else None
+
+    def nickname_index(self, nickname: str) -> Optional[int]:
+        nickname = nickname.strip().lower()
+        if not nickname.startswith('player') or not nickname[6:].isdigit():
+            return None
+        index = int(nickname[6:])
+        return index if index < self.config.players else None
+
+    def _rng(self, *parts) -> random.Random:
+        return random.Random(":".join(str(part) for part in (self.config.seed, *parts)))
+
+    def player(self, index: int) -> dict:
+        rng = self._rng('player', index)
+        elo = int(min(max(rng.gauss(1500, 500), 100), 4000))
+        return {
+            "player_id": self.player_id(index),
+            "nickname": f"player{index}",
+            "country": rng.choice(["ru", "ua", "kz", "by"]),
+            "games": {
+                "cs2": {
+                    "faceit_elo": elo,
+                    "skill_level": min(elo // 200 + 1, 10),
+                    "region": "EU",
+                    "game_player_id": str(76561190000000000 + index)
+                }
+            },
+            "platforms": {"steam": str(76561190000000000 + index)},
+            "settings": {"language": "ru"}
+        }
+
+    def lifetime_stats(self, index: int) -> dict:
+        rng = self._rng('stats', index)
+        matches = rng.randint(10, 3000)
+        return {
+            "player_id": self.player_id(index),
+            "game_id": "cs2",
+            "lifetime": {
+                "Matches": str(matches),
+                "Wins": str(int(matches * rng.uniform(0.4, 0.6))),
+                "Average K/D Ratio": f"{rng.uniform(0.6, 1.6):.2f}",
+                "Average Headshots %": str(rng.randint(30, 65)),
+                "Recent Results": [str(rng.randint(0, 1)) for _ in range(5)]
+            }
+        }
+
+    def play_matches(self, count: int):
+        """Каждый игрок сыграл еще count матчей: новые матчи встают в начало истории, старые не меняются"""
+        self.played += count
+        self.epoch += count * 7200
+
+    def history_item(self, index: int, number: int) -> dict:
+        # Порядковый номер матча от самого старого: не меняется, когда история сдвигается
+        sequence = self.played + self.config.history_size - 1 - number
+        rng = self._rng('match', index, sequence)
+        finished_at = self.epoch - number * 7200 - index % 3600
+        winner = rng.choice(["faction1", "faction2"])
+        return {
+            "match_id": f"1-{index:x}-{sequence}",
+            "game_id": "cs2",
+            "status": "finished",
+            "started_at": finished_at - 2400,
+            "finished_at": finished_at,
+            "results": {
+                "winner": winner,
+                "score": {"faction1": 13 if winner == "faction2" else 16, "faction2": 16 if winner == "faction2" else 13}
+            },
+            "teams": {
+                "faction1": {"players": [{"player_id": self.player_id(index), "nickname": f"player{index}"}]},
+                "faction2": {"players": []}
+            }
+        }
+
+    # Поведение сервера
+
+    def _bucket(self, key: str) -> TokenBucket:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            rate = self.config.key_rates.get(key, self.config.key_rate)
+            bucket = self.buckets[key] = TokenBucket(max(rate, 1e-9), self.config.key_burst if rate > 0 else 0)
+        return bucket
+
+    @web.middleware
+    async def middleware(self, request: web.Request, handler):
+        if request.path.startswith('/_mock'):
+            return await handler(request)
+
+        self.stats['requests'] += 1
+        auth = request.headers.get('Authorization', '')
+        key = auth[len('Bearer '):] if auth.startswith('Bearer ') else ''
+        if not key:
+            self.stats['401'] += 1
+            return web.json_response({"errors": [{"message": "Unauthorized"}]}, status=401)
+
+        bucket = self._bucket(key)
+        if not bucket.try_acquire():
+            self.stats['429'] += 1
+            retry_after = min(max(math.ceil(bucket.time_until_available()), 1), 60)
+            return web.json_response(
+                {"errors": [{"message": "Too Many Requests"}]}, status=429, headers={"Retry-After": str(retry_after)}
+            )
+
+        config = self.config
+        latency = self.random.lognormvariate(math.log(config.latency_ms), config.latency_sigma) if config.latency_ms > 0 else 0
+        await asyncio.sleep(min(latency, config.latency_max_ms) / 1000)
+
+        if config.error_rate and self.random.random() < config.error_rate:
+            status = self.random.choice([500, 503])
+            self.stats[str(status)] += 1
+            return web.json_response({"errors": [{"message": "Injected error"}]}, status=status)
+
+        try:
+            response = await handler(request)
+        except web.HTTPException as e:
+            self.stats[str(e.status)] += 1
+            raise
+        self.stats[str(response.status)] += 1
+        return response
+
+    async def get_player_by_nickname(self, request: web.Request):
+        index = self.nickname_index(request.query.get('nickname', ''))
+        if index is None:
+            raise web.HTTPNotFound()
+        return web.json_response(self.player(index))
+
+    def _index_or_404(self, request: web.Request) -> int:
+        index = self.player_index(request.match_info['player_id'])
+        if index is None:
+            raise web.HTTPNotFound()
+        return index
+
+    async def get_player(self, request: web.Request):
+        return web.json_response(self.player(self._index_or_404(request)))
+
+    async def get_player_stats(self, request: web.Request):
+        return web.json_response(self.lifetime_stats(self._index_or_404(request)))
+
+    async def get_player_history(self, request: web.Request):
+        index = self._index_or_404(request)
+        limit = min(int(request.query.get('limit', 20)), 100)
+        offset = int(request.query.get('offset', 0))
+        since = int(request.query.get('from', 0))
+
+        items = []
+        for number in range(offset, self.config.history_size):
+            item = self.history_item(index, number)
+            if item["finished_at"] < since:
+                break
+            items.append(item)
+            if len(items) >= limit:
+                break
+        return web.json_response({"items": items, "start": offset, "end": offset + len(items)})
+
+    async def get_match_stats(self, request: web.Request):
+        match_id = request.match_info['match_id']
+        rng = self._rng('match_stats', match_id)
+        return web.json_response({
+            "rounds": [{
+                "match_id": match_id,
+                "round_stats": {"Map": rng.choice(["de_mirage", "de_inferno", "de_nuke", "de_ancient"])},
+                "teams": []
+            }]
+        })
+
+    async def get_mock_stats(self, request: web.Request):
+        return web.json_response(dict(self.stats))
+
+    async def reset_mock_stats(self, request: web.Request):
+        self.stats.clear()
+        self.buckets.clear()
+        return web.json_response({"ok": True})
+
+
+def create_app(config: Optional[MockConfig] = None) -> web.Application:
+    mock = FaceitMock(config or MockConfig())
+    app = web.Application(middlewares=[mock.middleware])
+    app['mock'] = mock
+    app.router.add_get('/data/v4/players', mock.get_player_by_nickname)
+    app.router.add_get('/data/v4/players/{player_id}', mock.get_player)
+    app.router.add_get('/data/v4/players/{player_id}/stats/cs2', mock.get_player_stats)
+    app.router.add_get('/data/v4/players/{player_id}/history', mock.get_player_history)
+    app.router.add_get('/data/v4/matches/{match_id}/stats', mock.get_match_stats)
+    app.router.add_get('/_mock/stats', mock.get_mock_stats)
+    app.router.add_post('/_mock/reset', mock.reset_mock_stats)
+    return app
+
+
+def add_mock_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--players', type=int, default=10000, help='размер синтетической популяции')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--latency-ms', type=float, default=80.0, help='медиана задержки ответа')
+    parser.add_argument('--latency-sigma', type=float, default=0.5, help='sigma логнормального распределения')
+    parser.add_argument('--latency-max-ms', type=float, default=5000.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='доля ответов 500/503')
+    parser.add_argument('--key-rate', type=float, default=10.0, help='запросов в секунду на ключ до 429')
+    parser.add_argument('--key-burst', type=float, default=20.0)
+    parser.add_argument(
+        '--key-limit', action='append', default=[], metavar='KEY=RATE',
+        help='лимит для отдельного ключа (0 - всегда 429)'
+    )
+
+
+def config_from_args(args: argparse.Namespace) -> MockConfig:
+    key_rates = {}
+    for item in args.key_limit:
+        key, _, rate = item.partition('=')
+        key_rates[key] = float(rate)
+    return MockConfig(
+        players=args.players,
+        seed=args.seed,
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        latency_max_ms=args.latency_max_ms,
+        error_rate=args.error_rate,
+        key_rate=args.key_rate,
+        key_burst=args.key_burst,
+        key_rates=key_rates
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Заглушка Faceit Data API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+    web.run_app(create_app(config_from_args(args)), host=args.host, port=args.port)
@@ -0,0 +1,200 @@
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from cachetools import LRUCache
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import FaceitMatch, FaceitPlayerMatch
+from services.faceit import FaceitService
+
+logger = logging.getLogger(__name__)
+
+
+def _from_unix(value: Optional[int]) -> Optional[datetime]:
+    if not value:
+        return None
+    return datetime.fromtimestamp(value, tz=timezone.utc).replace(tzinfo=None)
+
+
+def _to_unix(value: datetime) -> int:
+    return int(value.replace(tzinfo=timezone.utc).timestamp())
+
+
+def parse_history_item(player_id: str, item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Строка faceit_player_matches из элемента /players/{id}/history; незавершенные матчи - None"""
+    finished_at = _from_unix(item.get('finished_at'))
+    if not item.get('match_id') or finished_at is None:
+        return None
+
+    faction = None
+    for name, team in (item.get('teams') or {}).items():
+        if any(player.get('player_id') == player_id for player in team.get('players') or []):
+            faction = name
+            break
+
+    results = item.get('results') or {}
+    score = results.get('score') or {}
+    opponent = next((name for name in score if name != faction), None)
+
+    return {
+        'player_id': player_id,
+        'match_id': item['match_id'],
+        'finished_at': finished_at,
+        'faction': faction,
+        'won': results.get('winner') == faction if faction and results.get('winner') else None,
+        'score': f"{score[faction]}:{score[opponent]}" if faction in score and opponent else None,
+        'started_at': _from_unix(item.get('started_at')),
+        'game': item.get('game_id'),
+    }
+
+
+class MatchStore:
+    """
+    Локальное хранилище матчей Faceit.
+    История игрока синхронизируется инкрементально: запрашиваются только матчи новее
+    последнего известного. Статистика завершенного матча не меняется, поэтому хранится
+    в БД постоянно, а самые используемые - еще и в LRU процесса.
+    """
+
+    def __init__(self, maxsize: int = 5000, page_size: int = 100):
+        self.page_size = page_size
+        self.stats_cache = LRUCache(maxsize=maxsize)
+
+    async def sync_player(self, session: AsyncSession, faceit_service: FaceitService, player_id: str) -> int:
+        """
+        Догружает новые матчи игрока. Первая синхронизация ограничена одной страницей
+        (последние page_size матчей). Возвращает число добавленных матчей.
+        Страницы идут от новых к старым, поэтому фиксируются только все вместе: если
+        какая-то страница не загрузилась, ничего не сохраняется и граница синхронизации
+        (последний известный матч) не сдвигается - пропущенные матчи загрузятся в следующий раз
+        """
+        newest = await session.scalar(
+            select(func.max(FaceitPlayerMatch.finished_at))
+            .where(FaceitPlayerMatch.player_id == player_id)
+        )
+        since = _to_unix(newest) + 1 if newest is not None else None
+
+        added = 0
+        offset = 0
+        try:
+            while True:
+                page = await faceit_service.get_player_history(
+                    player_id, limit=self.page_size, offset=offset, since=since
+                )
+                # Успешный ответ всегда содержит items (возможно, пустой); {} - запрос не удался
+                if 'items' not in page:
+                    await session.rollback()
+                    logger.warning(f"История матчей {player_id} не загружена (offset {offset}), синхронизация отложена")
+                    return 0
+                items = page['items'] or []
+                rows = [row for row in (parse_history_item(player_id, item) for item in items) if row]
+                added += await self._store_history(session, rows)
+
+                if since is None or len(items) < self.page_size:
+                    break
+                offset += self.page_size
+
+            await session.commit()
+            return added
+        except SQLAlchemyError as e:
+            await session.rollback()
+            logger.error(f"Ошибка синхронизации истории матчей {player_id}: {e}", exc_info=True)
+            return 0
+        except Exception:
+            # CircuitOpenError и т.п.: уже вставленные страницы не фиксируются
+            await session.rollback()
+            raise
+
+    async def _store_history(self, session: AsyncSession, rows: List[Dict[str, Any]]) -> int:
+        if not rows:
+            return 0
+
+        await session.execute(
+            insert(FaceitMatch)
+            .values([
+                {
+                    'match_id': row['match_id'],
+                    'game': row['game'],
+                    'started_at': row['started_at'],
+                    'finished_at': row['finished_at'],
+                }
+                for row in rows
+            ])
+            .on_conflict_do_nothing(index_elements=['match_id'])
+        )
+        result = await session.execute(
+            insert(FaceitPlayerMatch)
+            .values([
+                {
+                    'player_id': row['player_id'],
+                    'match_id': row['match_id'],
+                    'finished_at': row['finished_at'],
+                    'faction': row['faction'],
+                    'won': row['won'],
+                    'score': row['score'],
+                }
+                for row in rows
+            ])
+            .on_conflict_do_nothing(index_elements=['player_id', 'match_id'])
+            .returning(FaceitPlayerMatch.match_id)
+        )
+        return len(result.scalars().all())
+
+    async def sync_players(self, session_pool, faceit_service: FaceitService, player_ids: Iterable[str], concurrency: int = 8) -> int:
+        """Инкрементальная синхронизация истории многих игроков; у каждого воркера своя сессия БД"""
+        pending = iter(list(dict.fromkeys(player_ids)))
+        total = 0
+
+        async def worker():
+            nonlocal total
+            for player_id in pending:
+                try:
+                    async with session_pool() as session:
+                        total += await self.sync_player(session, faceit_service, player_id)
+                except Exception as e:
+                    logger.warning(f"История матчей {player_id} не синхронизирована: {e}")
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return total
+
+    async def get_match_stats(self, session: AsyncSession, faceit_service: FaceitService, match_id: str) -> Dict[str, Any]:
+        """Статистика матча: LRU, затем БД, затем API (ответ завершенного матча сохраняется навсегда)"""
+        stats = self.stats_cache.get(match_id)
+        if stats is not None:
+            return stats
+
+        stored = await session.scalar(select(FaceitMatch.stats).where(FaceitMatch.match_id == match_id))
+        if stored:
+            stats = json.loads(stored)
+            self.stats_cache[match_id] = stats
+            return stats
+
+        stats = await faceit_service.get_match_stats(match_id)
+        # У незавершенного матча статистики еще нет (404) - не кешируем
+        if not stats.get('rounds'):
+            return stats
+
+        try:
+            payload = json.dumps(stats, separators=(',', ':'))
+            await session.execute(
+                insert(FaceitMatch)
+                .values(match_id=match_id, stats=payload)
+                .on_conflict_do_update(index_elements=['match_id'], set_={'stats': payload})
+            )
+            await session.commit()
+        except SQLAlchemyError as e:
+            await session.rollback()
+            logger.error(f"Ошибка сохранения статистики матча {match_id}: {e}", exc_info=True)
+
+        self.stats_cache[match_id] = stats
+        return stats
+
+
+match_store = MatchStore(maxsize=int(os.getenv("FACEIT_MATCH_CACHE_SIZE", "5000")))
@@ -0,0 +1,166 @@
+import math
+import time
+from array import array
+from typing import Dict, Iterable, Optional, Tuple
+
+
+WINDOWS = {'1m': 60, '5m': 300, '1h': 3600}
+
+
+class LogHistogram:
+    """
+    Гистограмма задержек с логарифмическими корзинами: граница каждой следующей
+    корзины в growth раз больше предыдущей, начиная с min_value секунд.
+    Относительная ошибка квантиля не превышает growth - 1 при фиксированной памяти.
+    """
+    __slots__ = ('min_value', 'growth', 'counts', '_log_growth')
+
+    def __init__(self, min_value: float = 0.001, growth: float = 1.25, buckets: int = 64):
+        self.min_value = min_value
+        self.growth = growth
+        self.counts = array('I', bytes(4 * buckets))
+        self._log_growth = math.log(growth)
+
+    def bucket(self, value: float) -> int:
+        if value <= self.min_value:
+            return 0
+        index = int(math.log(value / self.min_value) / self._log_growth) + 1
+        return min(index, len(self.counts) - 1)
+
+    def upper_bound(self, index: int) -> float:
+        return self.min_value * self.growth ** index
+
+    def add(self, value: float):
+        self.counts[self.bucket(value)] += 1
+
+    def merge(self, other: 'LogHistogram'):
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+
+    def reset(self):
+        for index in range(len(self.counts)):
+            self.counts[index] = 0
+
+    def quantile(self, q: float) -> float:
+        """q-квантиль: линейная интерполяция внутри корзины, в которую он попадает"""
+        total = sum(self.counts)
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                upper = self.upper_bound(index)
+                lower = upper / self.growth if index else 0.0
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.upper_bound(len(self.counts) - 1)
+
+
+class _Slot:
+    __slots__ = ('index', 'requests', 'errors', 'latency_sum', 'histogram')
+
+    def __init__(self):
+        self.index = -1
+        self.requests = 0
+        self.errors = 0
+        self.latency_sum = 0.0
+        self.histogram = LogHistogram()
+
+    def reset(self, index: int):
+        self.index = index
+        self.requests = 0
+        self.errors = 0
+        self.latency_sum = 0.0
+        self.histogram.reset()
+
+
+class WindowedStats:
+    """
+    Кольцевой буфер интервалов по slot_seconds секунд на horizon секунд назад.
+    Каждый интервал хранит счетчики и гистограмму, поэтому память постоянна,
+    а запись - O(1) без списков временных меток.
+    """
+
+    def __init__(self, slot_seconds: int = 10, horizon: int = 3600):
+        self.slot_seconds = slot_seconds
+        self.slots = [_Slot() for _ in range(horizon // slot_seconds)]
+
+    def _slot_index(self, now: float) -> int:
+        return int(now // self.slot_seconds)
+
+    def record(self, latency: float, error: bool = False, now: Optional[float] = None):
+        index = self._slot_index(time.monotonic() if now is None else now)
+        slot = self.slots[index % len(self.slots)]
+        if slot.index != index:
+            slot.reset(index)
+        slot.requests += 1
+        slot.latency_sum += latency
+        if error:
+            slot.errors += 1
+        slot.histogram.add(latency)
+
+    def summary(self, window: int, now: Optional[float] = None) -> Dict[str, float]:
+        """Запросы, доля ошибок, пропускная способность и квантили задержки за последние window секунд"""
+        current = self._slot_index(time.monotonic() if now is None else now)
+        oldest = current - window // self.slot_seconds
+        histogram = LogHistogram()
+        requests = errors = 0
+        latency_sum = 0.0
+
+        for slot in self.slots:
+            if oldest < slot.index <= current:
+                requests += slot.requests
+                errors += slot.errors
+                latency_sum += slot.latency_sum
+                histogram.merge(slot.histogram)
+
+        return {
+            'requests': requests,
+            'errors': errors,
+            'error_rate': errors / requests if requests else 0.0,
+            'throughput': requests / window,
+            'avg': latency_sum / requests if requests else 0.0,
+            'p50': histogram.quantile(0.5),
+            'p90': histogram.quantile(0.9),
+            'p99': histogram.quantile(0.99),
+        }
+
+
+class MetricsRegistry:
+    """Задержки и ошибки запросов к API: в целом, по эндпоинтам и по ключам"""
+
+    def __init__(self, slot_seconds: int = 10, horizon: int = 3600):
+        self.slot_seconds = slot_seconds
+        self.horizon = horizon
+        self.series: Dict[Tuple[str, str], WindowedStats] = {}
+
+    def _series(self, kind: str, name: str) -> WindowedStats:
+        series = self.series.get((kind, name))
+        if series is None:
+            series = self.series[(kind, name)] = WindowedStats(self.slot_seconds, self.horizon)
+        return series
+
+    def record(self, endpoint: str, key: Optional[str], latency: float, error: bool = False):
+        now = time.monotonic()
+        self._series('total', 'all').record(latency, error, now)
+        self._series('endpoint', endpoint).record(latency, error, now)
+        if key is not None:
+            self._series('key', key).record(latency, error, now)
+
+    def summary(self, kind: str = 'total', name: str = 'all', window: int = 3600) -> Dict[str, float]:
+        series = self.series.get((kind, name))
+        if series is None:
+            return WindowedStats(self.slot_seconds, self.slot_seconds).summary(window)
+        return series.summary(window)
+
+    def snapshot(self, windows: Iterable[str] = WINDOWS) -> Dict[str, Dict[str, Dict[str, Dict[str, float]]]]:
+        """Все серии по всем окнам: {вид: {имя: {окно: сводка}}}"""
+        now = time.monotonic()
+        result: Dict[str, Dict[str, Dict[str, Dict[str, float]]]] = {}
+        for (kind, name), series in self.series.items():
+            result.setdefault(kind, {})[name] = {
+                window: series.summary(WINDOWS[window], now) for window in windows
+            }
+        return result
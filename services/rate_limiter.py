@@ -0,0 +1,46 @@
+import time
+
+
+class TokenBucket:
+    """
+    Ведро токенов: rate токенов в секунду, не больше capacity накопленных.
+    Каждый запрос к API забирает один токен.
+    """
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated_at')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def available(self) -> float:
+        self._refill()
+        return self.tokens
+
+    def try_acquire(self) -> bool:
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def time_until_available(self) -> float:
+        """Через сколько секунд появится целый токен"""
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def drain(self, hold: float = 0.0):
+        """
+        Обнуляет ведро (после 429 от API ключ должен отдохнуть).
+        hold - сколько секунд ключ не получит ни одного токена (Retry-After)
+        """
+        self._refill()
+        self.tokens = -hold * self.rate
@@ -0,0 +1,67 @@
+import os
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from cachetools import TTLCache
+
+from services.team_builder import CandidatePool
+
+
+class SearchSession:
+    """
+    Пул кандидатов одного пользователя и уже показанные из него игроки.
+    Колоночные массивы пула строятся один раз при загрузке пула; показанные
+    игроки снимаются с маски, а не перестраиванием массивов
+    """
+    __slots__ = ('params', 'pool', 'candidates', 'shown', 'shown_mask', 'last_team', 'created_at')
+
+    def __init__(self, params: Dict, pool: List):
+        self.params = params
+        self.pool = pool
+        self.candidates = CandidatePool(pool)
+        self.shown = set()
+        self.shown_mask = np.zeros(len(self.candidates), dtype=bool)
+        self.last_team: List = []
+        self.created_at = time.time()
+
+    def available(self, banned_nicknames=None) -> np.ndarray:
+        """Маска кандидатов пула, которых пользователь еще не видел и не забанил"""
+        mask = ~self.shown_mask
+        banned = [nickname.lower().strip() for nickname in banned_nicknames or ()]
+        if banned:
+            mask &= ~np.isin(self.candidates.nicknames, banned)
+        return mask
+
+    def mark_shown(self, team: List):
+        self.shown.update(candidate.user_id for candidate in team)
+        self.shown_mask |= np.isin(self.candidates.user_id, [candidate.user_id for candidate in team])
+        self.last_team = team
+
+
+class SearchSessionStore:
+    """
+    Поисковые сессии по Telegram ID. Пока сессия жива, «Новый поиск»
+    листает закэшированный пул без запросов к БД.
+    """
+
+    def __init__(self, ttl: int = 300, maxsize: int = 10000):
+        self.sessions = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, tg_id: int) -> Optional[SearchSession]:
+        return self.sessions.get(tg_id)
+
+    def start(self, tg_id: int, params: Dict, pool: List) -> SearchSession:
+        search = SearchSession(params, pool)
+        self.sessions[tg_id] = search
+        return search
+
+    def invalidate(self, tg_id: int):
+        """Сбрасывает сессию (после смены диапазона ELO, возраста или часового пояса)"""
+        self.sessions.pop(tg_id, None)
+
+
+search_sessions = SearchSessionStore(
+    ttl=int(os.getenv("SEARCH_SESSION_TTL", "300")),
+    maxsize=int(os.getenv("SEARCH_SESSION_MAXSIZE", "10000"))
+)
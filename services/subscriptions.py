@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from aiogram import Bot
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import SearchProfile
+
+logger = logging.getLogger(__name__)
+
+
+ANY_TIMEZONE = '*'
+
+
+class Subscription:
+    """Ожидающий поиск: критерии, по которым пользователь ждет нового игрока"""
+    __slots__ = ('tg_id', 'user_id', 'elo_min', 'elo_max', 'timezones', 'min_age', 'max_age', 'banned', 'expires_at')
+
+    def __init__(
+        self,
+        tg_id: int,
+        user_id: int,
+        elo_min: int,
+        elo_max: int,
+        timezones: Iterable[str],
+        min_age: int,
+        max_age: int,
+        banned_nicknames: Iterable[str] = (),
+        ttl: int = 86400
+    ):
+        self.tg_id = tg_id
+        self.user_id = user_id
+        self.elo_min = elo_min
+        self.elo_max = elo_max
+        self.timezones = frozenset(timezones or ())
+        self.min_age = min_age
+        self.max_age = max_age
+        self.banned = frozenset(nickname.lower().strip() for nickname in banned_nicknames)
+        self.expires_at = time.time() + ttl
+
+    def matches(self, profile: SearchProfile) -> bool:
+        if profile.user_id == self.user_id or profile.elo is None or profile.age is None:
+            return False
+        if not self.elo_min <= profile.elo <= self.elo_max:
+            return False
+        if not self.min_age <= profile.age <= self.max_age:
+            return False
+        if self.timezones and profile.timezone not in self.timezones:
+            return False
+        return not (self.banned and (profile.faceit_nickname or '').lower().strip() in self.banned)
+
+
+class SubscriptionEngine:
+    """
+    Подписки «уведомить, когда появится игрок».
+    Обратный индекс (часовой пояс, корзина ELO) -> подписчики позволяет проверять
+    нового игрока только против подписок с пересекающимися критериями.
+    Уведомления копятся и отправляются пачками с ограничением скорости.
+    """
+
+    def __init__(
+        self,
+        elo_bucket: int = 100,
+        ttl: int = 86400,
+        flush_interval: float = 10.0,
+        sends_per_second: int = 20,
+        max_players_per_message: int = 5
+    ):
+        self.elo_bucket = elo_bucket
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.sends_per_second = sends_per_second
+        self.max_players_per_message = max_players_per_message
+
+        self.subscriptions: Dict[int, Subscription] = {}
+        self.index: Dict[Tuple[str, int], Set[int]] = {}
+        self.pending: Dict[int, List[SearchProfile]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def _keys(self, subscription: Subscription):
+        zones = subscription.timezones or (ANY_TIMEZONE,)
+        first = subscription.elo_min // self.elo_bucket
+        last = subscription.elo_max // self.elo_bucket
+        return [(zone, bucket) for zone in zones for bucket in range(first, last + 1)]
+
+    def subscribe(self, subscription: Subscription):
+        """Регистрирует (или заменяет) ожидающий поиск пользователя"""
+        self.unsubscribe(subscription.tg_id)
+        self.subscriptions[subscription.tg_id] = subscription
+        for key in self._keys(subscription):
+            self.index.setdefault(key, set()).add(subscription.tg_id)
+
+    def unsubscribe(self, tg_id: int):
+        subscription = self.subscriptions.pop(tg_id, None)
+        if subscription is None:
+            return
+        for key in self._keys(subscription):
+            subscribers = self.index.get(key)
+            if subscribers is None:
+                continue
+            subscribers.discard(tg_id)
+            if not subscribers:
+                del self.index[key]
+
+    def is_subscribed(self, tg_id: int) -> bool:
+        return tg_id in self.subscriptions
+
+    def match(self, profile: SearchProfile) -> List[int]:
+        """Подписчики, критериям которых удовлетворяет игрок"""
+        if profile.elo is None:
+            return []
+        bucket = profile.elo // self.elo_bucket
+        candidates = self.index.get((profile.timezone, bucket), set()) | self.index.get((ANY_TIMEZONE, bucket), set())
+
+        now = time.time()
+        matched = []
+        for tg_id in candidates:
+            subscription = self.subscriptions.get(tg_id)
+            if subscription is None:
+                continue
+            if subscription.expires_at < now:
+                self.unsubscribe(tg_id)
+                continue
+            if subscription.matches(profile):
+                matched.append(tg_id)
+        return matched
+
+    def player_available(self, profile: SearchProfile):
+        """Ставит в очередь уведомления подписчикам, которым подходит игрок"""
+        if not profile.search_team or profile.is_banned or profile.is_verified is None:
+            return
+        for tg_id in self.match(profile):
+            self.pending.setdefault(tg_id, []).append(profile)
+            # Подписка одноразовая: после совпадения пользователь получит одно уведомление
+            self.unsubscribe(tg_id)
+
+    def start(self, bot: Bot):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop(bot))
+
+    async def stop(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+
+    async def _flush_loop(self, bot: Bot):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush(bot)
+            except Exception as e:
+                logger.error(f"Ошибка рассылки уведомлений о подписках: {e}", exc_info=True)
+
+    async def flush(self, bot: Bot):
+        """Отправляет накопленные уведомления, не быстрее sends_per_second сообщений в секунду"""
+        now = time.time()
+        for tg_id in [tg_id for tg_id, sub in self.subscriptions.items() if sub.expires_at < now]:
+            self.unsubscribe(tg_id)
+
+        pending, self.pending = self.pending, {}
+        for tg_id, profiles in pending.items():
+            names = ", ".join(profile.faceit_nickname for profile in profiles[:self.max_players_per_message])
+            try:
+                await bot.send_message(
+                    chat_id=tg_id,
+                    text=(
+                        "🔔 Появились подходящие тиммейты!\n\n"
+                        f"Новые игроки: {names}\n\n"
+                        "Нажмите «🔍 Поиск тиммейтов», чтобы посмотреть результаты."
+                    )
+                )
+            except Exception as e:
+                logger.warning(f"Не удалось отправить уведомление {tg_id}: {e}")
+            await asyncio.sleep(1 / self.sends_per_second)
+
+
+async def announce_player(session: AsyncSession, user_id: int):
+    """Проверяет игрока, ставшего доступным для поиска, против ожидающих подписок"""
+    try:
+        profile = await session.get(SearchProfile, user_id, populate_existing=True)
+        if profile is not None:
+            subscription_engine.player_available(profile)
+    except Exception as e:
+        logger.error(f"Ошибка проверки подписок для {user_id}: {e}", exc_info=True)
+
+
+subscription_engine = SubscriptionEngine(
+    ttl=int(os.getenv("SEARCH_SUBSCRIPTION_TTL", "86400")),
+    sends_per_second=int(os.getenv("SUBSCRIPTION_SENDS_PER_SECOND", "20"))
+)
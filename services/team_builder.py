@@ -0,0 +1,203 @@
+import functools
+import itertools
+import logging
+import re
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+UNIQUE_ROLES = ["in-Game Leader (IGL)", "AWPer", "Support/Lurker", "Entry Fragger"]
+FLEX_ROLE = "Опорник"
+
+_UTC_OFFSET = re.compile(r'UTC([+-]\d+)')
+
+
+def needed_roles(current_role: Optional[str]) -> set:
+    """Роли, которых не хватает до полного состава при роли текущего игрока"""
+    if current_role in UNIQUE_ROLES:
+        return (set(UNIQUE_ROLES) - {current_role}) | {FLEX_ROLE}
+    if current_role == FLEX_ROLE:
+        return set(UNIQUE_ROLES)
+    # Роль не указана - годится любой набор разных ролей
+    return set(UNIQUE_ROLES) | {FLEX_ROLE}
+
+
+@functools.lru_cache(maxsize=64)
+def utc_offset(timezone: Optional[str]) -> Optional[int]:
+    """Смещение от UTC в часах из строки вида 'MSK+2 (UTC+5)'"""
+    if not timezone:
+        return None
+    match = _UTC_OFFSET.search(timezone)
+    return int(match.group(1)) if match else None
+
+
+ROLES = UNIQUE_ROLES + [FLEX_ROLE]
+_ROLE_IDS = {role: role_id for role_id, role in enumerate(ROLES)}
+NO_ROLE = -1  # роль не указана или неизвестна
+
+
+class CandidatePool:
+    """
+    Пул кандидатов в колоночном виде: по массиву NumPy на каждое поле.
+    Строится один раз на загрузку пула (см. SearchSession), дальше подбор
+    составов работает только с массивами и маской доступных кандидатов.
+    """
+
+    def __init__(self, candidates: Sequence):
+        self.candidates = list(candidates)
+        size = len(self.candidates)
+
+        self.user_id = np.empty(size, dtype=np.int64)
+        self.elo = np.empty(size, dtype=np.float64)
+        self.age = np.empty(size, dtype=np.float64)
+        self.tz_offset = np.empty(size, dtype=np.float64)
+        self.role_id = np.empty(size, dtype=np.int8)
+        self.rating = np.empty(size, dtype=np.float64)
+        # Никнеймы в нижнем регистре - для маски бан-листа
+        self.nicknames = np.empty(size, dtype=object)
+
+        for i, candidate in enumerate(self.candidates):
+            offset = utc_offset(candidate.timezone)
+            self.user_id[i] = candidate.user_id
+            self.elo[i] = candidate.elo if candidate.elo is not None else np.nan
+            self.age[i] = candidate.age if candidate.age is not None else np.nan
+            self.tz_offset[i] = offset if offset is not None else np.nan
+            self.role_id[i] = _ROLE_IDS.get(candidate.role, NO_ROLE)
+            self.rating[i] = candidate.nickname_rating if candidate.nickname_rating is not None else 50
+            self.nicknames[i] = (getattr(candidate, 'faceit_nickname', None) or '').lower().strip()
+
+    def __len__(self) -> int:
+        return len(self.candidates)
+
+
+class TeamBuilder:
+    """
+    Подбор 4 тиммейтов из пула кандидатов.
+
+    Качество состава = покрытие недостающих ролей (с большим весом) + сумма
+    индивидуальных оценок игроков (близость ELO, репутация, близость часового пояса).
+    При фиксированном наборе ролей сумма максимальна, если из каждой роли взять
+    лучших по оценке игроков, поэтому достаточно перебрать составы ролей
+    (их не больше C(n+3, 4) для n ролей), а не сочетания игроков.
+    """
+
+    def __init__(
+        self,
+        team_size: int = 4,
+        time_budget: float = 0.05,
+        coverage_weight: float = 10.0,
+        elo_weight: float = 1.0,
+        reputation_weight: float = 0.5,
+        timezone_weight: float = 0.5,
+        max_timezone_distance: int = 11
+    ):
+        self.team_size = team_size
+        self.time_budget = time_budget
+        self.coverage_weight = coverage_weight
+        self.elo_weight = elo_weight
+        self.reputation_weight = reputation_weight
+        self.timezone_weight = timezone_weight
+        self.max_timezone_distance = max_timezone_distance
+        # Сколько раз перебор составов остановился по бюджету времени
+        self.budget_hits = 0
+
+    def score(self, pool: CandidatePool, current_elo: int, current_offset: Optional[int], elo_range: int) -> np.ndarray:
+        """Оценки всех кандидатов пула одним векторным проходом, от 0 до суммы весов"""
+        elo_gap = np.abs(np.nan_to_num(pool.elo, nan=0.0) - current_elo)
+        elo_score = 1.0 - np.minimum(elo_gap / max(elo_range, 1), 1.0)
+
+        reputation_score = np.clip(pool.rating, 0, 100) / 100
+
+        if current_offset is None:
+            timezone_score = np.zeros(len(pool))
+        else:
+            tz_gap = np.abs(pool.tz_offset - current_offset) / self.max_timezone_distance
+            timezone_score = np.nan_to_num(1.0 - np.minimum(tz_gap, 1.0), nan=0.0)
+
+        return (
+            self.elo_weight * elo_score
+            + self.reputation_weight * reputation_score
+            + self.timezone_weight * timezone_score
+        )
+
+    def build(
+        self,
+        current_role: Optional[str],
+        current_elo: int,
+        current_timezone: Optional[str],
+        candidates: Sequence,
+        elo_range: int = 300,
+        min_age: Optional[int] = None,
+        max_age: Optional[int] = None,
+        available: Optional[np.ndarray] = None
+    ) -> List:
+        """
+        Возвращает до team_size кандидатов с наилучшим составом.
+        Кандидат - любой объект с полями user_id, role, elo, age, nickname_rating, timezone;
+        можно передать уже построенный CandidatePool и маску available (кого можно выбрать).
+        Результат детерминирован: при равных оценках выигрывает меньший user_id.
+        """
+        deadline = time.perf_counter() + self.time_budget
+        pool = candidates if isinstance(candidates, CandidatePool) else CandidatePool(candidates)
+        if not len(pool):
+            return []
+
+        scores = self.score(pool, current_elo, utc_offset(current_timezone), elo_range)
+        needed = {_ROLE_IDS[role] for role in needed_roles(current_role)}
+
+        # Отсекаем кандидатов вне возрастного диапазона (NaN не проходит сравнение)
+        mask = np.ones(len(pool), dtype=bool) if available is None else available.copy()
+        if min_age is not None:
+            mask &= pool.age >= min_age
+        if max_age is not None:
+            mask &= pool.age <= max_age
+
+        # Порядок: лучшая оценка первой, при равенстве - меньший user_id
+        order = np.lexsort((pool.user_id, -scores))
+        order = order[mask[order]]
+
+        # Кандидаты по ролям, лучшие первыми; дальше team_size в каждой роли не нужны
+        groups: Dict[int, np.ndarray] = {}
+        for role_id in np.unique(pool.role_id[order]):
+            groups[int(role_id)] = order[pool.role_id[order] == role_id][:self.team_size]
+
+        team_size = min(self.team_size, sum(len(group) for group in groups.values()))
+        if not team_size:
+            return []
+        roles = sorted(groups, key=lambda role_id: (role_id == NO_ROLE, role_id))
+
+        best_team = None
+        best_value = float('-inf')
+
+        for combo in itertools.combinations_with_replacement(roles, team_size):
+            if time.perf_counter() > deadline:
+                self.budget_hits += 1
+                logger.warning(f"Подбор состава остановлен по бюджету времени ({self.time_budget} с)")
+                break
+
+            counts: Dict[int, int] = {}
+            for role_id in combo:
+                counts[role_id] = counts.get(role_id, 0) + 1
+            if any(count > len(groups[role_id]) for role_id, count in counts.items()):
+                continue
+
+            team = np.concatenate([groups[role_id][:count] for role_id, count in counts.items()])
+            value = self.coverage_weight * len(needed & counts.keys()) + float(scores[team].sum())
+
+            if value > best_value:
+                best_value = value
+                best_team = team
+
+        if best_team is None:
+            best_team = order[:team_size]
+
+        best_team = best_team[np.lexsort((pool.user_id[best_team], -scores[best_team]))]
+        return [pool.candidates[i] for i in best_team]
+
+
+# Единый экземпляр для поиска тиммейтов
+team_builder = TeamBuilder()
@@ -0,0 +1,71 @@
+"""
+База для тестов, которым нужен PostgreSQL.
+
+Тесты очищают таблицы, поэтому работают только с отдельной базой из TEST_POSTGRES_URL;
+без нее такие тесты пропускаются.
+"""
+import json
+import os
+import unittest
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from database.base import create_sessionmaker
+from database.models import UserSettings, UserState
+from benchmarks.common import seed_users
+
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+# Текущий пользователь поиска: первый синтетический игрок (player1)
+CURRENT_USER_ID = 1
+CURRENT_TG_ID = 1000000001
+CURRENT_TIMEZONE = 'MSK+0 (UTC+3)'
+
+
+class DatabaseTestCase(unittest.IsolatedAsyncioTestCase):
+    """Заполняет тестовую базу seed_size синтетическими игроками перед каждым тестом"""
+    seed_size = 2000
+
+    async def asyncSetUp(self):
+        if not TEST_POSTGRES_URL:
+            self.skipTest("TEST_POSTGRES_URL не задан")
+        if TEST_POSTGRES_URL == os.getenv("POSTGRES_URL"):
+            self.skipTest("TEST_POSTGRES_URL совпадает с POSTGRES_URL")
+
+        self.engine = create_async_engine(TEST_POSTGRES_URL)
+        await seed_users(self.engine, self.seed_size)
+        self.session_pool = create_sessionmaker(self.engine)
+
+        async with self.session_pool() as session:
+            session.add(UserState(
+                user_id=CURRENT_USER_ID, elo=1500, is_verified=True, search_team=True,
+                role='AWPer', timezone=CURRENT_TIMEZONE
+            ))
+            session.add(UserSettings(user_id=CURRENT_USER_ID, elo_range=300, min_age=12, max_age=60))
+            await session.commit()
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+
+def plan_indexes(plan: dict) -> set:
+    """Имена индексов во всех узлах плана EXPLAIN (FORMAT JSON)"""
+    names = {plan['Index Name']} if 'Index Name' in plan else set()
+    for child in plan.get('Plans', []):
+        names |= plan_indexes(child)
+    return names
+
+
+async def explain_indexes(session: AsyncSession, query) -> set:
+    """
+    Индексы, которые использует план запроса. Последовательное сканирование запрещено,
+    поэтому на маленькой тестовой базе индекс выбирается всегда, когда он применим
+    """
+    sql = query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+    await session.execute(text("SET LOCAL enable_seqscan = off"))
+    plan = await session.scalar(text(f"EXPLAIN (FORMAT JSON) {sql}"))
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan_indexes(plan[0]['Plan'])
@@ -0,0 +1,147 @@
+"""Состояния предохранителя CircuitBreaker и разбор Retry-After"""
+import unittest
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from unittest import mock
+
+from services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, parse_retry_after
+
+
+class Clock:
+    """Управляемая замена time.monotonic"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch('services.circuit_breaker.time.monotonic', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker('players', failure_threshold=3, base_backoff=2.0, max_backoff=16.0)
+
+    def fail(self, times: int = 1, retry_after=None):
+        for _ in range(times):
+            self.breaker.record_failure(retry_after)
+
+    def test_opens_after_threshold_consecutive_failures(self):
+        self.fail(2)
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertTrue(self.breaker.allow())
+
+        self.fail()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.breaker.rejected, 1)
+
+    def test_success_resets_failure_count(self):
+        self.fail(2)
+        self.breaker.record_success()
+        self.fail(2)
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_half_open_lets_single_probe(self):
+        self.fail(3)
+        self.clock.advance(self.breaker.retry_in())
+
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_probe_reopens(self):
+        self.fail(3)
+        self.clock.advance(self.breaker.retry_in())
+        self.assertTrue(self.breaker.allow())
+
+        self.fail()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertEqual(self.breaker.trips, 2)
+        self.assertFalse(self.breaker.allow())
+
+    def test_released_probe_allows_next_one(self):
+        self.fail(3)
+        self.clock.advance(self.breaker.retry_in())
+        self.assertTrue(self.breaker.allow())
+        self.breaker.release()
+        self.assertTrue(self.breaker.allow())
+
+    def test_backoff_grows_with_jitter_up_to_max(self):
+        for trip, backoff in enumerate((2.0, 4.0, 8.0, 16.0, 16.0), start=1):
+            with mock.patch('services.circuit_breaker.random.uniform', side_effect=lambda low, high: low) as uniform:
+                if trip == 1:
+                    self.fail(3)
+                else:
+                    self.clock.advance(self.breaker.retry_in())
+                    self.assertTrue(self.breaker.allow())
+                    self.fail()
+            uniform.assert_called_once_with(backoff / 2, backoff)
+            self.assertEqual(self.breaker.trips, trip)
+            self.assertAlmostEqual(self.breaker.retry_in(), backoff / 2)
+
+    def test_jitter_stays_within_backoff(self):
+        self.fail(3)
+        self.assertGreaterEqual(self.breaker.retry_in(), 1.0)
+        self.assertLessEqual(self.breaker.retry_in(), 2.0)
+
+    def test_retry_after_does_not_trip_closed_breaker(self):
+        self.fail(retry_after=30)
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertTrue(self.breaker.allow())
+
+    def test_retry_after_is_minimum_open_time(self):
+        self.fail(retry_after=30)
+        self.clock.advance(5)
+        self.fail(2)
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertAlmostEqual(self.breaker.retry_in(), 25)
+
+        self.clock.advance(24)
+        self.assertFalse(self.breaker.allow())
+        self.clock.advance(1)
+        self.assertTrue(self.breaker.allow())
+
+    def test_short_retry_after_keeps_backoff(self):
+        with mock.patch('services.circuit_breaker.random.uniform', return_value=2.0):
+            self.fail(3, retry_after=0.5)
+        self.assertAlmostEqual(self.breaker.retry_in(), 2.0)
+
+    def test_success_clears_retry_after(self):
+        self.fail(retry_after=60)
+        self.breaker.record_success()
+        with mock.patch('services.circuit_breaker.random.uniform', return_value=2.0):
+            self.fail(3)
+        self.assertAlmostEqual(self.breaker.retry_in(), 2.0)
+
+
+class ParseRetryAfterTest(unittest.TestCase):
+
+    def test_seconds(self):
+        self.assertEqual(parse_retry_after("120"), 120.0)
+        self.assertEqual(parse_retry_after("-5"), 0.0)
+
+    def test_http_date(self):
+        moment = datetime.now(timezone.utc) + timedelta(seconds=90)
+        self.assertAlmostEqual(parse_retry_after(format_datetime(moment, usegmt=True)), 90, delta=2)
+
+    def test_missing_or_invalid(self):
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after(""))
+        self.assertIsNone(parse_retry_after("soon"))
+
+
+if __name__ == '__main__':
+    unittest.main()
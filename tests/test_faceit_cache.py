@@ -0,0 +1,65 @@
+"""Компактная запись игрока CachedPlayer в кеше FaceitService"""
+import os
+import unittest
+from unittest import mock
+
+from services.faceit import FaceitService
+from services.faceit_cache import CachedPlayer
+from services.faceit_mock import FaceitMock, MockConfig
+
+# Верхняя граница памяти на запись без полного ответа API (64-битный CPython)
+COMPACT_ENTRY_BYTES = 300
+
+
+class CachedPlayerTest(unittest.TestCase):
+
+    def setUp(self):
+        mock_api = FaceitMock(MockConfig())
+        self.payload = {**mock_api.player(123), 'cs2_stats': mock_api.lifetime_stats(123)['lifetime']}
+
+    def test_compact_entry_size(self):
+        record = CachedPlayer.from_payload(self.payload)
+        self.assertIsNone(record._raw)
+        self.assertLessEqual(record.size_bytes(), COMPACT_ENTRY_BYTES)
+        self.assertGreater(CachedPlayer.from_payload(self.payload, keep_raw=True).size_bytes(), record.size_bytes())
+
+    def test_fields(self):
+        record = CachedPlayer.from_payload(self.payload)
+        self.assertEqual(record['player_id'], self.payload['player_id'])
+        self.assertEqual(record.get('nickname'), 'player123')
+        self.assertEqual(record.get('faceit_elo'), self.payload['games']['cs2']['faceit_elo'])
+        self.assertTrue(record.has_stats)
+
+    def test_get_falls_back_to_raw(self):
+        record = CachedPlayer.from_payload(self.payload, keep_raw=True)
+        self.assertEqual(record.get('country'), self.payload['country'])
+        self.assertEqual(record.get('cs2_stats'), self.payload['cs2_stats'])
+        self.assertEqual(record.raw, self.payload)
+        self.assertIn('country', record)
+        self.assertEqual(record.get('missing', 'default'), 'default')
+
+    def test_get_without_raw_returns_default(self):
+        record = CachedPlayer.from_payload(self.payload)
+        self.assertEqual(record.get('country', 'default'), 'default')
+        self.assertNotIn('country', record)
+        self.assertEqual(record.raw, record.to_dict())
+
+    def test_dump_load_round_trip(self):
+        for keep_raw in (False, True):
+            with self.subTest(keep_raw=keep_raw):
+                record = CachedPlayer.from_payload(self.payload, keep_raw=keep_raw)
+                loaded = CachedPlayer.load(record.dump())
+                self.assertEqual(loaded.to_dict(), record.to_dict())
+                self.assertEqual(loaded.has_stats, record.has_stats)
+                self.assertEqual(loaded.raw, record.raw)
+
+    def test_service_keeps_raw_only_when_enabled(self):
+        with mock.patch.dict(os.environ, {"FACEIT_CACHE_BACKEND": "none"}):
+            os.environ.pop("FACEIT_CACHE_KEEP_RAW", None)
+            self.assertFalse(FaceitService(session_pool=None, api_keys=["test-key"]).keep_raw)
+            os.environ["FACEIT_CACHE_KEEP_RAW"] = "1"
+            self.assertTrue(FaceitService(session_pool=None, api_keys=["test-key"]).keep_raw)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+"""
+Инкрементальная синхронизация истории матчей MatchStore против локальной заглушки
+Faceit API (services/faceit_mock.py) и тестовой базы.
+"""
+import os
+import unittest
+from unittest import mock
+
+from aiohttp import web
+from sqlalchemy import func, select, text
+
+from database.models import FaceitPlayerMatch
+from services.circuit_breaker import CircuitOpenError
+from services.faceit import FaceitService
+from services.faceit_mock import FaceitMock, MockConfig, create_app
+from services.match_store import MatchStore, parse_history_item
+from tests.db import DatabaseTestCase
+
+PAGE_SIZE = 20
+
+
+class ParseHistoryItemTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mock = FaceitMock(MockConfig())
+        self.player_id = self.mock.player_id(7)
+
+    def test_player_faction_and_result(self):
+        item = self.mock.history_item(7, 0)
+        row = parse_history_item(self.player_id, item)
+        won = item['results']['winner'] == 'faction1'
+        self.assertEqual(row['match_id'], item['match_id'])
+        self.assertEqual(row['faction'], 'faction1')
+        self.assertEqual(row['won'], won)
+        self.assertEqual(row['score'], '16:13' if won else '13:16')
+
+    def test_unfinished_match_is_skipped(self):
+        item = {**self.mock.history_item(7, 0), 'finished_at': None}
+        self.assertIsNone(parse_history_item(self.player_id, item))
+
+    def test_match_ids_survive_new_matches(self):
+        before = self.mock.history_item(7, 0)
+        self.mock.play_matches(3)
+        self.assertEqual(self.mock.history_item(7, 3), before)
+
+
+class MatchStoreSyncTest(DatabaseTestCase):
+    seed_size = 10
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        async with self.engine.begin() as conn:
+            await conn.execute(text("TRUNCATE faceit_matches CASCADE"))
+
+        app = create_app(MockConfig(players=100, latency_ms=0, key_rate=1000, key_burst=1000))
+        self.mock = app['mock']
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, '127.0.0.1', 0).start()
+        port = self.runner.addresses[0][1]
+
+        with mock.patch.dict(os.environ, {
+            "FACEIT_API_BASE_URL": f"http://127.0.0.1:{port}/data/v4",
+            "FACEIT_CACHE_BACKEND": "none"
+        }):
+            self.service = FaceitService(session_pool=self.session_pool, api_keys=["test-key"])
+        self.store = MatchStore(page_size=PAGE_SIZE)
+        self.player_id = self.mock.player_id(7)
+
+    async def asyncTearDown(self):
+        await self.service.close()
+        await self.runner.cleanup()
+        await super().asyncTearDown()
+
+    async def sync(self) -> int:
+        async with self.session_pool() as session:
+            return await self.store.sync_player(session, self.service, self.player_id)
+
+    async def stored(self) -> set:
+        async with self.session_pool() as session:
+            return set(await session.scalars(
+                select(FaceitPlayerMatch.match_id).where(FaceitPlayerMatch.player_id == self.player_id)
+            ))
+
+    def expected(self, numbers) -> set:
+        return {self.mock.history_item(7, number)['match_id'] for number in numbers}
+
+    async def test_first_sync_loads_one_page(self):
+        self.assertEqual(await self.sync(), PAGE_SIZE)
+        self.assertEqual(await self.stored(), self.expected(range(PAGE_SIZE)))
+
+    async def test_incremental_sync_resumes_from_last_stored_match(self):
+        await self.sync()
+        self.mock.play_matches(PAGE_SIZE * 2 + 5)
+        self.mock.stats.clear()
+
+        self.assertEqual(await self.sync(), PAGE_SIZE * 2 + 5)
+        self.assertEqual(await self.stored(), self.expected(range(PAGE_SIZE * 3 + 5)))
+        # Три страницы новых матчей, старые повторно не запрашиваются
+        self.assertEqual(self.mock.stats['requests'], 3)
+
+        self.assertEqual(await self.sync(), 0)
+
+    async def test_circuit_open_keeps_inserted_pages_uncommitted(self):
+        await self.sync()
+        self.mock.play_matches(PAGE_SIZE * 2 + 5)
+        before = await self.stored()
+
+        get_player_history = self.service.get_player_history
+        breaker = self.service.breakers['history']
+
+        async def first_page_then_open(*args, **kwargs):
+            page = await get_player_history(*args, **kwargs)
+            # После первой страницы Faceit деградирует: предохранитель истории размыкается
+            for _ in range(breaker.failure_threshold):
+                breaker.record_failure()
+            return page
+
+        with mock.patch.object(self.service, 'get_player_history', side_effect=first_page_then_open):
+            with self.assertRaises(CircuitOpenError):
+                await self.sync()
+        self.assertEqual(await self.stored(), before)
+
+        # Граница синхронизации не сдвинулась: следующая попытка догружает все пропущенное
+        breaker.record_success()
+        self.assertEqual(await self.sync(), PAGE_SIZE * 2 + 5)
+
+    async def test_failed_page_is_not_committed(self):
+        await self.sync()
+        self.mock.play_matches(PAGE_SIZE * 2)
+        before = await self.stored()
+
+        get_player_history = self.service.get_player_history
+        pages = []
+
+        async def second_page_fails(*args, **kwargs):
+            pages.append(kwargs.get('offset'))
+            return await get_player_history(*args, **kwargs) if len(pages) == 1 else {}
+
+        with mock.patch.object(self.service, 'get_player_history', side_effect=second_page_fails):
+            self.assertEqual(await self.sync(), 0)
+        self.assertEqual(await self.stored(), before)
+
+        async with self.session_pool() as session:
+            count = await session.scalar(select(func.count()).select_from(FaceitPlayerMatch))
+        self.assertEqual(count, PAGE_SIZE)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+"""Гистограмма задержек LogHistogram и скользящие окна WindowedStats"""
+import random
+import unittest
+
+from services.metrics import LogHistogram, MetricsRegistry, WindowedStats
+
+
+def reference_quantile(values, q):
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+class LogHistogramTest(unittest.TestCase):
+
+    def test_quantiles_match_sorted_reference(self):
+        rng = random.Random(42)
+        for median in (0.005, 0.08, 1.5):
+            with self.subTest(median=median):
+                values = [rng.lognormvariate(0, 0.8) * median for _ in range(20000)]
+                histogram = LogHistogram()
+                for value in values:
+                    histogram.add(value)
+                for q in (0.5, 0.9, 0.99):
+                    expected = reference_quantile(values, q)
+                    # Ошибка не больше ширины корзины: growth - 1 относительно значения
+                    self.assertAlmostEqual(histogram.quantile(q), expected, delta=expected * (histogram.growth - 1))
+
+    def test_bucket_bounds(self):
+        histogram = LogHistogram(min_value=0.001, growth=2.0, buckets=8)
+        self.assertEqual(histogram.bucket(0.0005), 0)
+        self.assertEqual(histogram.bucket(0.0015), 1)
+        self.assertEqual(histogram.bucket(0.003), 2)
+        # Значения больше последней границы попадают в последнюю корзину
+        self.assertEqual(histogram.bucket(1000.0), 7)
+        for value in (0.0015, 0.003, 0.05):
+            index = histogram.bucket(value)
+            self.assertLessEqual(histogram.upper_bound(index - 1), value)
+            self.assertLessEqual(value, histogram.upper_bound(index))
+
+    def test_merge_and_reset(self):
+        first, second = LogHistogram(), LogHistogram()
+        for value in (0.01, 0.02, 0.03):
+            first.add(value)
+        for value in (0.5, 0.6):
+            second.add(value)
+        first.merge(second)
+        self.assertEqual(sum(first.counts), 5)
+        self.assertGreater(first.quantile(0.99), 0.4)
+
+        first.reset()
+        self.assertEqual(sum(first.counts), 0)
+        self.assertEqual(first.quantile(0.5), 0.0)
+
+
+class WindowedStatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stats = WindowedStats(slot_seconds=10, horizon=3600)
+
+    def test_summary_counts_requests_in_window(self):
+        for second in range(0, 60, 2):
+            self.stats.record(0.1, error=second % 10 == 0, now=1000 + second)
+        summary = self.stats.summary(60, now=1059)
+        self.assertEqual(summary['requests'], 30)
+        self.assertEqual(summary['errors'], 6)
+        self.assertAlmostEqual(summary['error_rate'], 0.2)
+        self.assertAlmostEqual(summary['throughput'], 0.5)
+        self.assertAlmostEqual(summary['avg'], 0.1)
+
+    def test_old_slots_expire_from_window(self):
+        self.stats.record(0.1, now=1000)
+        self.stats.record(0.2, now=1100)
+        self.assertEqual(self.stats.summary(60, now=1100)['requests'], 1)
+        self.assertEqual(self.stats.summary(300, now=1100)['requests'], 2)
+        self.assertEqual(self.stats.summary(60, now=1200)['requests'], 0)
+
+    def test_ring_slot_is_reset_after_horizon(self):
+        # Через horizon секунд запись попадает в тот же слот кольца и сбрасывает старые счетчики
+        self.stats.record(5.0, error=True, now=1000)
+        self.stats.record(0.1, now=1000 + 3600)
+        summary = self.stats.summary(3600, now=1000 + 3600)
+        self.assertEqual(summary['requests'], 1)
+        self.assertEqual(summary['errors'], 0)
+        self.assertLess(summary['p99'], 1.0)
+
+    def test_empty_window(self):
+        summary = self.stats.summary(60, now=1000)
+        self.assertEqual(summary['requests'], 0)
+        self.assertEqual(summary['p50'], 0.0)
+
+
+class MetricsRegistryTest(unittest.TestCase):
+
+    def test_series_by_endpoint_and_key(self):
+        registry = MetricsRegistry()
+        registry.record('players', 'key-1', 0.1)
+        registry.record('stats', 'key-1', 0.2, error=True)
+        registry.record('stats', None, 0.3)
+
+        self.assertEqual(registry.summary()['requests'], 3)
+        self.assertEqual(registry.summary('endpoint', 'stats')['errors'], 1)
+        self.assertEqual(registry.summary('key', 'key-1')['requests'], 2)
+        self.assertEqual(registry.summary('key', 'missing')['requests'], 0)
+        self.assertEqual(set(registry.snapshot()['endpoint']), {'players', 'stats'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+"""Поиск тиммейтов должен читать индексы, а не сканировать таблицы (EXPLAIN на тестовой базе)"""
+import unittest
+
+from sqlalchemy import select
+
+from database.models import SearchProfile, UserRating, UserSettings, UserState
+from database.requests import TIMEZONE_RANGES, _candidate_ids_query, window_probes_query
+from tests.db import CURRENT_TIMEZONE, CURRENT_USER_ID, DatabaseTestCase, explain_indexes
+
+
+class SearchIndexTest(DatabaseTestCase):
+
+    def candidates_query(self):
+        return _candidate_ids_query(
+            SearchProfile,
+            CURRENT_USER_ID,
+            UserSettings(min_age=12, max_age=60, elo_range=300),
+            1200,
+            1800,
+            TIMEZONE_RANGES[CURRENT_TIMEZONE],
+            ['player7'],
+            [2, 3]
+        )
+
+    async def test_window_probes_use_searchable_index(self):
+        # Тот же UNION ALL окон, что выполняет random_window для выборки SAMPLING_WINDOW
+        query = window_probes_query(
+            self.candidates_query(), SearchProfile.elo, SearchProfile.user_id, [1250, 1500, 1790], 10
+        )
+        async with self.session_pool() as session:
+            self.assertIn('ix_search_profiles_searchable', await explain_indexes(session, query))
+
+    async def test_foreign_key_indexes(self):
+        cases = (
+            (UserState, 'ix_user_states_user_id'),
+            (UserRating, 'ix_user_ratings_user_id'),
+            (UserSettings, 'ix_user_settings_user_id'),
+        )
+        async with self.session_pool() as session:
+            for model, index in cases:
+                with self.subTest(index=index):
+                    query = select(model).where(model.user_id == CURRENT_USER_ID)
+                    self.assertIn(index, await explain_indexes(session, query))
+
+
+if __name__ == '__main__':
+    unittest.main()
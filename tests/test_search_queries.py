@@ -0,0 +1,89 @@
+"""
+Число SQL-запросов поиска тиммейтов. player_search, handle_new_search и handle_invite_all
+получают составы через next_search_page/search_teammates: карточки кандидатов читаются
+одним запросом из проекции search_profiles, без запросов на каждую строку.
+"""
+import unittest
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from database.models import SearchProfile, UserSettings
+from database.requests import (
+    SAMPLING_WINDOW, SEARCH_POOL_SIZE, TIMEZONE_RANGES, _candidate_ids_query, load_search_pool,
+    next_search_page, random_window, search_teammates
+)
+from database.search_index import candidate_index
+from services.search_session import search_sessions
+from tests.db import CURRENT_TG_ID, CURRENT_TIMEZONE, CURRENT_USER_ID, DatabaseTestCase
+
+
+class SearchQueryCountTest(DatabaseTestCase):
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        search_sessions.invalidate(CURRENT_TG_ID)
+        async with self.session_pool() as session:
+            await candidate_index.build(session)
+
+    @contextmanager
+    def count_statements(self):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(self.engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(self.engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+    async def test_load_search_pool_window(self):
+        # Пользователь с состоянием и настройками, бан-лист, окна одним UNION ALL, карточки
+        async with self.session_pool() as session:
+            with self.count_statements() as statements:
+                params, pool = await load_search_pool(session, CURRENT_TG_ID, sampling=SAMPLING_WINDOW)
+        self.assertTrue(pool)
+        self.assertEqual(len(statements), 4, statements)
+        self.assertFalse([statement for statement in statements if 'count(' in statement.lower()], statements)
+
+    async def test_window_sample_matches_filters(self):
+        settings = UserSettings(min_age=12, max_age=60, elo_range=300)
+        filters = (CURRENT_USER_ID, settings, 1200, 1800, TIMEZONE_RANGES[CURRENT_TIMEZONE], [], [])
+        async with self.session_pool() as session:
+            matching = set(await session.scalars(_candidate_ids_query(SearchProfile, *filters)))
+            sample = await random_window(
+                session, _candidate_ids_query(SearchProfile, *filters),
+                SearchProfile.elo, SearchProfile.user_id, 1200, 1800, SEARCH_POOL_SIZE
+            )
+        # Окна могут пересекаться, поэтому кандидатов бывает меньше SEARCH_POOL_SIZE
+        self.assertTrue(sample)
+        self.assertLessEqual(len(sample), SEARCH_POOL_SIZE)
+        self.assertEqual(len(sample), len(set(sample)))
+        self.assertLessEqual(set(sample), matching)
+
+    async def test_search_teammates_index(self):
+        # Пользователь, бан-лист, карточки выбранных индексом кандидатов
+        async with self.session_pool() as session:
+            with self.count_statements() as statements:
+                team = await search_teammates(session, CURRENT_TG_ID)
+        self.assertEqual(len(team), 4)
+        self.assertEqual(len(statements), 3, statements)
+
+    async def test_next_pages_come_from_search_session(self):
+        async with self.session_pool() as session:
+            with self.count_statements() as statements:
+                first = await next_search_page(session, CURRENT_TG_ID, elo_range=300)
+            self.assertEqual(len(statements), 3, statements)
+
+            with self.count_statements() as statements:
+                second = await next_search_page(session, CURRENT_TG_ID, elo_range=300)
+            self.assertEqual(statements, [])
+
+        self.assertEqual(len(first), 4)
+        self.assertFalse({member.user_id for member in first} & {member.user_id for member in second})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+"""Объединение одновременных запросов FaceitService._single_flight"""
+import asyncio
+import os
+import unittest
+from unittest import mock
+
+from services.faceit import FaceitService
+
+
+class SingleFlightTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        with mock.patch.dict(os.environ, {"FACEIT_CACHE_BACKEND": "none"}):
+            self.service = FaceitService(session_pool=None, api_keys=["test-key"])
+        self.calls = 0
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+        self.cancelled = False
+
+    async def upstream(self):
+        self.calls += 1
+        self.started.set()
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return {"calls": self.calls}
+
+    def call(self, key="player:1"):
+        return asyncio.create_task(self.service._single_flight(key, self.upstream))
+
+    async def test_concurrent_callers_share_one_upstream_call(self):
+        callers = [self.call() for _ in range(10)]
+        await self.started.wait()
+        self.release.set()
+        results = await asyncio.gather(*callers)
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [{"calls": 1}] * 10)
+        self.assertEqual(self.service.coalesce_stats['executed'], 1)
+        self.assertEqual(self.service.coalesce_stats['coalesced'], 9)
+        self.assertEqual(self.service.in_flight_requests, {})
+        self.assertEqual(self.service.in_flight_waiters, {})
+
+    async def test_different_keys_are_not_coalesced(self):
+        first, second = self.call("player:1"), self.call("player:2")
+        await self.started.wait()
+        self.release.set()
+        await asyncio.gather(first, second)
+        self.assertEqual(self.calls, 2)
+
+    async def test_cancelled_waiter_does_not_cancel_others(self):
+        cancelled, other = self.call(), self.call()
+        await self.started.wait()
+
+        cancelled.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await cancelled
+        self.assertEqual(self.service.in_flight_waiters["player:1"], 1)
+
+        self.release.set()
+        self.assertEqual(await other, {"calls": 1})
+        self.assertFalse(self.cancelled)
+        self.assertEqual(self.calls, 1)
+
+    async def test_last_cancelled_waiter_cancels_task_and_clears_key(self):
+        callers = [self.call(), self.call()]
+        await self.started.wait()
+        task = self.service.in_flight_requests["player:1"]
+
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        self.assertNotIn("player:1", self.service.in_flight_requests)
+        self.assertNotIn("player:1", self.service.in_flight_waiters)
+
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertTrue(self.cancelled)
+
+        # Новый вызов после отмены выполняет запрос заново, а не ждет отмененную задачу
+        self.started.clear()
+        self.release.set()
+        self.assertEqual(await self.call(), {"calls": 2})
+
+    async def test_upstream_error_reaches_every_waiter(self):
+        async def failing():
+            self.calls += 1
+            await self.release.wait()
+            raise RuntimeError("upstream failed")
+
+        callers = [asyncio.create_task(self.service._single_flight("player:1", failing)) for _ in range(3)]
+        await asyncio.sleep(0)
+        self.release.set()
+        results = await asyncio.gather(*callers, return_exceptions=True)
+
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+        self.assertEqual(self.service.in_flight_requests, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
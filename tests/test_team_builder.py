@@ -0,0 +1,127 @@
+"""Детерминированные случаи подбора состава TeamBuilder"""
+import random
+import unittest
+from types import SimpleNamespace
+
+from services.team_builder import FLEX_ROLE, TeamBuilder, needed_roles
+
+IGL, AWP, SUPPORT, ENTRY = "in-Game Leader (IGL)", "AWPer", "Support/Lurker", "Entry Fragger"
+TIMEZONE = 'MSK+0 (UTC+3)'
+
+
+def candidate(user_id, role, elo=1500, rating=50, age=20, timezone=TIMEZONE):
+    return SimpleNamespace(
+        user_id=user_id, role=role, elo=elo, nickname_rating=rating, age=age, timezone=timezone
+    )
+
+
+def ids(team):
+    return [member.user_id for member in team]
+
+
+class TeamBuilderTest(unittest.TestCase):
+
+    def setUp(self):
+        # Бюджет с запасом: результат не должен зависеть от скорости машины
+        self.builder = TeamBuilder(time_budget=10.0)
+
+    def build(self, candidates, current_role=AWP, **params):
+        return self.builder.build(current_role, 1500, TIMEZONE, candidates, **params)
+
+    def test_needed_roles(self):
+        self.assertEqual(needed_roles(AWP), {IGL, SUPPORT, ENTRY, FLEX_ROLE})
+        self.assertEqual(needed_roles(FLEX_ROLE), {IGL, AWP, SUPPORT, ENTRY})
+        self.assertEqual(needed_roles(None), {IGL, AWP, SUPPORT, ENTRY, FLEX_ROLE})
+
+    def test_full_role_coverage_beats_better_duplicates(self):
+        # Четыре сильных Entry Fragger против полного набора недостающих ролей послабее
+        pool = [candidate(user_id, ENTRY, rating=100) for user_id in range(1, 5)]
+        pool += [
+            candidate(10, IGL, elo=1700, rating=10),
+            candidate(11, SUPPORT, elo=1700, rating=10),
+            candidate(12, FLEX_ROLE, elo=1700, rating=10),
+        ]
+        team = self.build(pool)
+        self.assertEqual({member.role for member in team}, {ENTRY, IGL, SUPPORT, FLEX_ROLE})
+        self.assertIn(1, ids(team))
+
+    def test_current_role_is_not_duplicated(self):
+        pool = [
+            candidate(1, AWP, rating=100),
+            candidate(2, IGL),
+            candidate(3, SUPPORT),
+            candidate(4, ENTRY),
+            candidate(5, FLEX_ROLE),
+        ]
+        self.assertNotIn(1, ids(self.build(pool)))
+
+    def test_best_player_of_each_role_is_chosen(self):
+        pool = [
+            candidate(1, IGL, elo=1500),
+            candidate(2, IGL, elo=1790),
+            candidate(3, SUPPORT),
+            candidate(4, ENTRY),
+            candidate(5, FLEX_ROLE),
+        ]
+        team = self.build(pool)
+        self.assertIn(1, ids(team))
+        self.assertNotIn(2, ids(team))
+
+    def test_score_tie_prefers_lower_user_id(self):
+        pool = [
+            candidate(8, IGL),
+            candidate(3, IGL),
+            candidate(4, SUPPORT),
+            candidate(5, ENTRY),
+            candidate(6, FLEX_ROLE),
+        ]
+        self.assertEqual(ids(self.build(pool)), [3, 4, 5, 6])
+
+    def test_result_is_ordered_by_score(self):
+        pool = [
+            candidate(1, IGL, rating=20),
+            candidate(2, SUPPORT, rating=90),
+            candidate(3, ENTRY, rating=60),
+            candidate(4, FLEX_ROLE, rating=60),
+        ]
+        self.assertEqual(ids(self.build(pool)), [2, 3, 4, 1])
+
+    def test_input_order_does_not_matter(self):
+        rng = random.Random(7)
+        roles = [IGL, AWP, SUPPORT, ENTRY, FLEX_ROLE, None]
+        pool = [
+            candidate(user_id, rng.choice(roles), elo=rng.randint(1200, 1800), rating=rng.randint(0, 100))
+            for user_id in range(1, 60)
+        ]
+        expected = ids(self.build(pool))
+        for _ in range(5):
+            rng.shuffle(pool)
+            self.assertEqual(ids(self.build(pool)), expected)
+
+    def test_age_limits(self):
+        pool = [
+            candidate(1, IGL, age=15),
+            candidate(2, IGL, age=25),
+            candidate(3, SUPPORT, age=None),
+            candidate(4, SUPPORT, age=30),
+        ]
+        self.assertEqual(sorted(ids(self.build(pool, min_age=18, max_age=40))), [2, 4])
+
+    def test_small_pool_returns_everyone(self):
+        pool = [candidate(1, IGL), candidate(2, IGL)]
+        self.assertEqual(sorted(ids(self.build(pool))), [1, 2])
+
+    def test_exhausted_budget_falls_back_to_best_scores(self):
+        builder = TeamBuilder(time_budget=0)
+        pool = [candidate(user_id, ENTRY, rating=user_id) for user_id in range(1, 7)]
+        with self.assertLogs('services.team_builder', 'WARNING'):
+            team = builder.build(AWP, 1500, TIMEZONE, pool)
+        self.assertEqual(ids(team), [6, 5, 4, 3])
+        self.assertEqual(builder.budget_hits, 1)
+
+    def test_empty_pool(self):
+        self.assertEqual(self.build([]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()